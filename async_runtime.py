@@ -0,0 +1,381 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pygame
+
+from frame_recorder import FrameRecorder, configure_headless
+from telemetry_stream import TelemetryPublisher
+from trace_events import TRACER
+from trajectory_preview import TrajectoryPreview
+
+FRAME_RATE = 60.0
+HEADLESS_MAX_FRAMES = 600
+# Starts and stops the frame tracer in the games
+TRACE_KEY = pygame.K_F9
+
+
+class TelemetryLog:
+    """Buffers telemetry records in memory and appends them to a CSV file.
+
+    record() only appends a tuple to a deque and is cheap enough for the
+    simulation task. flush() does the file I/O and is meant to run in an
+    executor thread; it pops the records queued so far, which is thread safe
+    against concurrent appends.
+    """
+
+    def __init__(self, path, fields: tuple):
+        """Initialize the log.
+
+        Args:
+            path: CSV file to write, replaced on the first flush
+            fields: Column names, written as header
+        """
+        self.path = Path(path)
+        self.fields = tuple(fields)
+        self._pending: deque = deque()
+        self._header_written = False
+
+    def record(self, values: tuple) -> None:
+        """Queue one record for the next flush."""
+        self._pending.append(values)
+
+    def flush(self) -> int:
+        """Write all queued records to the file (blocking).
+
+        Returns:
+            int: Number of records written
+        """
+        pending = [self._pending.popleft() for _ in range(len(self._pending))]
+        if not pending and self._header_written:
+            return 0
+        mode = "a" if self._header_written else "w"
+        with open(self.path, mode, newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            if not self._header_written:
+                writer.writerow(self.fields)
+                self._header_written = True
+            writer.writerows(pending)
+        return len(pending)
+
+
+def write_json_atomic(path, data: dict) -> None:
+    """Write JSON to a temporary file and move it over path (blocking)."""
+    path = Path(path)
+    temporary_path = path.with_name(path.name + ".tmp")
+    temporary_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    os.replace(temporary_path, path)
+
+
+class AsyncGameRuntime:
+    """Runs a game as cooperative asyncio tasks.
+
+    The game must provide handle_events(), simulate_frame() and
+    render_frame(), like submarine.Game and inverted_pendulum_game.Game.
+    Simulation and rendering run as separate tasks on the event loop thread,
+    because pygame requires its display on the main thread. Periodic jobs
+    that block (file writes, exports) run in a thread pool executor, so a
+    slow disk only delays its own task and never the physics tick.
+    """
+
+    def __init__(
+        self,
+        game,
+        simulation_rate: float = FRAME_RATE,
+        render_rate: float = FRAME_RATE,
+        max_workers: int = 2,
+    ):
+        """Initialize the runtime.
+
+        Args:
+            game: Game to run
+            simulation_rate: Frames simulated per second of wall time; each
+                frame advances the game's simulated time by its frame time
+            render_rate: Frames rendered per second
+            max_workers: Threads of the executor for blocking jobs
+        """
+        self.game = game
+        self.simulation_period = 1 / simulation_rate
+        self.render_period = 1 / render_rate
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="game-io"
+        )
+        self.running = False
+        self._periodic_jobs: list = []
+        self._shutdown_jobs: list = []
+        self._pending_blocking: set = set()
+        self.telemetry_log = None
+
+    def add_periodic_job(self, name: str, period: float, job, blocking: bool = True):
+        """Run a job every period seconds as its own task.
+
+        Args:
+            name: Task name (shown in asyncio debugging output)
+            period: Period in seconds
+            job: Callable without arguments
+            blocking: Run the job in the executor instead of on the loop
+        """
+        self._periodic_jobs.append((name, period, job, blocking))
+
+    def add_shutdown_job(self, job) -> None:
+        """Run a blocking job in the executor once the game has stopped."""
+        self._shutdown_jobs.append(job)
+
+    def enable_telemetry_log(self, path, flush_period: float = 1.0) -> TelemetryLog:
+        """Record game.telemetry_record() every simulated frame into a CSV file.
+
+        Args:
+            path: CSV file
+            flush_period: Seconds between flushes to disk
+
+        Returns:
+            TelemetryLog: The log, flushed a last time on shutdown
+        """
+        self.telemetry_log = TelemetryLog(path, self.game.TELEMETRY_FIELDS)
+        self.add_periodic_job("telemetry-flush", flush_period, self.telemetry_log.flush)
+        self.add_shutdown_job(self.telemetry_log.flush)
+        return self.telemetry_log
+
+    def enable_autosave(self, path, period: float = 5.0) -> None:
+        """Write game.autosave_data() as JSON every period seconds.
+
+        The data is collected on the loop thread and written in the executor.
+        """
+
+        def collect_and_submit():
+            self.submit_blocking(write_json_atomic, path, self.game.autosave_data())
+
+        self.add_periodic_job("autosave", period, collect_and_submit, blocking=False)
+        self.add_shutdown_job(
+            lambda: write_json_atomic(path, self.game.autosave_data())
+        )
+
+    def submit_blocking(self, function, *args) -> asyncio.Future:
+        """Start a one-shot blocking job, e.g. a file export, in the executor.
+
+        Must be called from a task of this runtime. The job is awaited on
+        shutdown, so exports started late still complete.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, function, *args)
+        self._pending_blocking.add(future)
+        future.add_done_callback(self._pending_blocking.discard)
+        return future
+
+    async def _simulation_task(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while self.running:
+            with TRACER.span("simulate_frame"):
+                self.game.simulate_frame()
+            if self.telemetry_log is not None:
+                self.telemetry_log.record(self.game.telemetry_record())
+            next_tick += self.simulation_period
+            # Skip missed ticks instead of bursting to catch up
+            now = loop.time()
+            if next_tick < now:
+                next_tick = now
+            await asyncio.sleep(next_tick - now)
+
+    async def _render_task(self):
+        loop = asyncio.get_running_loop()
+        next_frame = loop.time()
+        while self.running:
+            with TRACER.span("handle_events"):
+                running = self.game.handle_events()
+            if not running:
+                self.running = False
+                break
+            with TRACER.span("render_frame"):
+                self.game.render_frame()
+            next_frame += self.render_period
+            now = loop.time()
+            if next_frame < now:
+                next_frame = now
+            await asyncio.sleep(next_frame - now)
+
+    async def _periodic_task(self, period: float, job, blocking: bool):
+        while self.running:
+            await asyncio.sleep(period)
+            if blocking:
+                # Shielded, so cancelling this task leaves the job tracked in
+                # _pending_blocking until its thread has finished
+                await asyncio.shield(self.submit_blocking(job))
+            else:
+                job()
+
+    async def run_async(self) -> None:
+        """Run all tasks until the game quits, then finish pending I/O."""
+        self.running = True
+        tasks = [
+            asyncio.create_task(self._simulation_task(), name="simulation"),
+            asyncio.create_task(self._render_task(), name="render"),
+        ]
+        for name, period, job, blocking in self._periodic_jobs:
+            tasks.append(
+                asyncio.create_task(
+                    self._periodic_task(period, job, blocking), name=name
+                )
+            )
+        try:
+            # The render task returns on a quit event; any other task only
+            # finishes early by raising
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            self.running = False
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            loop = asyncio.get_running_loop()
+            # Includes periodic jobs still running, e.g. a telemetry flush,
+            # which must finish before their shutdown counterpart starts
+            if self._pending_blocking:
+                await asyncio.gather(*self._pending_blocking, return_exceptions=True)
+            for job in self._shutdown_jobs:
+                await loop.run_in_executor(self.executor, job)
+            self.executor.shutdown(wait=True)
+
+    def run(self) -> None:
+        """Blocking entry point: run the game on a new event loop."""
+        asyncio.run(self.run_async())
+
+
+def add_runtime_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the command line options selecting and configuring the runtime."""
+    parser.add_argument(
+        "--async-runtime",
+        action="store_true",
+        help="run simulation, rendering and file I/O as asyncio tasks",
+    )
+    parser.add_argument(
+        "--telemetry-log",
+        metavar="CSV",
+        help="write per-frame telemetry to this file (async runtime only)",
+    )
+    parser.add_argument(
+        "--autosave",
+        metavar="JSON",
+        help="periodically save the game status to this file (async runtime only)",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="PATH",
+        help="record the rendered frames to a .zraw, .raw or .gif file",
+    )
+    parser.add_argument(
+        "--record-every",
+        type=int,
+        default=1,
+        metavar="N",
+        help="record every N-th frame",
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="run without a window at maximum speed, with control enabled",
+    )
+    parser.add_argument(
+        "--max-frames",
+        type=int,
+        metavar="N",
+        help=f"quit after N frames (headless default: {HEADLESS_MAX_FRAMES})",
+    )
+    parser.add_argument(
+        "--preview",
+        action="store_true",
+        help="draw the predicted closed-loop trajectory, computed in the background",
+    )
+    parser.add_argument(
+        "--telemetry-stream",
+        metavar="ADDRESS",
+        help="publish binary telemetry frames to udp://host:port or unix:///path",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="JSON",
+        help="record a frame-level timeline from the start and save it as Chrome "
+        "trace-event JSON on exit; F9 stops and saves, or starts tracing without it",
+    )
+
+
+def prepare_runtime(args: argparse.Namespace) -> None:
+    """Apply options that must take effect before the game is created."""
+    if args.headless:
+        if args.async_runtime:
+            raise SystemExit(
+                "--headless runs the synchronous loop, drop --async-runtime"
+            )
+        configure_headless()
+
+
+def run_game(game, args: argparse.Namespace) -> None:
+    """Run a game with the synchronous main loop or the asyncio runtime.
+
+    Args:
+        game: Game providing main_loop() and the AsyncGameRuntime interface
+        args: Parsed arguments from a parser set up by add_runtime_arguments
+    """
+    if not args.async_runtime and (args.telemetry_log or args.autosave):
+        raise SystemExit("--telemetry-log and --autosave need --async-runtime")
+    if args.telemetry_stream:
+        game.telemetry_publisher = TelemetryPublisher(
+            game.TELEMETRY_FORMAT, args.telemetry_stream
+        )
+    game.max_frames = args.max_frames
+    if args.headless:
+        game.frame_rate_limit = 0
+        if game.max_frames is None:
+            game.max_frames = HEADLESS_MAX_FRAMES
+        game.start()
+    if args.preview:
+        game.trajectory_preview = TrajectoryPreview()
+    if args.trace:
+        TRACER.path = args.trace
+        TRACER.start()
+    if args.record:
+        game.frame_recorder = FrameRecorder(
+            args.record,
+            game.screen.get_size(),
+            fps=FRAME_RATE,
+            frame_step=args.record_every,
+            # Interactive play keeps its frame rate, headless keeps all frames
+            drop_frames=not args.headless,
+        )
+    try:
+        if not args.async_runtime:
+            game.main_loop()
+            return
+
+        runtime = AsyncGameRuntime(game)
+        if args.telemetry_log:
+            runtime.enable_telemetry_log(args.telemetry_log)
+        if args.autosave:
+            runtime.enable_autosave(args.autosave)
+        try:
+            runtime.run()
+        finally:
+            pygame.quit()
+    finally:
+        if game.telemetry_publisher is not None:
+            game.telemetry_publisher.close()
+        if game.trajectory_preview is not None:
+            game.trajectory_preview.close()
+        if game.frame_recorder is not None:
+            game.frame_recorder.close()
+            print(
+                f"Recorded {game.frame_recorder.frames_written} frames to "
+                f"{args.record} ({game.frame_recorder.frames_dropped} dropped)"
+            )
+        if TRACER.enabled:
+            TRACER.stop()
+            TRACER.save(TRACER.path)
+            print(
+                f"Saved {TRACER.count - TRACER.dropped} trace events to {TRACER.path}"
+            )
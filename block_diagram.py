@@ -0,0 +1,413 @@
+import numpy as np
+from game_controller import (
+    ControllerPID,
+    ControllerPIDBank,
+    GameControllerBase,
+    StateFeedbackController,
+)
+from plant_base import PlantBase
+from state_estimator import SteadyStateKalmanFilter
+
+
+class Block:
+    """Base class of all block diagram blocks.
+
+    A block owns a preallocated output buffer and reads its inputs directly
+    from the output buffers of the blocks wired to it. Blocks without direct
+    feedthrough (delays, plants) produce their output from internal state
+    only and therefore break feedback loops.
+    """
+
+    direct_feedthrough: bool = True
+
+    def __init__(self, name: str, n_inputs: int, output_size: int):
+        """Initialize the block.
+
+        Args:
+            name: Unique name of the block within its diagram
+            n_inputs: Number of input ports
+            output_size: Length of the output signal
+        """
+        self.name = name
+        self.n_inputs = n_inputs
+        self.output = np.zeros(output_size)
+        self.inputs: list = [None] * n_inputs
+        self.enabled = True
+
+    def bind(self) -> None:
+        """Hook called once after the input buffers have been wired."""
+        pass
+
+    def update(self) -> None:
+        """Compute the output from the current inputs."""
+        pass
+
+    def latch(self) -> None:
+        """Hook called after all outputs of a step have been computed."""
+        pass
+
+
+class ReferenceBlock(Block):
+    """Source block whose output is read from a callable every step.
+
+    Used for reference signals and keyboard input. The callable may return a
+    scalar or an array of length output_size.
+    """
+
+    def __init__(self, name: str, source, output_size: int = 1):
+        super().__init__(name, n_inputs=0, output_size=output_size)
+        self.source = source
+
+    def update(self):
+        self.output[:] = self.source()
+
+
+class SumBlock(Block):
+    """Adds its inputs with the given signs, e.g. "+-" for a - b."""
+
+    def __init__(self, name: str, signs: str, output_size: int = 1):
+        if not signs or set(signs) - {"+", "-"}:
+            raise ValueError(f"signs must consist of '+' and '-', but is {signs!r}")
+        super().__init__(name, n_inputs=len(signs), output_size=output_size)
+        self.signs = signs
+
+    def bind(self):
+        self._first = self.inputs[0]
+        self._negate_first = self.signs[0] == "-"
+        self._rest = tuple(zip(self.signs[1:], self.inputs[1:]))
+
+    def update(self):
+        output = self.output
+        if self._negate_first:
+            np.negative(self._first, out=output)
+        else:
+            output[:] = self._first
+        for sign, signal in self._rest:
+            if sign == "+":
+                output += signal
+            else:
+                output -= signal
+
+
+class GainBlock(Block):
+    """Multiplies its input by a scalar gain or a gain matrix."""
+
+    def __init__(self, name: str, gain, output_size: int = None):
+        gain = np.asarray(gain, dtype=float)
+        if output_size is None:
+            output_size = gain.shape[0] if gain.ndim == 2 else 1
+        super().__init__(name, n_inputs=1, output_size=output_size)
+        self.gain = gain
+
+    def bind(self):
+        self._input = self.inputs[0]
+
+    def update(self):
+        if self.gain.ndim == 2:
+            np.matmul(self.gain, self._input, out=self.output)
+        else:
+            np.multiply(self._input, self.gain, out=self.output)
+
+
+class PIDBlock(Block):
+    """Wraps a ControllerPID (scalar error) or ControllerPIDBank (error array)."""
+
+    def __init__(self, name: str, controller: ControllerPID, output_size: int = 1):
+        super().__init__(name, n_inputs=1, output_size=output_size)
+        self.controller = controller
+
+    def bind(self):
+        self._input = self.inputs[0]
+        self._is_bank = isinstance(self.controller, ControllerPIDBank)
+
+    def update(self):
+        if self._is_bank:
+            self.output[:] = self.controller.get_control_input(self._input)
+        else:
+            self.output[0] = self.controller.get_control_input(float(self._input[0]))
+
+
+class StateFeedbackBlock(Block):
+    """Computes -K x from the gain matrix of a StateFeedbackController."""
+
+    def __init__(self, name: str, controller: StateFeedbackController):
+        if np.ndim(controller.gain_matrix) != 2:
+            raise ValueError(
+                "gain_matrix must be 2-dimensional (n_inputs, n_states), "
+                f"but has shape {np.shape(controller.gain_matrix)}"
+            )
+        super().__init__(name, n_inputs=1, output_size=controller.gain_matrix.shape[0])
+        self.controller = controller
+
+    def bind(self):
+        self._input = self.inputs[0]
+
+    def update(self):
+        # Read the gain every step so that retuned controllers take effect
+        np.matmul(self.controller.gain_matrix, self._input, out=self.output)
+        np.negative(self.output, out=self.output)
+
+
+class ControllerBlock(Block):
+    """Wraps any controller whose get_control_input takes the input array.
+
+    Used for controllers without a gain matrix, e.g. a
+    SharedMemoryController whose law runs in another process.
+    """
+
+    def __init__(self, name: str, controller: GameControllerBase, output_size: int):
+        super().__init__(name, n_inputs=1, output_size=output_size)
+        self.controller = controller
+
+    def bind(self):
+        self._input = self.inputs[0]
+
+    def update(self):
+        self.output[:] = self.controller.get_control_input(self._input)
+
+
+class StateEstimatorBlock(Block):
+    """Estimates the state from measured outputs with a SteadyStateKalmanFilter.
+
+    Input port 0 is the measurement of the current step, port 1 the input
+    applied during the previous step, typically through a DelayBlock.
+    """
+
+    def __init__(self, name: str, estimator: SteadyStateKalmanFilter):
+        if estimator.n_filters is not None:
+            raise ValueError("StateEstimatorBlock needs a single filter")
+        super().__init__(name, n_inputs=2, output_size=estimator.n_states)
+        self.estimator = estimator
+        self.output[:] = estimator.estimate
+
+    def bind(self):
+        self._measurement = self.inputs[0]
+        self._previous_input = self.inputs[1]
+
+    def update(self):
+        self.output[:] = self.estimator.update(self._measurement, self._previous_input)
+
+
+class SaturationBlock(Block):
+    """Clips its input to [lower, upper]."""
+
+    def __init__(self, name: str, lower, upper, output_size: int = 1):
+        super().__init__(name, n_inputs=1, output_size=output_size)
+        self.lower = lower
+        self.upper = upper
+
+    def bind(self):
+        self._input = self.inputs[0]
+
+    def update(self):
+        np.clip(self._input, self.lower, self.upper, out=self.output)
+
+
+class DelayBlock(Block):
+    """Unit delay: outputs the input of the previous step."""
+
+    direct_feedthrough = False
+
+    def __init__(self, name: str, output_size: int = 1, initial_value=0.0):
+        super().__init__(name, n_inputs=1, output_size=output_size)
+        self.output[:] = initial_value
+        self._next_output = self.output.copy()
+
+    def bind(self):
+        self._input = self.inputs[0]
+
+    def latch(self):
+        self._next_output[:] = self._input
+
+    def advance(self):
+        self.output[:] = self._next_output
+
+
+class PlantBlock(Block):
+    """Wraps a PlantBase: outputs the plant state, feeds its input to the plant.
+
+    The output is the state at the beginning of the step, so the plant has no
+    direct feedthrough and closes feedback loops.
+    """
+
+    direct_feedthrough = False
+
+    def __init__(self, name: str, plant: PlantBase, input_type):
+        """Initialize the plant block.
+
+        Args:
+            name: Block name
+            plant: Plant providing get_state_into
+            input_type: NamedTuple type of the plant input, built from the
+                input signal before each step
+        """
+        super().__init__(name, n_inputs=1, output_size=plant.n_states)
+        self.plant = plant
+        self.input_type = input_type
+
+    def bind(self):
+        self._input = self.inputs[0]
+
+    def update(self):
+        self.plant.get_state_into(self.output)
+
+    def latch(self):
+        self.plant.set_input(self.input_type(*self._input.tolist()))
+
+    def advance(self, time_delta: float):
+        self.plant.step(time_delta)
+
+
+class BlockDiagram:
+    """Collects blocks and connections and compiles them into a schedule."""
+
+    def __init__(self):
+        self.blocks: dict = {}
+        self.connections: list = []
+
+    def add(self, block: Block) -> Block:
+        """Add a block to the diagram.
+
+        Returns:
+            Block: The added block, for chaining
+        """
+        if block.name in self.blocks:
+            raise ValueError(f"block name {block.name!r} is already used")
+        self.blocks[block.name] = block
+        return block
+
+    def connect(self, source: Block, destination: Block, port: int = 0) -> None:
+        """Feed the output of source into an input port of destination."""
+        for block in (source, destination):
+            if self.blocks.get(block.name) is not block:
+                raise ValueError(f"block {block.name!r} is not part of the diagram")
+        if not 0 <= port < destination.n_inputs:
+            raise ValueError(
+                f"block {destination.name!r} has no input port {port} "
+                f"(it has {destination.n_inputs})"
+            )
+        self.connections.append((source, destination, port))
+
+    def compile(self) -> "CompiledDiagram":
+        """Wire all buffers and order the blocks for execution.
+
+        Raises:
+            ValueError: If an input port is unconnected or connected twice,
+                or if the diagram contains a loop without delay or plant
+
+        Returns:
+            CompiledDiagram: Flat execution schedule over the blocks
+        """
+        wired = {}
+        for source, destination, port in self.connections:
+            key = (destination.name, port)
+            if key in wired:
+                raise ValueError(
+                    f"input port {port} of block {destination.name!r} is connected twice"
+                )
+            wired[key] = source
+        for block in self.blocks.values():
+            for port in range(block.n_inputs):
+                if (block.name, port) not in wired:
+                    raise ValueError(
+                        f"input port {port} of block {block.name!r} is unconnected"
+                    )
+
+        # Topological order over the direct feedthrough edges only
+        predecessors = {name: set() for name in self.blocks}
+        for (destination_name, _), source in wired.items():
+            if self.blocks[destination_name].direct_feedthrough:
+                predecessors[destination_name].add(source.name)
+        order = []
+        remaining = dict(predecessors)
+        while remaining:
+            ready = [
+                name
+                for name, sources in remaining.items()
+                if not sources & remaining.keys()
+            ]
+            if not ready:
+                raise ValueError(
+                    f"algebraic loop between blocks {sorted(remaining)}; "
+                    "insert a DelayBlock"
+                )
+            for name in ready:
+                order.append(self.blocks[name])
+                del remaining[name]
+
+        for (destination_name, port), source in wired.items():
+            self.blocks[destination_name].inputs[port] = source.output
+        for block in self.blocks.values():
+            block.bind()
+        return CompiledDiagram(order, dict(self.blocks))
+
+
+class CompiledDiagram:
+    """Flat execution schedule of a compiled BlockDiagram.
+
+    A step consists of evaluate() (compute all block outputs and hand the
+    results to delays and plants) followed by advance() (step delays and
+    plants). Games and headless runners call both through step().
+    """
+
+    def __init__(self, order: list, blocks: dict):
+        self.order = tuple(order)
+        self.blocks = blocks
+        self._latching = tuple(
+            block for block in self.order if type(block).latch is not Block.latch
+        )
+        self._delays = tuple(
+            block for block in self.order if isinstance(block, DelayBlock)
+        )
+        self._plants = tuple(
+            block for block in self.order if isinstance(block, PlantBlock)
+        )
+
+    def block(self, name: str) -> Block:
+        """Look up a block by name (setup time only, not per step)."""
+        return self.blocks[name]
+
+    def evaluate(self) -> None:
+        """Compute all block outputs for the current step."""
+        for block in self.order:
+            if block.enabled:
+                block.update()
+            else:
+                block.output.fill(0.0)
+        for block in self._latching:
+            block.latch()
+
+    def advance_delays(self) -> None:
+        """Advance the delay blocks only.
+
+        Used when plants are stepped at their own rate, e.g. by a
+        MultiRateScheduler, and hold the last input in between.
+        """
+        for delay in self._delays:
+            delay.advance()
+
+    def advance(self, time_delta: float) -> None:
+        """Advance delays and plants by one step."""
+        self.advance_delays()
+        for plant in self._plants:
+            plant.advance(time_delta)
+
+    def step(self, time_delta: float) -> None:
+        """Evaluate the diagram and advance it by one step."""
+        self.evaluate()
+        self.advance(time_delta)
+
+    def run(self, n_steps: int, time_delta: float, on_step=None) -> None:
+        """Run the diagram headless for a number of steps.
+
+        Args:
+            n_steps: Number of steps
+            time_delta: Step size in seconds
+            on_step: Optional callable (step_index) invoked after each
+                evaluate, e.g. to log block outputs
+        """
+        for step_index in range(n_steps):
+            self.evaluate()
+            if on_step is not None:
+                on_step(step_index)
+            self.advance(time_delta)
@@ -0,0 +1,232 @@
+"""Streaming performance metrics of control loops.
+
+StreamingMetrics is updated once per control step and keeps a fixed set of
+accumulators instead of histories, so memory and cost per update are
+constant. The same object serves the game HUDs, the scenario runner and
+regression checks through summary().
+"""
+
+import numpy as np
+
+SETTLING_BAND_DEFAULT = 0.02
+RISE_LIMITS_DEFAULT = (0.1, 0.9)
+
+# Keys of StreamingMetrics.summary, in display order
+METRIC_NAMES = (
+    "ise",
+    "iae",
+    "itae",
+    "energy",
+    "max_abs_error",
+    "final_abs_error",
+    "max_abs_input",
+    "overshoot",
+    "rise_time",
+    "settling_time",
+)
+
+
+class StreamingMetrics:
+    """Error, effort and step response measures computed online.
+
+    Integral measures accumulate over all samples with the rectangle rule,
+    sample k being at time k * sample_time:
+
+        ISE = sum e^2 dt,  IAE = sum |e| dt,  ITAE = sum t |e| dt,
+        energy = sum u^2 dt,
+
+    with the error e = reference - output and the control input u.
+
+    Overshoot, rise time and settling time describe the response to the
+    latest reference step. A step starts with the first sample and whenever
+    the reference jumps by more than step_threshold between two samples; it
+    goes from the output at that sample to the new reference. The measures
+    are NaN while undefined, e.g. before the output reached the upper rise
+    limit, while it is outside the settling band or for a step of size
+    zero. For continuously varying references, like a sine, only the
+    integral and extreme value measures are meaningful.
+
+    With n_loops, all inputs are arrays with one entry per loop and all
+    measures are arrays, like ControllerPIDBank.
+    """
+
+    def __init__(
+        self,
+        sample_time: float,
+        n_loops: int | None = None,
+        settling_band: float = SETTLING_BAND_DEFAULT,
+        rise_limits: tuple = RISE_LIMITS_DEFAULT,
+        step_threshold: float = 0.0,
+    ):
+        """Initialize the accumulators.
+
+        Args:
+            sample_time: Time between two updates in seconds
+            n_loops: Number of loops updated at once, None for a single
+                loop with scalar signals
+            settling_band: Half width of the settling band as fraction of
+                the step size
+            rise_limits: (lower, upper) fractions of the step size between
+                which the rise time is measured
+            step_threshold: Smallest reference change counted as a new step
+        """
+        if sample_time <= 0:
+            raise ValueError(f"sample_time must be positive, is {sample_time}")
+        lower, upper = rise_limits
+        if not 0 <= lower < upper <= 1:
+            raise ValueError("rise_limits must satisfy 0 <= lower < upper <= 1")
+        self.sample_time = sample_time
+        self.n_loops = n_loops
+        self.settling_band = settling_band
+        self.rise_limits = (lower, upper)
+        self.step_threshold = step_threshold
+        self._shape = () if n_loops is None else (n_loops,)
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear all accumulators, e.g. for a new run."""
+        self.n_samples = 0
+        self._ise = np.zeros(self._shape)
+        self._iae = np.zeros(self._shape)
+        self._itae = np.zeros(self._shape)
+        self._energy = np.zeros(self._shape)
+        self._max_abs_error = np.zeros(self._shape)
+        self._final_abs_error = np.zeros(self._shape)
+        self._max_abs_input = np.zeros(self._shape)
+        self._reference = np.zeros(self._shape)
+        # Current step: start time, initial output and size
+        self._step_start = np.zeros(self._shape)
+        self._step_initial = np.zeros(self._shape)
+        self._step_size = np.zeros(self._shape)
+        # Largest normalized output (output - initial) / size of the step
+        self._peak_progress = np.full(self._shape, -np.inf)
+        self._rise_start = np.full(self._shape, np.nan)
+        self._rise_end = np.full(self._shape, np.nan)
+        self._last_outside = np.zeros(self._shape)
+        self._outside = np.zeros(self._shape, dtype=bool)
+
+    @property
+    def time(self) -> float:
+        """Time of the next sample."""
+        return self.n_samples * self.sample_time
+
+    def update(self, output, reference, control_input=0.0) -> None:
+        """Add one sample.
+
+        Args:
+            output: Controlled output, scalar or (n_loops,)
+            reference: Reference of the output, scalar or (n_loops,)
+            control_input: Control input, scalar or (n_loops,)
+        """
+        dt = self.sample_time
+        time = self.n_samples * dt
+        output = np.asarray(output, dtype=float)
+        reference = np.asarray(reference, dtype=float)
+        control_input = np.asarray(control_input, dtype=float)
+        error = reference - output
+        abs_error = np.abs(error)
+        self._ise += error * error * dt
+        self._iae += abs_error * dt
+        self._itae += time * abs_error * dt
+        self._energy += control_input * control_input * dt
+        np.maximum(self._max_abs_error, abs_error, out=self._max_abs_error)
+        np.maximum(self._max_abs_input, np.abs(control_input), out=self._max_abs_input)
+        self._final_abs_error[...] = abs_error
+
+        if self.n_samples == 0:
+            new_step = np.ones(self._shape, dtype=bool)
+        else:
+            new_step = np.abs(reference - self._reference) > self.step_threshold
+        if new_step.any():
+            np.copyto(self._step_start, time, where=new_step)
+            np.copyto(self._step_initial, output, where=new_step)
+            np.copyto(self._step_size, error, where=new_step)
+            np.copyto(self._peak_progress, -np.inf, where=new_step)
+            np.copyto(self._rise_start, np.nan, where=new_step)
+            np.copyto(self._rise_end, np.nan, where=new_step)
+            np.copyto(self._last_outside, time - dt, where=new_step)
+        self._reference[...] = reference
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            progress = (output - self._step_initial) / self._step_size
+        np.fmax(self._peak_progress, progress, out=self._peak_progress)
+        lower, upper = self.rise_limits
+        np.copyto(
+            self._rise_start,
+            time,
+            where=np.isnan(self._rise_start) & (progress >= lower),
+        )
+        np.copyto(
+            self._rise_end, time, where=np.isnan(self._rise_end) & (progress >= upper)
+        )
+        self._outside[...] = abs_error > self.settling_band * np.abs(self._step_size)
+        np.copyto(self._last_outside, time, where=self._outside)
+        self.n_samples += 1
+
+    def _value(self, array: np.ndarray):
+        return float(array) if self.n_loops is None else array.copy()
+
+    @property
+    def ise(self):
+        return self._value(self._ise)
+
+    @property
+    def iae(self):
+        return self._value(self._iae)
+
+    @property
+    def itae(self):
+        return self._value(self._itae)
+
+    @property
+    def energy(self):
+        """Integral of the squared control input."""
+        return self._value(self._energy)
+
+    @property
+    def max_abs_error(self):
+        return self._value(self._max_abs_error)
+
+    @property
+    def final_abs_error(self):
+        """Absolute error of the latest sample."""
+        return self._value(self._final_abs_error)
+
+    @property
+    def max_abs_input(self):
+        return self._value(self._max_abs_input)
+
+    @property
+    def overshoot(self):
+        """Peak overshoot of the latest step as fraction of the step size."""
+        with np.errstate(invalid="ignore"):
+            overshoot = np.maximum(self._peak_progress - 1.0, 0.0)
+        overshoot = np.where(self._step_size == 0, np.nan, overshoot)
+        return self._value(overshoot)
+
+    @property
+    def rise_time(self):
+        """Time from the lower to the upper rise limit of the latest step."""
+        rise_time = self._rise_end - self._rise_start
+        return self._value(np.where(self._step_size == 0, np.nan, rise_time))
+
+    @property
+    def settling_time(self):
+        """Time from the latest step until the error stays in the band."""
+        settling_time = self._last_outside + self.sample_time - self._step_start
+        settling_time = np.where(
+            self._outside | (self._step_size == 0), np.nan, settling_time
+        )
+        return self._value(settling_time)
+
+    def summary(self) -> dict:
+        """All measures by the names in METRIC_NAMES.
+
+        Values are floats for a single loop and lists with one entry per
+        loop for a batch, so the summary is JSON serializable.
+        """
+        summary = {}
+        for name in METRIC_NAMES:
+            value = getattr(self, name)
+            summary[name] = value if self.n_loops is None else value.tolist()
+        return summary
@@ -1,40 +1,74 @@
 import matplotlib.pyplot as plt
-from collections import deque
 from typing import NamedTuple
 import numpy as np
 
+from decimation_pyramid import (
+    CAPACITY_DEFAULT,
+    METHODS,
+    RAW_CAPACITY_DEFAULT,
+    DecimationPyramid,
+)
+
 
 class PlotData(NamedTuple):
-    """Container for data to be plotted."""
+    """Container for data to be plotted, (times, values) arrays per channel.
 
-    time: list
-    control_error: list
-    cart_position_x: list
-    cart_velocity_x: list
-    joint_angle: list
-    joint_angular_velocity: list
+    The channels are decimated independently, so each has its own times.
+    """
 
+    control_error: tuple
+    cart_position_x: tuple
+    cart_velocity_x: tuple
+    joint_angle: tuple
+    joint_angular_velocity: tuple
 
-class DataPlotter:
-    """Logs and plots simulation data in real-time using Matplotlib."""
 
-    def __init__(self, max_points: int = 1000, update_interval: int = 50):
+class DataPlotter:
+    """Logs and plots simulation data in real-time using Matplotlib.
+
+    Every channel keeps its whole run in a DecimationPyramid: the last
+    raw_capacity samples (an hour at 60 frames per second by default) at
+    full resolution, older ones as min/max buckets. A redraw queries the
+    visible time window with a fixed point budget, so memory stays bounded
+    and redraws take the same time however long the simulation runs. A
+    window older than the raw samples only comes back at bucket resolution,
+    so zooming into it shows fewer points.
+    """
+
+    def __init__(
+        self,
+        max_points: int = 1000,
+        update_interval: int = 50,
+        history_capacity: int = CAPACITY_DEFAULT,
+        method: str = "minmax",
+        raw_capacity: int = RAW_CAPACITY_DEFAULT,
+    ):
         """
         Initialize the data plotter.
 
         Args:
-            max_points: Maximum number of data points to keep in history
+            max_points: Maximum number of points drawn per line
             update_interval: Number of frames between plot updates (default: 50 frames)
+            history_capacity: Buckets kept per resolution level of each channel
+            method: Decimation of the drawn lines, "minmax" keeps every peak,
+                "lttb" follows the shape with fewer points
+            raw_capacity: Samples kept at full resolution per channel
         """
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {METHODS}, is {method!r}")
         self.max_points = max_points
         self.update_interval = update_interval
-        self.time_buffer = deque(maxlen=max_points)
-        self.control_error_buffer = deque(maxlen=max_points)
-        self.cart_position_x_buffer = deque(maxlen=max_points)
-        self.cart_velocity_x_buffer = deque(maxlen=max_points)
-        self.joint_angle_buffer = deque(maxlen=max_points)
-        self.joint_angular_velocity_buffer = deque(maxlen=max_points)
+        self.method = method
+        self.channels = {
+            name: DecimationPyramid(
+                capacity=history_capacity, raw_capacity=raw_capacity
+            )
+            for name in PlotData._fields
+        }
         self.simulation_time = 0.0
+        # Visible time window (start, stop), None for the whole run
+        self.view = None
+        self._setting_limits = False
 
         self.figure = None
         self.axes = {}
@@ -64,29 +98,53 @@ class DataPlotter:
             time_delta: Time step delta
         """
         self.simulation_time += time_delta
-        self.time_buffer.append(self.simulation_time)
-        self.control_error_buffer.append(control_error)
-        self.cart_position_x_buffer.append(cart_position_x)
-        self.cart_velocity_x_buffer.append(cart_velocity_x)
-        self.joint_angle_buffer.append(joint_angle)
-        self.joint_angular_velocity_buffer.append(joint_angular_velocity)
-
-    def get_plot_data(self) -> PlotData:
+        time = self.simulation_time
+        channels = self.channels
+        channels["control_error"].append(time, control_error)
+        channels["cart_position_x"].append(time, cart_position_x)
+        channels["cart_velocity_x"].append(time, cart_velocity_x)
+        channels["joint_angle"].append(time, joint_angle)
+        channels["joint_angular_velocity"].append(time, joint_angular_velocity)
+
+    def get_plot_data(
+        self, start: float | None = None, stop: float | None = None
+    ) -> PlotData:
         """
-        Get all logged data as lists.
+        Get the logged data of a time window, decimated to max_points per channel.
+
+        Args:
+            start: Window start in seconds, None for the start of the run
+            stop: Window end in seconds, None for the latest sample
 
         Returns:
-            PlotData: Named tuple containing all logged data
+            PlotData: Named tuple of (times, values) arrays per channel
         """
         return PlotData(
-            time=list(self.time_buffer),
-            control_error=list(self.control_error_buffer),
-            cart_position_x=list(self.cart_position_x_buffer),
-            cart_velocity_x=list(self.cart_velocity_x_buffer),
-            joint_angle=list(self.joint_angle_buffer),
-            joint_angular_velocity=list(self.joint_angular_velocity_buffer),
+            **{
+                name: pyramid.query(start, stop, self.max_points, self.method)
+                for name, pyramid in self.channels.items()
+            }
         )
 
+    def set_view(self, start: float | None = None, stop: float | None = None):
+        """
+        Set the plotted time window; without arguments follow the whole run.
+
+        Zooming or panning with the Matplotlib toolbar sets the view as well.
+
+        Args:
+            start: Window start in seconds
+            stop: Window end in seconds
+        """
+        if start is None and stop is None:
+            self.view = None
+        else:
+            self.view = (start, stop)
+
+    def _on_xlim_changed(self, ax):
+        if not self._setting_limits:
+            self.view = ax.get_xlim()
+
     def show_live(self):
         """
         Display the plot in a separate native window with live updates.
@@ -94,7 +152,9 @@ class DataPlotter:
         plt.ion()  # Interactive mode (non-blocking)
 
         # Create figure with 6 subplots (3 rows, 2 columns)
-        self.figure, axes_flat = plt.subplots(3, 2, figsize=(14, 10), tight_layout=True)
+        self.figure, axes_flat = plt.subplots(
+            3, 2, figsize=(14, 10), sharex=True, tight_layout=True
+        )
         axes_flat = axes_flat.flatten()
         self.figure.suptitle("Inverted Pendulum Simulation - Real-time Data")
 
@@ -139,6 +199,8 @@ class DataPlotter:
                 ax.legend(loc="upper left")
 
         self.figure.canvas.draw()
+        # All axes share x, so one callback sees every zoom and pan
+        axes_flat[0].callbacks.connect("xlim_changed", self._on_xlim_changed)
         updates_per_sec = 60.0 / self.update_frequency
         print(
             "Plot window opened. Updates every {} frames (~{:.1f} updates/sec at 60 FPS).".format(
@@ -163,12 +225,11 @@ class DataPlotter:
         if self.frame_counter % self.update_frequency != 0:
             return
 
-        data = self.get_plot_data()
-
-        if len(data.time) == 0:
+        if self.channels["control_error"].n_samples == 0:
             return
 
-        time_array = np.array(data.time)
+        start, stop = (None, None) if self.view is None else self.view
+        data = self.get_plot_data(start, stop)
 
         # Update individual plots
         plot_configs = [
@@ -180,24 +241,20 @@ class DataPlotter:
         ]
 
         for title, data_list in plot_configs:
-            ax = self.axes[title]
             line = self.lines[title][0]
-            line.set_data(time_array, np.array(data_list[0]))
-
-            # Auto-scale axes
-            ax.relim()
-            ax.autoscale_view()
-
-        # Update combined normalized plot
-        def normalize(values):
-            if not values:
-                return np.array([])
-            values_array = np.array(values)
-            min_val = np.min(values_array)
-            max_val = np.max(values_array)
+            line.set_data(*data_list[0])
+
+        # Update combined normalized plot; the decimated points contain the
+        # extremes of the window, so this normalizes over the window
+        def normalize(channel):
+            times, values = channel
+            if len(values) == 0:
+                return times, values
+            min_val = np.min(values)
+            max_val = np.max(values)
             if max_val == min_val:
-                return np.full_like(values_array, 0.5)
-            return (values_array - min_val) / (max_val - min_val)
+                return times, np.full_like(values, 0.5)
+            return times, (values - min_val) / (max_val - min_val)
 
         combined_data = [
             normalize(data.control_error),
@@ -205,14 +262,28 @@ class DataPlotter:
             normalize(data.cart_position_x),
         ]
 
-        ax = self.axes["All States (Normalized)"]
-        for line, data_array in zip(
-            self.lines["All States (Normalized)"], combined_data
-        ):
-            line.set_data(time_array, data_array)
-
-        ax.relim()
-        ax.autoscale_view()
+        for line, channel in zip(self.lines["All States (Normalized)"], combined_data):
+            line.set_data(*channel)
+
+        # Auto-scale y; x shows the whole run unless a view is set. The x
+        # limits are set explicitly, as deferred autoscaling would report
+        # them to _on_xlim_changed like a user zoom
+        if self.view is None:
+            pyramid = self.channels["control_error"]
+            x_limits = (
+                pyramid.start_time,
+                max(pyramid.end_time, pyramid.start_time + 1e-3),
+            )
+        else:
+            x_limits = self.view
+        self._setting_limits = True
+        try:
+            self.axes["Control Error"].set_xlim(x_limits)
+        finally:
+            self._setting_limits = False
+        for ax in self.axes.values():
+            ax.relim()
+            ax.autoscale_view(scalex=False)
 
         # Draw updates
         self.figure.canvas.draw_idle()
@@ -235,11 +306,8 @@ class DataPlotter:
 
     def clear(self):
         """Clear all logged data."""
-        self.time_buffer.clear()
-        self.control_error_buffer.clear()
-        self.cart_position_x_buffer.clear()
-        self.cart_velocity_x_buffer.clear()
-        self.joint_angle_buffer.clear()
-        self.joint_angular_velocity_buffer.clear()
+        for pyramid in self.channels.values():
+            pyramid.clear()
         self.simulation_time = 0.0
+        self.view = None
         self.frame_counter = 0
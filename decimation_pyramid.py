@@ -0,0 +1,364 @@
+"""Multi-resolution min/max and LTTB summaries of long telemetry channels.
+
+A DecimationPyramid keeps the most recent samples of a channel at full
+resolution and, on every coarser level, buckets aggregating `factor`
+buckets of the level below. Each level is a ring buffer of fixed capacity,
+so older data survives at coarser resolution and memory grows only with
+the logarithm of the run length. Windows older than the raw level come
+back at the resolution of the finest level still holding them. A query picks the finest level that
+covers the requested window within the point budget, so the number of
+points drawn and the cost of a redraw do not depend on the run length.
+"""
+
+import numpy as np
+
+CAPACITY_DEFAULT = 2048
+# An hour of samples at 60 frames per second
+RAW_CAPACITY_DEFAULT = 60 * 60 * 60
+FACTOR_DEFAULT = 4
+METHODS = ("minmax", "lttb")
+
+_FIELDS = (
+    "start",
+    "end",
+    "min",
+    "max",
+    "time_of_min",
+    "time_of_max",
+    "mean_time",
+    "mean_value",
+    "rep_time",
+    "rep_value",
+)
+
+
+class _Level:
+    """Ring buffer of the buckets of one pyramid level."""
+
+    def __init__(self, capacity: int, raw: bool):
+        self.capacity = capacity
+        self.count = 0
+        if raw:
+            # A raw sample is a bucket of one: all times and all values alias
+            time = np.zeros(capacity)
+            value = np.zeros(capacity)
+            self.arrays = {
+                name: time if "time" in name or name in ("start", "end") else value
+                for name in _FIELDS
+            }
+        else:
+            self.arrays = {name: np.zeros(capacity) for name in _FIELDS}
+
+    @property
+    def nbytes(self) -> int:
+        unique = {id(array): array for array in self.arrays.values()}
+        return sum(array.nbytes for array in unique.values())
+
+    @property
+    def first_index(self) -> int:
+        """Global index of the oldest bucket still held."""
+        return max(0, self.count - self.capacity)
+
+    def ordered(self, name: str, first: int, stop: int) -> np.ndarray:
+        """Field values of the global bucket indices [first, stop)."""
+        rows = np.arange(first, stop) % self.capacity
+        return self.arrays[name][rows]
+
+    def search(self, name: str, first: int, stop: int, value: float, side: str) -> int:
+        """Global index in [first, stop) at which value sorts into field name.
+
+        The range covers at most two contiguous runs of the ring, which are
+        searched in place, so the cost does not grow with the capacity.
+        """
+        array = self.arrays[name]
+        row = first % self.capacity
+        split = min(stop, first + self.capacity - row)
+        head = array[row : row + split - first]
+        position = int(np.searchsorted(head, value, side=side))
+        if position < len(head) or split == stop:
+            return first + position
+        tail = array[: stop - split]
+        return split + int(np.searchsorted(tail, value, side=side))
+
+    def window(self, first: int, stop: int, start_time: float, stop_time: float):
+        """Global index range of [first, stop) overlapping the time window."""
+        lower = self.search("end", first, stop, start_time, "left")
+        upper = self.search("start", first, stop, stop_time, "right")
+        return lower, max(lower, upper)
+
+
+class DecimationPyramid:
+    """Bounded multi-resolution history of one telemetry channel.
+
+    Level 0 holds raw (time, value) samples, level k buckets of factor^k
+    samples with their minimum, maximum, mean and one LTTB (largest
+    triangle three buckets) representative. The LTTB representative of a
+    bucket is chosen among the representatives of its children once the
+    following bucket is complete; until then it is the extreme farthest
+    from the bucket mean. Appending is amortized O(1); levels are added as
+    the run grows.
+
+    Only the last raw_capacity samples can be queried at full resolution;
+    a window older than that, e.g. a single second from the start of a
+    longer run, returns the buckets of the finest level still holding it.
+    """
+
+    def __init__(
+        self,
+        capacity: int = CAPACITY_DEFAULT,
+        factor: int = FACTOR_DEFAULT,
+        raw_capacity: int = RAW_CAPACITY_DEFAULT,
+    ):
+        """Create an empty pyramid.
+
+        Args:
+            capacity: Buckets kept per aggregated level
+            factor: Buckets of one level aggregated into a bucket of the
+                next coarser level
+            raw_capacity: Raw samples kept in level 0
+        """
+        if factor < 2:
+            raise ValueError(f"factor must be at least 2, is {factor}")
+        if capacity < 2 * factor:
+            raise ValueError(
+                f"capacity must be at least 2 * factor = {2 * factor}, is {capacity}"
+            )
+        if raw_capacity < capacity:
+            raise ValueError(
+                f"raw_capacity must be at least capacity = {capacity}, "
+                f"is {raw_capacity}"
+            )
+        self.capacity = capacity
+        self.factor = factor
+        self.raw_capacity = raw_capacity
+        self.clear()
+
+    def clear(self) -> None:
+        """Drop all samples."""
+        self._levels = [_Level(self.raw_capacity, raw=True)]
+        self._start_time = np.nan
+        # Aggregate of the incomplete bucket of every level above 0
+        self._open = []
+
+    @property
+    def n_samples(self) -> int:
+        return self._levels[0].count
+
+    @property
+    def n_levels(self) -> int:
+        return len(self._levels)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the bucket arrays."""
+        return sum(level.nbytes for level in self._levels)
+
+    @property
+    def start_time(self) -> float:
+        """Time of the first sample ever appended."""
+        return self._start_time
+
+    @property
+    def end_time(self) -> float:
+        """Time of the latest sample."""
+        level = self._levels[0]
+        if level.count == 0:
+            return np.nan
+        return float(level.arrays["end"][(level.count - 1) % level.capacity])
+
+    def append(self, time: float, value: float) -> None:
+        """Add a sample; times must not decrease."""
+        level = self._levels[0]
+        if level.count == 0:
+            self._start_time = time
+        row = level.count % level.capacity
+        level.arrays["rep_time"][row] = time
+        level.arrays["rep_value"][row] = value
+        level.count += 1
+        self._add_child(1, time, time, value, value, time, time, time, value)
+
+    def _add_child(
+        self,
+        k,
+        start,
+        end,
+        minimum,
+        maximum,
+        time_of_min,
+        time_of_max,
+        mean_time,
+        mean_value,
+    ) -> None:
+        """Aggregate a closed bucket of level k - 1 into the open bucket of k."""
+        if len(self._open) < k:
+            self._open.append(None)
+        bucket = self._open[k - 1]
+        if bucket is None:
+            self._open[k - 1] = {
+                "start": start,
+                "end": end,
+                "min": minimum,
+                "max": maximum,
+                "time_of_min": time_of_min,
+                "time_of_max": time_of_max,
+                "sum_time": mean_time,
+                "sum_value": mean_value,
+                "children": 1,
+            }
+            return
+        bucket["end"] = end
+        if minimum < bucket["min"]:
+            bucket["min"] = minimum
+            bucket["time_of_min"] = time_of_min
+        if maximum > bucket["max"]:
+            bucket["max"] = maximum
+            bucket["time_of_max"] = time_of_max
+        bucket["sum_time"] += mean_time
+        bucket["sum_value"] += mean_value
+        bucket["children"] += 1
+        if bucket["children"] == self.factor:
+            self._open[k - 1] = None
+            self._close(k, bucket)
+
+    def _close(self, k: int, bucket: dict) -> None:
+        if len(self._levels) == k:
+            self._levels.append(_Level(self.capacity, raw=False))
+        level = self._levels[k]
+        arrays = level.arrays
+        row = level.count % level.capacity
+        mean_time = bucket["sum_time"] / self.factor
+        mean_value = bucket["sum_value"] / self.factor
+        for name in ("start", "end", "min", "max", "time_of_min", "time_of_max"):
+            arrays[name][row] = bucket[name]
+        arrays["mean_time"][row] = mean_time
+        arrays["mean_value"][row] = mean_value
+        # Provisional representative: the extreme farthest from the mean
+        if bucket["max"] - mean_value >= mean_value - bucket["min"]:
+            arrays["rep_time"][row] = bucket["time_of_max"]
+            arrays["rep_value"][row] = bucket["max"]
+        else:
+            arrays["rep_time"][row] = bucket["time_of_min"]
+            arrays["rep_value"][row] = bucket["min"]
+        level.count += 1
+        if level.count >= 2:
+            self._select_representative(k, level.count - 2, mean_time, mean_value)
+        self._add_child(
+            k + 1,
+            bucket["start"],
+            bucket["end"],
+            bucket["min"],
+            bucket["max"],
+            bucket["time_of_min"],
+            bucket["time_of_max"],
+            mean_time,
+            mean_value,
+        )
+
+    def _select_representative(
+        self, k: int, index: int, next_time: float, next_value: float
+    ) -> None:
+        """LTTB choice for bucket index of level k among its children."""
+        level = self._levels[k]
+        children = self._levels[k - 1]
+        first_child = index * self.factor
+        if first_child < children.first_index:
+            return
+        times = children.ordered("rep_time", first_child, first_child + self.factor)
+        values = children.ordered("rep_value", first_child, first_child + self.factor)
+        if index == 0:
+            previous_time, previous_value = times[0], values[0]
+        else:
+            row = (index - 1) % level.capacity
+            previous_time = level.arrays["rep_time"][row]
+            previous_value = level.arrays["rep_value"][row]
+        areas = np.abs(
+            (previous_time - next_time) * (values - previous_value)
+            - (previous_time - times) * (next_value - previous_value)
+        )
+        best = int(np.argmax(areas))
+        row = index % level.capacity
+        level.arrays["rep_time"][row] = times[best]
+        level.arrays["rep_value"][row] = values[best]
+
+    def query(
+        self,
+        start: float | None = None,
+        stop: float | None = None,
+        max_points: int = 1000,
+        method: str = "minmax",
+    ):
+        """Decimated samples of a time window.
+
+        Args:
+            start: Window start, None for the oldest sample held
+            stop: Window end, None for the latest sample
+            max_points: Upper bound of the returned points
+            method: "minmax" returns the minimum and maximum of every bucket,
+                so no peak is lost; "lttb" one representative per bucket,
+                which follows the visual shape with half the points
+
+        Returns:
+            tuple: (times, values) arrays in time order
+        """
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {METHODS}, is {method!r}")
+        if self.n_samples == 0:
+            return np.zeros(0), np.zeros(0)
+        start = -np.inf if start is None else start
+        stop = np.inf if stop is None else stop
+        points_per_bucket = 2 if method == "minmax" else 1
+
+        # Finest level that still holds the window start and fits the budget;
+        # the incomplete tail adds at most factor - 1 buckets per level below
+        chosen = len(self._levels) - 1
+        for k, level in enumerate(self._levels):
+            if level.count == 0:
+                break
+            first = level.first_index
+            if first > 0 and level.ordered("start", first, first + 1)[0] > start:
+                continue
+            lower, upper = level.window(first, level.count, start, stop)
+            buckets = upper - lower + k * (self.factor - 1)
+            if buckets * (points_per_bucket if k else 1) <= max_points:
+                chosen = k
+                break
+
+        pieces = []
+        begin = None
+        for k in range(chosen, -1, -1):
+            level = self._levels[k]
+            first = (
+                level.first_index if begin is None else max(begin, level.first_index)
+            )
+            lower, upper = level.window(first, level.count, start, stop)
+            if upper > lower:
+                pieces.append(self._points(k, lower, upper, method))
+            # Finer levels only add what is not yet aggregated into level k
+            begin = level.count * self.factor
+        times = (
+            np.concatenate([piece[0] for piece in pieces]) if pieces else np.zeros(0)
+        )
+        values = (
+            np.concatenate([piece[1] for piece in pieces]) if pieces else np.zeros(0)
+        )
+        return times, values
+
+    def _points(self, k: int, lower: int, upper: int, method: str):
+        level = self._levels[k]
+        if k == 0 or method == "lttb":
+            return (
+                level.ordered("rep_time", lower, upper),
+                level.ordered("rep_value", lower, upper),
+            )
+        time_of_min = level.ordered("time_of_min", lower, upper)
+        time_of_max = level.ordered("time_of_max", lower, upper)
+        minimum = level.ordered("min", lower, upper)
+        maximum = level.ordered("max", lower, upper)
+        min_first = time_of_min <= time_of_max
+        times = np.empty(2 * (upper - lower))
+        values = np.empty(2 * (upper - lower))
+        times[0::2] = np.where(min_first, time_of_min, time_of_max)
+        times[1::2] = np.where(min_first, time_of_max, time_of_min)
+        values[0::2] = np.where(min_first, minimum, maximum)
+        values[1::2] = np.where(min_first, maximum, minimum)
+        return times, values
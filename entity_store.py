@@ -0,0 +1,214 @@
+"""Structure-of-arrays storage and batched drawing of many circular bodies.
+
+GameObject subclasses like Ball keep one Python object per body and draw
+it with its own pygame.draw call, which is fine for a handful of bodies but
+not for particle or debris scenes with thousands. An EntityStore keeps the
+positions, velocities, radii and colors of all its balls in NumPy arrays,
+reads the body data from pymunk in one batched call and draws all balls
+with a single Surface.blits of pre-rendered sprites shared by all balls of
+the same radius and color.
+"""
+
+import numpy as np
+import pygame
+import pymunk
+import pymunk.batch
+
+CAPACITY_DEFAULT = 1024
+BALL_COLOR = (150, 0, 200)
+
+_SYNC_FIELDS = (
+    pymunk.batch.BodyFields.BODY_ID
+    | pymunk.batch.BodyFields.POSITION
+    | pymunk.batch.BodyFields.VELOCITY
+)
+# Floats per body of _SYNC_FIELDS: position x, y and velocity x, y
+_SYNC_FLOATS = 4
+
+
+class EntityStore:
+    """Balls of one pymunk space stored as arrays, one row per ball.
+
+    The arrays grow by doubling as balls are added; positions, velocities,
+    radii and colors return views of the rows in use. The positions are
+    updated by sync_from_space(), which the owner calls after stepping the
+    space, like PlantBase subclasses sync their cached state.
+    """
+
+    def __init__(self, space: pymunk.Space, capacity: int = CAPACITY_DEFAULT):
+        """Create an empty store.
+
+        Args:
+            space: Space the balls are added to
+            capacity: Initially allocated rows
+        """
+        self.space = space
+        self.bodies: list = []
+        self._positions = np.zeros((capacity, 2))
+        self._velocities = np.zeros((capacity, 2))
+        self._radii = np.zeros(capacity)
+        self._colors = np.zeros((capacity, 3), dtype=np.uint8)
+        # Sprite of every ball, shared between balls of equal radius and color
+        self._sprites: list = []
+        self._sprite_cache: dict = {}
+        # Body ids in ascending order and the row of each, to place the
+        # batched body data, which comes in the space's order; rebuilt by
+        # the first sync after adding balls
+        self._sorted_ids = None
+        self._sorted_rows = None
+        self._sync_buffer = pymunk.batch.Buffer()
+
+    def __len__(self) -> int:
+        return len(self.bodies)
+
+    @property
+    def positions(self) -> np.ndarray:
+        """(n, 2) ball positions as of the last sync."""
+        return self._positions[: len(self.bodies)]
+
+    @property
+    def velocities(self) -> np.ndarray:
+        """(n, 2) ball velocities as of the last sync."""
+        return self._velocities[: len(self.bodies)]
+
+    @property
+    def radii(self) -> np.ndarray:
+        return self._radii[: len(self.bodies)]
+
+    @property
+    def colors(self) -> np.ndarray:
+        """(n, 3) RGB colors as uint8."""
+        return self._colors[: len(self.bodies)]
+
+    def add_ball(
+        self,
+        position,
+        mass: float,
+        radius: float = 15,
+        color: tuple = BALL_COLOR,
+        elasticity: float = 0.95,
+        friction: float = 0.9,
+    ) -> int:
+        """Add a dynamic ball to the space and the store.
+
+        Args:
+            position: Initial position of the center
+            mass: Mass of the ball
+            radius: Radius in pixels
+            color: RGB color
+            elasticity: Elasticity of the circle shape
+            friction: Friction of the circle shape
+
+        Returns:
+            int: Row of the ball in the arrays
+        """
+        rows = self.add_balls([position], mass, radius, [color], elasticity, friction)
+        return int(rows[0])
+
+    def add_balls(
+        self, positions, masses, radii, colors=None, elasticity=0.95, friction=0.9
+    ) -> np.ndarray:
+        """Add many balls at once, see add_ball.
+
+        Args:
+            positions: (n, 2) initial positions
+            masses: Mass of every ball or one for all
+            radii: Radius of every ball or one for all
+            colors: (n, 3) RGB colors, one RGB color for all or None for
+                BALL_COLOR
+            elasticity: Elasticity of the circle shapes
+            friction: Friction of the circle shapes
+
+        Returns:
+            np.ndarray: Rows of the new balls
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        count = len(positions)
+        first = len(self.bodies)
+        if first + count > len(self._radii):
+            self._grow(max(2 * len(self._radii), first + count))
+        masses = np.broadcast_to(np.asarray(masses, dtype=float), (count,))
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), (count,))
+        colors = np.broadcast_to(
+            np.asarray(BALL_COLOR if colors is None else colors, dtype=np.uint8),
+            (count, 3),
+        )
+        shapes = []
+        for position, mass, radius in zip(
+            positions.tolist(), masses.tolist(), radii.tolist()
+        ):
+            body = pymunk.Body(mass, pymunk.moment_for_circle(mass, 0, radius))
+            body.position = position
+            shape = pymunk.Circle(body, radius)
+            shape.elasticity = elasticity
+            shape.friction = friction
+            self.bodies.append(body)
+            shapes.extend((body, shape))
+        self.space.add(*shapes)
+        rows = np.arange(first, first + count)
+        self._positions[rows] = positions
+        self._radii[rows] = radii
+        self._colors[rows] = colors
+        for radius, color in zip(radii.tolist(), map(tuple, colors.tolist())):
+            self._sprites.append(self._sprite(radius, color))
+        self._sorted_ids = None
+        return rows
+
+    def _grow(self, capacity: int) -> None:
+        count = len(self.bodies)
+        for name in ("_positions", "_velocities", "_radii", "_colors"):
+            old = getattr(self, name)
+            new = np.zeros((capacity, *old.shape[1:]), dtype=old.dtype)
+            new[:count] = old[:count]
+            setattr(self, name, new)
+
+    def _index_bodies(self) -> None:
+        ids = np.array([body.id for body in self.bodies], dtype=np.intp)
+        self._sorted_rows = np.argsort(ids)
+        self._sorted_ids = ids[self._sorted_rows]
+
+    def _sprite(self, radius: float, color: tuple) -> pygame.Surface:
+        key = (radius, color)
+        sprite = self._sprite_cache.get(key)
+        if sprite is None:
+            size = 2 * int(np.ceil(radius))
+            sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, color, (size // 2, size // 2), radius)
+            if pygame.display.get_surface() is not None:
+                # Match the display pixel format for faster blits
+                sprite = sprite.convert_alpha()
+            self._sprite_cache[key] = sprite
+        return sprite
+
+    def sync_from_space(self) -> None:
+        """Read positions and velocities of all balls in one batched call.
+
+        Bodies of the space that are not in the store, e.g. walls, are
+        ignored.
+        """
+        count = len(self.bodies)
+        if count == 0:
+            return
+        if self._sorted_ids is None:
+            self._index_bodies()
+        buffer = self._sync_buffer
+        buffer.clear()
+        pymunk.batch.get_space_bodies(self.space, _SYNC_FIELDS, buffer)
+        ids = np.frombuffer(buffer.int_buf(), dtype=np.intp)
+        data = np.frombuffer(buffer.float_buf(), dtype=np.float64)
+        data = data.reshape(-1, _SYNC_FLOATS)
+        slots = np.searchsorted(self._sorted_ids, ids).clip(max=count - 1)
+        known = self._sorted_ids[slots] == ids
+        rows = self._sorted_rows[slots[known]]
+        self._positions[rows] = data[known, :2]
+        self._velocities[rows] = data[known, 2:]
+
+    def draw(self, surface: pygame.Surface) -> None:
+        """Blit the sprites of all balls in one Surface.blits call."""
+        count = len(self.bodies)
+        if count == 0:
+            return
+        # Sprites are 2 * ceil(radius) wide with the center in the middle
+        offsets = np.ceil(self._radii[:count, None])
+        corners = np.rint(self._positions[:count] - offsets)
+        surface.blits(zip(self._sprites, corners.astype(int).tolist()), False)
@@ -0,0 +1,255 @@
+import json
+import os
+import queue
+import struct
+import sys
+import threading
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pygame
+
+FRAME_RATE = 60.0
+QUEUE_SIZE_DEFAULT = 8
+# Header of .zraw files: magic, width, height, frames per second
+ZRAW_HEADER = struct.Struct("<4sIId")
+ZRAW_MAGIC = b"DSZR"
+ZRAW_FRAME_LENGTH = struct.Struct("<I")
+ZRAW_COMPRESSION_LEVEL = 1
+
+
+class _RawWriter:
+    """Uncompressed rgb24 frames back to back, described by a JSON sidecar.
+
+    Convert with: ffmpeg -f rawvideo -pix_fmt rgb24 -s WxH -r FPS -i file.raw
+    """
+
+    def __init__(self, path: Path, width: int, height: int, fps: float):
+        self.file = open(path, "wb")
+        metadata = {"width": width, "height": height, "fps": fps, "pix_fmt": "rgb24"}
+        Path(str(path) + ".json").write_text(json.dumps(metadata), encoding="utf-8")
+
+    def write(self, frame: np.ndarray) -> None:
+        self.file.write(frame.tobytes())
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class _ZrawWriter:
+    """zlib compressed rgb24 frames, each prefixed with its byte length.
+
+    Game frames consist of large flat areas, so the fastest zlib level
+    already shrinks them by one to two orders of magnitude.
+    """
+
+    def __init__(self, path: Path, width: int, height: int, fps: float):
+        self.file = open(path, "wb")
+        self.file.write(ZRAW_HEADER.pack(ZRAW_MAGIC, width, height, fps))
+
+    def write(self, frame: np.ndarray) -> None:
+        data = zlib.compress(frame.tobytes(), ZRAW_COMPRESSION_LEVEL)
+        self.file.write(ZRAW_FRAME_LENGTH.pack(len(data)))
+        self.file.write(data)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class _GifWriter:
+    """Animated GIF via Pillow, written when the recording is closed."""
+
+    def __init__(self, path: Path, width: int, height: int, fps: float):
+        try:
+            from PIL import Image
+        except ImportError as error:
+            raise ValueError(
+                "GIF recording needs Pillow; record to .zraw or .raw instead"
+            ) from error
+        self._image_module = Image
+        self.path = path
+        # GIF delays are multiples of 10 ms
+        self.duration = max(10, round(1000 / fps / 10) * 10)
+        self.frames: list = []
+
+    def write(self, frame: np.ndarray) -> None:
+        image = self._image_module.fromarray(frame)
+        self.frames.append(image.quantize(colors=256, method=2))
+
+    def close(self) -> None:
+        if self.frames:
+            self.frames[0].save(
+                self.path,
+                save_all=True,
+                append_images=self.frames[1:],
+                duration=self.duration,
+                loop=0,
+            )
+
+
+WRITERS = {".raw": _RawWriter, ".zraw": _ZrawWriter, ".gif": _GifWriter}
+
+
+class FrameRecorder:
+    """Records rendered frames on a background encoder thread.
+
+    capture() copies the 32 bit screen pixels through a zero-copy surfarray
+    view into one of a fixed set of preallocated buffers and queues it;
+    color conversion, compression and writing happen on the encoder thread. The queue is
+    bounded: when the encoder falls behind, capture() either drops the
+    frame (interactive play keeps its frame rate) or waits for a free
+    buffer (headless recording keeps every frame).
+    """
+
+    def __init__(
+        self,
+        path,
+        frame_size: tuple,
+        fps: float = FRAME_RATE,
+        frame_step: int = 1,
+        queue_size: int = QUEUE_SIZE_DEFAULT,
+        drop_frames: bool = True,
+    ):
+        """Open the output and start the encoder thread.
+
+        Args:
+            path: Output file; the suffix selects the format: .zraw
+                (compressed frame stream), .raw (raw rgb24 stream with JSON
+                sidecar) or .gif (needs Pillow)
+            frame_size: (width, height) of the recorded surface
+            fps: Frame rate of the game loop
+            frame_step: Record every frame_step-th captured frame
+            queue_size: Number of frames buffered for the encoder
+            drop_frames: Drop frames instead of waiting when the queue is full
+        """
+        self.path = Path(path)
+        writer_type = WRITERS.get(self.path.suffix.lower())
+        if writer_type is None:
+            raise ValueError(
+                f"unsupported recording format {self.path.suffix!r}, "
+                f"use one of {sorted(WRITERS)}"
+            )
+        if frame_step < 1:
+            raise ValueError(f"frame_step must be at least 1, is {frame_step}")
+        width, height = frame_size
+        self.frame_size = (width, height)
+        self.frame_step = frame_step
+        self.drop_frames = drop_frames
+        self._writer = writer_type(self.path, width, height, fps / frame_step)
+
+        # Buffers hold the 32 bit pixels row by row, so copying from the
+        # transposed surfarray view is a plain memory copy; the encoder
+        # extracts the color channels
+        self._free_buffers: queue.Queue = queue.Queue()
+        for _ in range(queue_size):
+            self._free_buffers.put(np.empty((height, width), dtype=np.uint32))
+        self._channels = None
+        self._frames: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._capture_counter = 0
+        self.frames_recorded = 0
+        self.frames_dropped = 0
+        self.frames_written = 0
+        self._thread = threading.Thread(
+            target=self._encode, name="frame-encoder", daemon=True
+        )
+        self._thread.start()
+
+    def capture(self, surface: pygame.Surface) -> bool:
+        """Queue the current content of surface for encoding.
+
+        Returns:
+            bool: False if the frame was skipped by frame_step or dropped
+        """
+        if self._error is not None:
+            raise RuntimeError("frame encoder failed") from self._error
+        self._capture_counter += 1
+        if (self._capture_counter - 1) % self.frame_step:
+            return False
+        if self._channels is None:
+            self._channels = self._channel_indices(surface)
+        if surface.get_size() != self.frame_size:
+            raise ValueError(
+                f"surface size {surface.get_size()} differs from the recording "
+                f"size {self.frame_size}"
+            )
+        try:
+            buffer = self._free_buffers.get(block=not self.drop_frames)
+        except queue.Empty:
+            self.frames_dropped += 1
+            return False
+        view = pygame.surfarray.pixels2d(surface)
+        np.copyto(buffer, view.T)
+        # Release the view, it keeps the surface locked
+        del view
+        self._frames.put(buffer)
+        self.frames_recorded += 1
+        return True
+
+    @staticmethod
+    def _channel_indices(surface: pygame.Surface) -> list:
+        """Byte offsets of red, green and blue within a 32 bit pixel."""
+        if surface.get_bytesize() != 4:
+            raise ValueError(
+                f"only 32 bit surfaces can be recorded, got {surface.get_bitsize()} bit"
+            )
+        indices = [shift // 8 for shift in surface.get_shifts()[:3]]
+        if sys.byteorder == "big":
+            indices = [3 - index for index in indices]
+        return indices
+
+    def _encode(self):
+        while True:
+            buffer = self._frames.get()
+            if buffer is None:
+                break
+            try:
+                if self._error is None:
+                    height, width = buffer.shape
+                    pixel_bytes = buffer.view(np.uint8).reshape(height, width, 4)
+                    self._writer.write(pixel_bytes[:, :, self._channels])
+                    self.frames_written += 1
+            except Exception as error:
+                # Reported to the game thread by the next capture() or close()
+                self._error = error
+            finally:
+                self._free_buffers.put(buffer)
+
+    def close(self) -> None:
+        """Encode all queued frames and close the output."""
+        self._frames.put(None)
+        self._thread.join()
+        self._writer.close()
+        if self._error is not None:
+            raise RuntimeError("frame encoder failed") from self._error
+
+
+def iter_recorded_frames(path):
+    """Yield the frames of a .zraw or .raw recording as (height, width, 3) arrays."""
+    path = Path(path)
+    if path.suffix.lower() == ".zraw":
+        with open(path, "rb") as file:
+            magic, width, height, _ = ZRAW_HEADER.unpack(file.read(ZRAW_HEADER.size))
+            if magic != ZRAW_MAGIC:
+                raise ValueError(f"{path} is not a .zraw recording")
+            while length_bytes := file.read(ZRAW_FRAME_LENGTH.size):
+                (length,) = ZRAW_FRAME_LENGTH.unpack(length_bytes)
+                data = zlib.decompress(file.read(length))
+                yield np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+    elif path.suffix.lower() == ".raw":
+        metadata = json.loads(Path(str(path) + ".json").read_text(encoding="utf-8"))
+        frame_bytes = metadata["width"] * metadata["height"] * 3
+        with open(path, "rb") as file:
+            while len(data := file.read(frame_bytes)) == frame_bytes:
+                yield np.frombuffer(data, dtype=np.uint8).reshape(
+                    metadata["height"], metadata["width"], 3
+                )
+    else:
+        raise ValueError(f"cannot read back {path.suffix!r} recordings")
+
+
+def configure_headless() -> None:
+    """Render without a visible window; call before the game is created."""
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
@@ -11,6 +11,17 @@ class GameControllerBase(ABC):
         # Process system output and return control input
         pass
 
+    def snapshot(self) -> np.ndarray:
+        """Internal memory that affects future control inputs, as flat array.
+
+        Used together with PlantBase.snapshot to branch simulations from one
+        state. Stateless controllers return an empty array.
+        """
+        return np.zeros(0)
+
+    def restore(self, snapshot) -> None:
+        """Restore the memory captured by snapshot()."""
+
 
 class ControllerPID(GameControllerBase):
     def __init__(self, kp: float, ki: float, kd: float, sample_time: float):
@@ -61,6 +72,13 @@ class ControllerPID(GameControllerBase):
         )
         return control_signal
 
+    def snapshot(self) -> np.ndarray:
+        return np.array([self.integral, self.previous_error], dtype=float)
+
+    def restore(self, snapshot) -> None:
+        self.integral = float(snapshot[0])
+        self.previous_error = float(snapshot[1])
+
 
 class StateFeedbackController(GameControllerBase):
     def __init__(self, gain_matrix, sample_time: float):
@@ -74,3 +92,173 @@ class StateFeedbackController(GameControllerBase):
             state_vector = np.array(state_vector)
         control_signal = -self.gain_matrix @ state_vector
         return control_signal
+
+
+class ControllerPIDBank(GameControllerBase):
+    """Bank of independent PID loops evaluated with one array operation.
+
+    Gains may be scalars (shared by all loops) or arrays with one entry per
+    loop. Integrator and derivative memory is kept per loop, so a bank of N
+    loops behaves like N ControllerPID instances.
+    """
+
+    def __init__(self, kp, ki, kd, sample_time: float, n_loops: int):
+        super().__init__()
+        self.n_loops = n_loops
+        self.sample_time = sample_time
+        self._kp = np.zeros(n_loops)
+        self._ki = np.zeros(n_loops)
+        self._kd = np.zeros(n_loops)
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.integral = np.zeros(n_loops)
+        self.previous_error = np.zeros(n_loops)
+        self._control_signal = np.zeros(n_loops)
+        self._derivative = np.zeros(n_loops)
+        self._term = np.zeros(n_loops)
+
+    @classmethod
+    def from_controllers(cls, controllers: list) -> "ControllerPIDBank":
+        """Create a bank with the gains and memory of ControllerPID instances.
+
+        Args:
+            controllers: ControllerPIDs sharing the same sample time
+        """
+        sample_times = {controller.sample_time for controller in controllers}
+        if len(sample_times) != 1:
+            raise ValueError(
+                f"controllers must share one sample time, got {sorted(sample_times)}"
+            )
+        bank = cls(
+            kp=[controller.kp for controller in controllers],
+            ki=[controller.ki for controller in controllers],
+            kd=[controller.kd for controller in controllers],
+            sample_time=sample_times.pop(),
+            n_loops=len(controllers),
+        )
+        bank.integral[:] = [controller.integral for controller in controllers]
+        bank.previous_error[:] = [
+            controller.previous_error for controller in controllers
+        ]
+        return bank
+
+    def _set_gain(self, name: str, target: np.ndarray, value) -> None:
+        try:
+            target[:] = np.broadcast_to(np.asarray(value, dtype=float), target.shape)
+        except (TypeError, ValueError) as error:
+            raise TypeError(
+                f"{name} must be a number or an array of {self.n_loops} numbers"
+            ) from error
+
+    @property
+    def kp(self) -> np.ndarray:
+        return self._kp
+
+    @kp.setter
+    def kp(self, value):
+        self._set_gain("kp", self._kp, value)
+
+    @property
+    def ki(self) -> np.ndarray:
+        return self._ki
+
+    @ki.setter
+    def ki(self, value):
+        self._set_gain("ki", self._ki, value)
+
+    @property
+    def kd(self) -> np.ndarray:
+        return self._kd
+
+    @kd.setter
+    def kd(self, value):
+        self._set_gain("kd", self._kd, value)
+
+    def get_control_input(self, control_error, out: np.ndarray = None):
+        """Compute the control signal of all loops.
+
+        Args:
+            control_error: Array of shape (n_loops,) with one error per loop
+            out: Optional buffer of shape (n_loops,) for the result
+
+        Returns:
+            np.ndarray: Control signals, shape (n_loops,). Without out, an
+            internal array is reused between calls; copy it if it needs to
+            outlive the next call.
+        """
+        if out is None:
+            out = self._control_signal
+        term = self._term
+        np.multiply(control_error, self.sample_time, out=term)
+        self.integral += term
+        np.subtract(control_error, self.previous_error, out=self._derivative)
+        self._derivative /= self.sample_time
+        self.previous_error[:] = control_error
+        np.multiply(self._kp, control_error, out=out)
+        np.multiply(self._ki, self.integral, out=term)
+        out += term
+        np.multiply(self._kd, self._derivative, out=term)
+        out += term
+        return out
+
+    def reset(self) -> None:
+        """Clear integrator and derivative memory of all loops."""
+        self.integral[:] = 0.0
+        self.previous_error[:] = 0.0
+
+    def snapshot(self) -> np.ndarray:
+        """Integrals of all loops followed by their previous errors."""
+        return np.concatenate((self.integral, self.previous_error))
+
+    def restore(self, snapshot) -> None:
+        self.integral[:] = snapshot[: self.n_loops]
+        self.previous_error[:] = snapshot[self.n_loops :]
+
+
+class StateFeedbackControllerBank(GameControllerBase):
+    """Bank of state feedback loops u = -K x evaluated in one call.
+
+    States of all loops are passed as one (n_states, n_loops) block. The gain
+    is either one (n_inputs, n_states) matrix shared by all loops or an
+    (n_loops, n_inputs, n_states) stack with one matrix per loop.
+    """
+
+    def __init__(self, gain_matrix, sample_time: float, n_loops: int):
+        super().__init__()
+        gain_matrix = np.asarray(gain_matrix, dtype=float)
+        if gain_matrix.ndim == 3 and gain_matrix.shape[0] != n_loops:
+            raise ValueError(
+                f"per-loop gain stack has {gain_matrix.shape[0]} matrices, "
+                f"expected {n_loops}"
+            )
+        if gain_matrix.ndim not in (2, 3):
+            raise ValueError(
+                "gain_matrix must have shape (n_inputs, n_states) or "
+                f"(n_loops, n_inputs, n_states), but has {gain_matrix.shape}"
+            )
+        self.sample_time = sample_time
+        self.n_loops = n_loops
+        self.gain_matrix = gain_matrix
+        self.n_inputs, self.n_states = gain_matrix.shape[-2:]
+        self._control_signal = np.zeros((self.n_inputs, n_loops))
+
+    def get_control_input(self, state_block, out: np.ndarray = None):
+        """Compute -K @ X for all loops.
+
+        Args:
+            state_block: Array of shape (n_states, n_loops), one column per loop
+            out: Optional buffer of shape (n_inputs, n_loops) for the result
+
+        Returns:
+            np.ndarray: Control signals, shape (n_inputs, n_loops). Without
+            out, an internal array is reused between calls.
+        """
+        if out is None:
+            out = self._control_signal
+        if self.gain_matrix.ndim == 2:
+            np.matmul(self.gain_matrix, state_block, out=out)
+        else:
+            np.einsum("lin,nl->il", self.gain_matrix, state_block, out=out)
+        np.negative(out, out=out)
+        return out
@@ -1,25 +1,46 @@
+import argparse
+import multiprocessing
 import pygame
 import pymunk
 import sys
 from enum import Enum
 from game_controller import StateFeedbackController
+from mpc_controller import LinearMPCController
+from state_estimator import SteadyStateKalmanFilter
+from shared_memory_controller import (
+    SharedMemoryController,
+    WaitPolicy,
+    serve_controller,
+)
 from inverted_pendulum_plant import (
     InvertedPendulumPlant,
-    InvertedPendulumInput,
     DefaultModelParams,
+    build_pendulum_control_loop,
 )
 from pygame_widgets.slider import Slider
 import pygame_widgets
 import numpy as np
 import control
-from inverted_pendulum_model import InvertedPendlumModel as IpModel
+from inverted_pendulum_model import PLANT_TO_MODEL, InvertedPendlumModel as IpModel
 from state_space_control_calculations import (
     evaluate_controllability_observability,
     plot_lti_poles,
 )
 from data_plotter import DataPlotter
-
-SAMPLE_TIME = 1 / 60.0
+from strip_chart import CHART_WIDTH, StripChartPanel
+from scheduler import MultiRateScheduler
+from async_runtime import TRACE_KEY, add_runtime_arguments, prepare_runtime, run_game
+from telemetry_stream import TelemetryFrameFormat
+from trajectory_preview import PREVIEW_FRAME_STEP, predict_pendulum
+from trace_events import TRACER
+from inverted_pendulum_model import CartPoleModel
+
+FRAME_RATE = 60
+SAMPLE_TIME = 1 / FRAME_RATE
+PHYSICS_RATE = 1000.0
+CONTROL_RATE = 100.0
+TELEMETRY_RATE = 50.0
+PLOT_RATE = 6.0
 INITIAL_KP = 3e7
 INITIAL_KI = 0
 INITIAL_KD = 0
@@ -31,6 +52,8 @@ SLIDER_POS_X = int(WINDOW_WIDTH * 0.2)
 SLIDER_POS_Y = int(WINDOW_HEIGHT * 0.9)
 SLIDER_WIDTH = int(WINDOW_WIDTH * 0.6)
 SLIDER_HEIGHT = 20
+# Translucent ball color for the predicted trajectory
+PREVIEW_COLOR = (150, 0, 200, 90)
 
 
 class GameState(Enum):
@@ -43,7 +66,17 @@ class GameState(Enum):
 
 
 class Game:
-    def __init__(self, plant, controller, data_plotter=None):
+    def __init__(
+        self,
+        plant,
+        controller,
+        data_plotter=None,
+        physics_rate: float = PHYSICS_RATE,
+        control_rate: float = CONTROL_RATE,
+        telemetry_rate: float = TELEMETRY_RATE,
+        plot_rate: float = PLOT_RATE,
+        estimator=None,
+    ):
         # Initialize Pygame and Pymunk
         pygame.init()
 
@@ -80,23 +113,127 @@ class Game:
         # Clock for frame rate
         self.clock = pygame.time.Clock()
         self.simulation_time = 0.0
+        self._events = []
+
+        # Closed loop: reference state, state feedback and keyboard force
+        self._reference_state = np.zeros(plant.n_states)
+        self.control_loop = build_pendulum_control_loop(
+            plant,
+            controller,
+            reference_source=self.reference_state,
+            key_input_source=plant.input_from_key,
+            estimator=estimator,
+        )
+        self._controller_block = self.control_loop.block("controller")
+        self._telemetry_state = np.zeros(plant.n_states)
+
+        # Optional TelemetryPublisher, sent one frame per control step
+        self.telemetry_publisher = None
+        # Optional FrameRecorder fed with every rendered frame
+        self.frame_recorder = None
+        # Optional TrajectoryPreview of the closed loop, drawn every frame
+        self.trajectory_preview = None
+        self._preview_key = None
+        self._preview_model = CartPoleModel.from_model_params(plant.model_params)
+        # Frames per second of main_loop, 0 runs at maximum speed
+        self.frame_rate_limit = FRAME_RATE
+        # Quit after this many frames, None runs until closed
+        self.max_frames = None
+        self.frame_count = 0
+
+        # Every subsystem runs at its own rate; each frame advances the
+        # simulated time by SAMPLE_TIME. At equal times control samples
+        # first, physics steps next and telemetry records the result.
+        self.physics_period = 1 / physics_rate
+        self.telemetry_period = 1 / telemetry_rate
+        self.scheduler = MultiRateScheduler()
+        self.scheduler.add_task(
+            "control", 1 / control_rate, self._control_task, priority=0
+        )
+        self.scheduler.add_task(
+            "physics", self.physics_period, self._physics_task, priority=1
+        )
+        if data_plotter is not None:
+            self.scheduler.add_task(
+                "telemetry", self.telemetry_period, self._telemetry_task, priority=2
+            )
+            self.scheduler.add_task("plot", 1 / plot_rate, self._plot_task, priority=3)
 
     def update_ui(self, events):
         # Clear screen
         self.screen.fill((255, 255, 255))
-        self.plant.draw(self.screen)
+        with TRACER.span("plant.draw"):
+            self.plant.draw(self.screen)
 
         # Draw vertical red dashed line at reference position
         self._draw_reference_position_line()
+        if self.trajectory_preview is not None:
+            self._update_trajectory_preview()
+        if isinstance(self.data_plotter, StripChartPanel):
+            with TRACER.span("strip_charts.draw"):
+                self.data_plotter.draw(self.screen)
 
         # Update widgets and let pygame_widgets handle drawing
-        pygame_widgets.update(events)
+        with TRACER.span("widgets.draw"):
+            pygame_widgets.update(events)
         # Display current game state
         self._draw_state_indicator()
 
         # Update display
-        pygame.display.flip()
-        self.clock.tick(60)
+        with TRACER.span("display.flip"):
+            pygame.display.flip()
+
+    def _preview_feedback(self):
+        """Gain and force limit of the previewed control law, None if unknown."""
+        if isinstance(self.controller, StateFeedbackController):
+            return np.asarray(self.controller.gain_matrix, dtype=float), None
+        if isinstance(self.controller, LinearMPCController):
+            # The MPC acts like its unconstrained gain away from the limits
+            return (
+                self.controller.unconstrained_gain(),
+                float(self.controller.input_limit[0]),
+            )
+        return None
+
+    def _update_trajectory_preview(self):
+        """Request a new prediction if needed and draw the latest one.
+
+        While running, the prediction is refreshed every PREVIEW_FRAME_STEP
+        frames; moving the slider or toggling control refreshes it at once.
+        Controllers in other processes are not previewed.
+        """
+        feedback = self._preview_feedback()
+        if feedback is None:
+            return
+        gain_matrix, input_limit = feedback
+        if not self.control_active:
+            gain_matrix = np.zeros_like(gain_matrix)
+        # Before the first control step the slider was not read yet
+        self._update_reference_signal_from_slider()
+        key = (
+            gain_matrix.tobytes(),
+            float(self.reference_signal_position),
+            self.game_state,
+        )
+        running = self.game_state == GameState.RUNNING
+        if key != self._preview_key or (
+            running and self.frame_count % PREVIEW_FRAME_STEP == 0
+        ):
+            self._preview_key = key
+            reference_state = np.zeros(self.plant.n_states)
+            reference_state[0] = self.reference_signal_position
+            reference_state[2] = self.reference_signal_angle
+            self.trajectory_preview.request(
+                predict_pendulum,
+                self._preview_model,
+                np.array(self.plant.get_state()),
+                reference_state,
+                gain_matrix,
+                input_limit,
+                self.plant.cart.body.position.y,
+                self.controller.sample_time,
+            )
+        self.trajectory_preview.draw(self.screen, PREVIEW_COLOR)
 
     def _draw_reference_position_line(self):
         """Draw a vertical red dashed line at the reference position."""
@@ -157,102 +294,210 @@ class Game:
             + 2 * (slider_value - 50) / 100.0 * (groove_right_x - groove_left_x) / 2
         )
 
-    def main_loop(self):
-        running = True
-
-        while running:
-            self.frames_since_toggle_counter += 1
-            events = pygame.event.get()
-
-            for event in events:
-                if event.type == pygame.QUIT:
-                    running = False
-                    continue
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    mouse_pos = pygame.mouse.get_pos()
-                    # Only reset ball position if click is not on the slider
-                    if not self.slider_rect.collidepoint(mouse_pos):
-                        self.plant.ball.reset_position(mouse_pos)
-
-            # Update pygame_widgets with events (for slider interaction)
-            pygame_widgets.update(events)
+    def reference_state(self) -> np.ndarray:
+        """Reference state of the closed loop, updated every control step.
+
+        Can be passed as reference_source, e.g. to LinearMPCController.
+        """
+        return self._reference_state
+
+    def _control_task(self, time):
+        # Update reference signals from slider
+        self._update_reference_signal_from_slider()
+        self._reference_state[0] = self.reference_signal_position
+        self._reference_state[2] = self.reference_signal_angle
+
+        # Evaluate state feedback and keyboard input, held until next sample
+        self._controller_block.enabled = self.control_active
+        with TRACER.span("controller"):
+            self.control_loop.evaluate()
+        self.control_loop.advance_delays()
+        if self.telemetry_publisher is not None:
+            self.telemetry_publisher.publish(self.telemetry_record())
+
+    def _physics_task(self, time):
+        with TRACER.span("plant.step"):
+            self.plant.step(self.physics_period)
+        self.simulation_time = time + self.physics_period
+
+    def _telemetry_task(self, time):
+        plant_state = self.plant.get_state_into(self._telemetry_state)
+        self.data_plotter.log_data(
+            control_error=self._reference_state[0] - plant_state[0],
+            cart_position_x=plant_state[0],
+            cart_velocity_x=plant_state[1],
+            joint_angle=plant_state[2],
+            joint_angular_velocity=plant_state[3],
+            time_delta=self.telemetry_period,
+        )
 
-            keys = pygame.key.get_pressed()
+    def _plot_task(self, time):
+        with TRACER.span("data_plotter.update_plot"):
+            self.data_plotter.update_plot()
+
+    TELEMETRY_FORMAT = TelemetryFrameFormat(n_states=4, n_inputs=1, n_references=1)
+    TELEMETRY_FIELDS = (
+        "time",
+        "cart_position_x",
+        "cart_velocity_x",
+        "joint_angle",
+        "joint_angular_velocity",
+        "x_force",
+        "reference_position",
+    )
 
-            # Toggle between RUNNING and PAUSED with P key (lock for 10 frames)
-            if keys[pygame.K_p] and self.frames_since_toggle_counter > 10:
-                if self.game_state == GameState.RUNNING:
-                    self.game_state = GameState.PAUSED
-                elif self.game_state == GameState.PAUSED:
-                    self.game_state = GameState.RUNNING
-                self.frames_since_toggle_counter = 0
+    def telemetry_record(self) -> tuple:
+        """Return the current time, state, input and reference as a flat tuple.
 
-            # Toggle control with C key (lock for 10 frames)
-            if keys[pygame.K_c] and self.frames_since_toggle_counter > 10:
-                self.control_active = not self.control_active
-                self.frames_since_toggle_counter = 0
+        The entries are named by TELEMETRY_FIELDS.
+        """
+        return (
+            self.simulation_time,
+            *self.plant.get_state(),
+            float(self.plant.input.x_force),
+            float(self.reference_signal_position),
+        )
 
-            if keys[pygame.K_ESCAPE]:
+    def autosave_data(self) -> dict:
+        """Return a JSON serializable summary of the running game."""
+        if isinstance(self.controller, StateFeedbackController):
+            gain_matrix = np.asarray(self.controller.gain_matrix).tolist()
+        else:
+            gain_matrix = None
+        return {
+            "simulation_time": self.simulation_time,
+            "game_state": self.game_state.value,
+            "control_active": self.control_active,
+            "state": self.plant.get_state()._asdict(),
+            "gain_matrix": gain_matrix,
+            "reference_position": float(self.reference_signal_position),
+        }
+
+    def handle_events(self) -> bool:
+        """Process window events, mouse resets, the slider and key toggles.
+
+        Returns:
+            bool: False once the game should quit
+        """
+        running = True
+        self.frame_count += 1
+        if self.max_frames is not None and self.frame_count > self.max_frames:
+            return False
+        self.frames_since_toggle_counter += 1
+        events = pygame.event.get()
+        self._events = events
+
+        for event in events:
+            if event.type == pygame.QUIT:
                 running = False
+                continue
+            if event.type == pygame.KEYDOWN and event.key == TRACE_KEY:
+                TRACER.toggle()
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                mouse_pos = pygame.mouse.get_pos()
+                # Only reset ball position if click is not on the slider
+                if not self.slider_rect.collidepoint(mouse_pos):
+                    self.plant.ball.reset_position(mouse_pos)
+                    self.plant.invalidate_state_cache()
+
+        # Update pygame_widgets with events (for slider interaction)
+        pygame_widgets.update(events)
+
+        keys = pygame.key.get_pressed()
 
-            # Only perform simulation steps when in RUNNING state
+        # Toggle between RUNNING and PAUSED with P key (lock for 10 frames)
+        if keys[pygame.K_p] and self.frames_since_toggle_counter > 10:
             if self.game_state == GameState.RUNNING:
-                # Get current plant state
-                plant_state = self.plant.get_state()
-
-                # Update reference signals from slider
-                self._update_reference_signal_from_slider()
-
-                # Calculate state difference for control
-                reference_state = np.array(
-                    [self.reference_signal_position, 0, self.reference_signal_angle, 0]
-                )
-                difference_vector = -1 * (plant_state - reference_state)
-
-                # Get input from keyboard
-                input_signal_from_key = self.plant.input_from_key()
-
-                # Get control input from controller
-                force_from_control = (
-                    self.controller.get_control_input(difference_vector)
-                    if self.control_active
-                    else 0.0
-                )
-                print(f"FORCE FROM CONTROL: {force_from_control}")
-                # Combine control and keyboard inputs
-                self.plant.set_input(
-                    InvertedPendulumInput(
-                        x_force=(force_from_control + input_signal_from_key)
-                    )
-                )
-
-                # Update simulation
-                print(
-                    f"Sys State: {self.plant.get_state()}; reference state: {reference_state}"
-                )
-                self.plant.step(SAMPLE_TIME)
-                self.simulation_time += SAMPLE_TIME
-
-                # Log data to plotter if available
-                if self.data_plotter is not None:
-                    control_error = difference_vector[0]
-                    self.data_plotter.log_data(
-                        control_error=control_error,
-                        cart_position_x=plant_state[0],
-                        cart_velocity_x=plant_state[1],
-                        joint_angle=plant_state[2],
-                        joint_angular_velocity=plant_state[3],
-                        time_delta=SAMPLE_TIME,
-                    )
-                    self.data_plotter.update_plot()
-
-            self.update_ui(events)
+                self.game_state = GameState.PAUSED
+            elif self.game_state == GameState.PAUSED:
+                self.game_state = GameState.RUNNING
+            self.frames_since_toggle_counter = 0
+
+        # Toggle control with C key (lock for 10 frames)
+        if keys[pygame.K_c] and self.frames_since_toggle_counter > 10:
+            self.control_active = not self.control_active
+            self.frames_since_toggle_counter = 0
+
+        if keys[pygame.K_ESCAPE]:
+            running = False
+        return running
+
+    def start(self):
+        """Run the simulation with control enabled, e.g. for unattended runs."""
+        self.game_state = GameState.RUNNING
+        self.control_active = True
+
+    def simulate_frame(self):
+        """Advance the simulation by one frame (SAMPLE_TIME) if running."""
+        if self.game_state == GameState.RUNNING:
+            self.scheduler.run_for(SAMPLE_TIME)
+
+    def render_frame(self):
+        self.update_ui(self._events)
+        if self.frame_recorder is not None:
+            self.frame_recorder.capture(self.screen)
+
+    def main_loop(self):
+        while True:
+            with TRACER.span("handle_events"):
+                running = self.handle_events()
+            if not running:
+                break
+            with TRACER.span("simulate_frame"):
+                self.simulate_frame()
+            with TRACER.span("render_frame"):
+                self.render_frame()
+            with TRACER.span("clock.tick"):
+                self.clock.tick(self.frame_rate_limit)
 
         pygame.quit()
         sys.exit()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inverted pendulum game")
+    add_runtime_arguments(parser)
+    parser.add_argument(
+        "--external-controller",
+        action="store_true",
+        help="run the control law in another process via shared memory, "
+        "falling back to the local controller on deadline misses",
+    )
+    parser.add_argument(
+        "--no-spawn",
+        action="store_true",
+        help="with --external-controller, wait for a controller started with "
+        "shared_memory_controller.py instead of spawning one",
+    )
+    parser.add_argument(
+        "--deadline-ms",
+        type=float,
+        default=2.0,
+        help="deadline of the external controller per control step",
+    )
+    parser.add_argument(
+        "--mpc",
+        action="store_true",
+        help="balance with the constrained MPC controller, which respects "
+        "the force limit and the rail ends, instead of the LQR",
+    )
+    parser.add_argument(
+        "--estimator",
+        action="store_true",
+        help="feed back only the measured cart position and angle through a "
+        "steady-state Kalman filter instead of the full plant state",
+    )
+    parser.add_argument(
+        "--strip-charts",
+        action="store_true",
+        help="draw the telemetry as scrolling strip charts in the game window "
+        "instead of a separate Matplotlib window",
+    )
+    args = parser.parse_args()
+    if args.mpc and args.external_controller:
+        parser.error("--mpc cannot be combined with --external-controller")
+    prepare_runtime(args)
+
     model_params = DefaultModelParams
     A, B, C, D = IpModel.state_space_model_matrices(
         mass_cart=model_params.CART_MASS,
@@ -274,8 +519,9 @@ if __name__ == "__main__":
     B_trp = B.reshape((4, 1))
     # sys_ol_dsc = sys_ol.sample(SAMPLE_TIME, method="zoh")
     # B_dsc_trp = sys_ol_dsc.B.reshape((4, 1))
+    # Same tuning as the MPC; the cart force is in the order of FORCE_SCALE
     K_lqr_cont, P, _ = control.lqr(
-        A, B_trp, np.diag([0.01, 0.01, 100, 1]), np.array([[0.01]])
+        A, B_trp, np.diag([1e-6, 1e-6, 100, 1]), np.array([[1e-14]])
     )
     # K_lqr_dsc, P_dsc, _ = control.lqr(
     # sys_ol_dsc.A, B_dsc_trp, np.diag([1, 1, 10, 1]), np.array([[0.1]])
@@ -311,19 +557,92 @@ if __name__ == "__main__":
     # plt.show()
     # state_feedback_controller_gain_matrix = K_dsc
     plant = InvertedPendulumPlant(
-        pymunk.Space(), (WINDOW_WIDTH, WINDOW_HEIGHT), SAMPLE_TIME
+        pymunk.Space(), (WINDOW_WIDTH, WINDOW_HEIGHT), 1 / PHYSICS_RATE
     )
+    # The controller acts on reference - state in plant coordinates
     controller = StateFeedbackController(
-        gain_matrix=10 * K_lqr_cont, sample_time=SAMPLE_TIME
+        gain_matrix=-K_lqr_cont @ PLANT_TO_MODEL, sample_time=1 / CONTROL_RATE
     )
+    if args.mpc:
+        groove_a = plant.groove_joint.groove_a
+        groove_b = plant.groove_joint.groove_b
+        controller = LinearMPCController.for_inverted_pendulum(
+            model_params,
+            sample_time=1 / CONTROL_RATE,
+            rail_limits=(min(groove_a.x, groove_b.x), max(groove_a.x, groove_b.x)),
+        )
 
     # Optional: Create data plotter for live visualization
-    data_plotter = DataPlotter(max_points=1000, update_interval=10)
-    data_plotter.show_live()
+    # Plot refreshes are paced by the scheduler's plot task; strip charts
+    # scroll in their newest columns every frame
+    data_plotter = None
+    plot_rate = PLOT_RATE
+    if args.strip_charts:
+        data_plotter = StripChartPanel(
+            column_period=1 / TELEMETRY_RATE,
+            position=(WINDOW_WIDTH - CHART_WIDTH - 10, 10),
+        )
+        plot_rate = FRAME_RATE
+    elif not args.headless:
+        data_plotter = DataPlotter(max_points=1000, update_interval=1)
+        data_plotter.show_live()
+
+    external_process = None
+    if args.external_controller:
+        local_controller = controller
+        controller = SharedMemoryController(
+            n_states=4,
+            n_inputs=1,
+            sample_time=local_controller.sample_time,
+            fallback_controller=local_controller,
+            wait_policy=WaitPolicy(deadline=args.deadline_ms / 1000),
+        )
+        if args.no_spawn:
+            gain = " ".join(str(k) for k in local_controller.gain_matrix.ravel())
+            print(
+                "Start the controller with: python shared_memory_controller.py "
+                f"{controller.name} --gain {gain}"
+            )
+        else:
+            external_process = multiprocessing.Process(
+                target=serve_controller,
+                args=(controller.name, local_controller),
+                daemon=True,
+            )
+            external_process.start()
+
+    estimator = None
+    if args.estimator:
+        estimator = SteadyStateKalmanFilter.for_inverted_pendulum(
+            model_params,
+            sample_time=1 / CONTROL_RATE,
+            initial_state=plant.get_state(),
+        )
 
     game = Game(
         plant=plant,
         controller=controller,
         data_plotter=data_plotter,
+        plot_rate=plot_rate,
+        estimator=estimator,
     )
-    game.main_loop()
+    if args.mpc:
+        controller.reference_source = game.reference_state
+    try:
+        run_game(game, args)
+    finally:
+        if args.mpc:
+            print(
+                f"MPC: worst solve {controller.worst_solve_time * 1000:.3f} ms, "
+                f"iteration budget exhausted in {controller.budget_exhausted} "
+                f"of {controller.solves} steps"
+            )
+        if args.external_controller:
+            print(
+                f"External controller: {controller.deadline_misses} deadline "
+                f"misses in {controller.sequence} steps, worst round trip "
+                f"{controller.worst_round_trip * 1000:.3f} ms"
+            )
+            controller.close()
+        if external_process is not None:
+            external_process.join(timeout=1.0)
@@ -1,4 +1,194 @@
+from dataclasses import dataclass
+
 import numpy as np
+import scipy.linalg
+
+N_STATES = 4
+N_INPUTS = 1
+
+# Maps plant states (cart position, cart velocity, joint angle, joint angular
+# velocity) to model states. The plant measures the joint angle and its rate
+# with the opposite sign of the model. The matrix is its own inverse.
+PLANT_TO_MODEL = np.diag([1.0, 1.0, -1.0, -1.0])
+
+
+@dataclass(frozen=True)
+class CartPoleModel:
+    """Nonlinear cart-pole dynamics with analytic Jacobians.
+
+    The state is x = (cart position, cart velocity, angle, angular velocity)
+    with the angle measured from the upright position, positive in the
+    direction of positive cart position. The input u is the horizontal force
+    on the cart. The pendulum is a point mass on a massless rod:
+
+        (M + m) x'' + m L (theta'' cos(theta) - theta'^2 sin(theta)) = u
+        L theta'' + x'' cos(theta) - g sin(theta) = 0
+
+    All methods accept batches: states of shape (..., 4) and inputs of shape
+    (...) or (..., 1), and evaluate the whole batch with array operations.
+
+    Attributes:
+        mass_cart: Cart mass M
+        mass_pendulum: Pendulum mass m
+        length_pendulum: Rod length L
+        gravity: Gravitational acceleration g
+    """
+
+    mass_cart: float
+    mass_pendulum: float
+    length_pendulum: float
+    gravity: float
+
+    @classmethod
+    def from_model_params(cls, model_params) -> "CartPoleModel":
+        """Create the model from plant parameters like DefaultModelParams."""
+        return cls(
+            mass_cart=model_params.CART_MASS,
+            mass_pendulum=model_params.BALL_MASS,
+            length_pendulum=model_params.PENDULUM_LENGTH,
+            gravity=model_params.GRAVITY[1],
+        )
+
+    @staticmethod
+    def _split(state, control_input):
+        state = np.asarray(state, dtype=float)
+        control_input = np.asarray(control_input, dtype=float)
+        if state.shape[-1] != N_STATES:
+            raise ValueError(
+                f"state must have shape (..., {N_STATES}), but has {state.shape}"
+            )
+        if control_input.shape == state.shape[:-1] + (N_INPUTS,):
+            control_input = control_input[..., 0]
+        velocity = state[..., 1]
+        angle = state[..., 2]
+        angular_velocity = state[..., 3]
+        return velocity, angle, angular_velocity, control_input
+
+    def dynamics(self, state, control_input) -> np.ndarray:
+        """Evaluate the state derivative f(x, u).
+
+        Args:
+            state: States of shape (..., 4)
+            control_input: Forces of shape (...) or (..., 1)
+
+        Returns:
+            np.ndarray: State derivatives of shape (..., 4)
+        """
+        velocity, angle, angular_velocity, force = self._split(state, control_input)
+        M, m = self.mass_cart, self.mass_pendulum
+        L, g = self.length_pendulum, self.gravity
+        sin, cos = np.sin(angle), np.cos(angle)
+        denominator = M + m * sin**2
+        cart_acceleration = (
+            force + m * sin * (L * angular_velocity**2 - g * cos)
+        ) / denominator
+        angular_acceleration = (
+            -force * cos - m * L * angular_velocity**2 * sin * cos + (M + m) * g * sin
+        ) / (L * denominator)
+        return np.stack(
+            np.broadcast_arrays(
+                velocity, cart_acceleration, angular_velocity, angular_acceleration
+            ),
+            axis=-1,
+        )
+
+    def jacobians(self, state, control_input):
+        """Evaluate the Jacobians A = df/dx and B = df/du.
+
+        Args:
+            state: States of shape (..., 4)
+            control_input: Forces of shape (...) or (..., 1)
+
+        Returns:
+            tuple: (A of shape (..., 4, 4), B of shape (..., 4, 1))
+        """
+        _, angle, angular_velocity, force = self._split(state, control_input)
+        angle, angular_velocity, force = np.broadcast_arrays(
+            angle, angular_velocity, force
+        )
+        M, m = self.mass_cart, self.mass_pendulum
+        L, g = self.length_pendulum, self.gravity
+        sin, cos = np.sin(angle), np.cos(angle)
+        cos_2 = cos**2 - sin**2
+        sin_2 = 2 * sin * cos
+        w2 = angular_velocity**2
+        denominator = M + m * sin**2
+        cart_acceleration = (force + m * sin * (L * w2 - g * cos)) / denominator
+        angular_acceleration = (
+            -force * cos - m * L * w2 * sin * cos + (M + m) * g * sin
+        ) / (L * denominator)
+
+        A = np.zeros(angle.shape + (N_STATES, N_STATES))
+        A[..., 0, 1] = 1.0
+        A[..., 2, 3] = 1.0
+        # Quotient rule with d(denominator)/d(angle) = m sin(2 angle)
+        A[..., 1, 2] = (
+            m * L * w2 * cos - m * g * cos_2 - cart_acceleration * m * sin_2
+        ) / denominator
+        A[..., 1, 3] = 2 * m * L * angular_velocity * sin / denominator
+        A[..., 3, 2] = (
+            force * sin
+            - m * L * w2 * cos_2
+            + (M + m) * g * cos
+            - L * angular_acceleration * m * sin_2
+        ) / (L * denominator)
+        A[..., 3, 3] = -2 * m * angular_velocity * sin * cos / denominator
+
+        B = np.zeros(angle.shape + (N_STATES, N_INPUTS))
+        B[..., 1, 0] = 1 / denominator
+        B[..., 3, 0] = -cos / (L * denominator)
+        return A, B
+
+    def linearize_trajectory(self, states, inputs, sample_time: float | None = None):
+        """Linearize along a recorded trajectory in one call.
+
+        Args:
+            states: Trajectory states of shape (n_steps, 4)
+            inputs: Trajectory inputs of shape (n_steps,) or (n_steps, 1)
+            sample_time: If given, return the zero-order-hold discretization
+                of every linearization instead of the continuous matrices
+
+        Returns:
+            tuple: (A of shape (n_steps, 4, 4), B of shape (n_steps, 4, 1))
+        """
+        A, B = self.jacobians(states, inputs)
+        if sample_time is None:
+            return A, B
+        return discretize_zoh(A, B, sample_time)
+
+    def upright_state_space(self):
+        """Linearization at the upright equilibrium x = 0, u = 0.
+
+        Returns:
+            tuple: (A, B, C, D) with B of shape (4,), C selecting cart
+            position and angle, as returned by
+            InvertedPendlumModel.state_space_model_matrices
+        """
+        A, B = self.jacobians(np.zeros(N_STATES), 0.0)
+        C = np.array([[1, 0, 0, 0], [0, 0, 1, 0]])
+        D = np.array([[0], [0]])
+        return A, B[:, 0], C, D
+
+
+def discretize_zoh(A, B, sample_time: float):
+    """Zero-order-hold discretization of (batches of) continuous systems.
+
+    Args:
+        A: System matrices of shape (..., n, n)
+        B: Input matrices of shape (..., n, m)
+        sample_time: Sample time in seconds
+
+    Returns:
+        tuple: (A_d of shape (..., n, n), B_d of shape (..., n, m))
+    """
+    A = np.asarray(A, dtype=float)
+    B = np.asarray(B, dtype=float)
+    n, m = B.shape[-2:]
+    augmented = np.zeros(A.shape[:-2] + (n + m, n + m))
+    augmented[..., :n, :n] = A * sample_time
+    augmented[..., :n, n:] = B * sample_time
+    exponential = scipy.linalg.expm(augmented)
+    return exponential[..., :n, :n], exponential[..., :n, n:]
 
 
 class InvertedPendlumModel:
@@ -15,25 +205,6 @@ class InvertedPendlumModel:
         :return:
         :rtype: tuple[NDArray[Any], tuple, NDArray[Any], _Array1D[float64]]
         """
-        M = mass_cart
-        m = mass_pendulum
-        L = length_pendulum
-        g = gravity
-        print(f"M: {M}, m: {m}, L: {L}, g: {g}")
-        A = np.array(
-            [
-                [0, 1, 0, 0],
-                [0, 0, -(m * g) / M, 0],
-                [0, 0, 0, 1],
-                [
-                    0,
-                    0,
-                    (M + m) * g / (M * L),
-                    0,
-                ],
-            ]
-        )
-        B = np.transpose(np.array([0, 1 / M, 0, -1 / (L * M)]))
-        C = np.array([[1, 0, 0, 0], [0, 0, 1, 0]])
-        D = np.array([[0], [0]])
-        return (A, B, C, D)
+        return CartPoleModel(
+            mass_cart, mass_pendulum, length_pendulum, gravity
+        ).upright_state_space()
@@ -3,8 +3,26 @@ import pymunk
 from pymunk import Vec2d
 from typing import NamedTuple
 from plant_base import PlantBase
+from block_diagram import (
+    BlockDiagram,
+    CompiledDiagram,
+    ControllerBlock,
+    DelayBlock,
+    GainBlock,
+    PlantBlock,
+    ReferenceBlock,
+    StateEstimatorBlock,
+    StateFeedbackBlock,
+    SumBlock,
+)
+from game_controller import GameControllerBase, StateFeedbackController
+from mpc_controller import LinearMPCController
+from scheduler import MultiRateScheduler
+from state_estimator import SteadyStateKalmanFilter
+from space_config import SpaceConfig
 from physical_objects import PinJointConnection, Ball, DynamicCart
-import math_helpers
+import math
+import numpy as np
 from dataclasses import dataclass
 
 
@@ -76,12 +94,23 @@ class StaticLine(VisualObject):
         )
 
 
+# Distance of the rail ends from the window borders
+RAIL_MARGIN = 50
+
+
+def rail_limits(window_width: int) -> tuple:
+    """Cart positions at the left and right rail end."""
+    return RAIL_MARGIN, window_width - RAIL_MARGIN
+
+
 @dataclass
 class DefaultModelParams:
     CART_MAX_SPEED: int = 1200
     CART_WIDTH: int = 100
     CART_HEIGHT: int = 20
-    CART_MASS: float = 2000
+    # Mass of the simulated cart; the model based LQR, pole placement and
+    # Kalman gains are designed with it
+    CART_MASS: float = 10000
     BALL_MASS: float = 1
     FORCE_SCALE: float = 1e7
     GRAVITY: Vec2d = Vec2d(0, 981)
@@ -96,11 +125,14 @@ class InvertedPendulumPlant(PlantBase):
         window_size: tuple,
         sample_time: float,
         model_params=DefaultModelParams,
+        space_config: SpaceConfig = None,
     ):
-        super().__init__(sample_time=sample_time)
+        super().__init__(sample_time=sample_time, space_config=space_config)
         self.space: pymunk.Space = space
+        self.space_config.apply(self.space)
         self.n_inputs: int = 1
         self.n_outputs: int = 4
+        self._init_state_cache(n_states=4)
         self.model_params = model_params
         self.space.gravity = self.model_params.GRAVITY
         self.non_physical_objects = []
@@ -116,34 +148,30 @@ class InvertedPendulumPlant(PlantBase):
         )
 
     def step(self, time_delta):
+        self._step_space(time_delta)
+
+    def _apply_input(self) -> None:
         # Adjustments according to input (cart velocity)
-        print("STEP INPUT FORCE:", self.input.x_force)
         self.cart.body.apply_force_at_local_point((self.input.x_force, 0), (0, 0))
-        self.space.step(time_delta)
 
     def get_state(self) -> "InvertedPendulumState":
-        angle = self._calculate_angle_radian(
-            self.cart.body.position, self.ball.body.position
-        )
-        angular_velocity = self._calculate_angle_velocity_radian_per_sec(
-            self.cart.body.position,
-            self.ball.body.position,
-            self.ball.body.velocity,
-        )
-        return InvertedPendulumState(
-            cart_position_x=float(self.cart.body.position.x),
-            cart_velocity_x=float(self.cart.body.velocity.x),
-            joint_angle=angle,
-            joint_angular_velocity=angular_velocity,
-        )
+        return InvertedPendulumState(*self._cached_state().tolist())
 
     def get_output(self) -> "InvertedPendulumOutput":
-        state = self.get_state()
-        return InvertedPendulumOutput(
-            cart_position_x=state.cart_position_x,
-            cart_velocity_x=state.cart_velocity_x,
-            joint_angle=state.joint_angle,
-            joint_angular_velocity=state.joint_angular_velocity,
+        return InvertedPendulumOutput(*self._cached_state().tolist())
+
+    def _compute_state_into(self, out):
+        cart_x, cart_y = self.cart.body.position
+        ball_x, ball_y = self.ball.body.position
+        out[0] = cart_x
+        out[1] = self.cart.body.velocity.x
+        out[2] = self._calculate_angle_radian(cart_x, cart_y, ball_x, ball_y)
+        out[3] = self._calculate_angle_velocity_radian_per_sec(
+            cart_x,
+            cart_y,
+            ball_x,
+            ball_y,
+            self.ball.body.velocity - self.cart.body.velocity,
         )
 
     def set_input(self, input_data) -> None:
@@ -177,8 +205,7 @@ class InvertedPendulumPlant(PlantBase):
         window_height = window_size[1]
         bar_left_y = 0.7 * window_height
         bar_right_y = bar_left_y
-        bar_right_x = window_width - 50
-        bar_left_x = 50
+        bar_left_x, bar_right_x = rail_limits(window_width)
         center_pos = ((bar_right_x + bar_left_x) // 2, bar_left_y)
 
         # Create visual bar
@@ -197,6 +224,7 @@ class InvertedPendulumPlant(PlantBase):
             center_pos,
             self.model_params.CART_WIDTH,
             self.model_params.CART_HEIGHT,
+            self.model_params.CART_MASS,
         )
         pendulum_length = self.model_params.PENDULUM_LENGTH
         self.ball = Ball(
@@ -226,37 +254,171 @@ class InvertedPendulumPlant(PlantBase):
         self.all_physical_objects = [self.cart, self.ball, self.pin_joint, self.rail]
         space.add(self.groove_joint)
 
-    def _calculate_angle_radian(self, cart_position, ball_position):
-        # Calculate vector from cart to ball
-        rope_vec = ball_position - cart_position
-        vertical_up = Vec2d(0, -1)
-        return math_helpers.angle_between_vectors_radian(rope_vec, vertical_up)
+    @staticmethod
+    def _calculate_angle_radian(cart_x, cart_y, ball_x, ball_y):
+        # Signed angle from the cart-to-ball vector to the vertical up
+        # direction (0, -1), same convention as pygame's Vector2.angle_to
+        return -0.5 * math.pi - math.atan2(ball_y - cart_y, ball_x - cart_x)
 
+    @staticmethod
     def _calculate_angle_velocity_radian_per_sec(
-        self, cart_position, ball_position, ball_velocity
+        cart_x, cart_y, ball_x, ball_y, relative_velocity
     ):
         # Calculate vector from cart to ball
-        dx = ball_position.x - cart_position.x
-        dy = ball_position.y - cart_position.y
+        dx = ball_x - cart_x
+        dy = ball_y - cart_y
+        squared_radius = dx * dx + dy * dy
 
-        # Position vector
-        pos_vector = pygame.math.Vector2(dx, dy)
-        pos_magnitude = pos_vector.length()
-
-        if pos_magnitude == 0:
+        if squared_radius == 0:
             return 0.0
 
-        # Unit position vector
-        pos_unit_vector = pos_vector / pos_magnitude
-
-        # Perpendicular vector to position vector
-        perp_vector = pygame.math.Vector2(-pos_unit_vector.y, pos_unit_vector.x)
-
-        # Project ball velocity onto perpendicular vector
-        ball_velocity_vector = pygame.math.Vector2(ball_velocity.x, ball_velocity.y)
-        tangential_velocity = ball_velocity_vector.dot(perp_vector)
-
-        # Angular velocity = tangential velocity / radius
-        angular_velocity = tangential_velocity / pos_magnitude
-
-        return angular_velocity
+        # Time derivative of _calculate_angle_radian: project the ball
+        # velocity relative to the cart onto the unit vector perpendicular to
+        # the rope and divide by the radius, -(v . (-dy, dx) / r) / r
+        velocity_x, velocity_y = relative_velocity
+        return (dy * velocity_x - dx * velocity_y) / squared_radius
+
+
+def build_pendulum_control_loop(
+    plant: InvertedPendulumPlant,
+    controller: GameControllerBase,
+    reference_source,
+    key_input_source=None,
+    estimator: SteadyStateKalmanFilter | None = None,
+) -> CompiledDiagram:
+    """Build the closed state feedback loop of the inverted pendulum.
+
+    The controller acts on the difference between the reference state and
+    the plant state; its force plus the optional keyboard force drives the
+    cart. With an estimator, only the measured outputs of the plant are fed
+    back: the estimator reconstructs the state from them and the force of
+    the previous step.
+
+    Args:
+        plant: Inverted pendulum plant
+        controller: State feedback controller with a (1, 4) gain matrix, or
+            any controller mapping the state error to a force, e.g. a
+            SharedMemoryController
+        reference_source: Callable returning the reference state (length 4)
+        key_input_source: Optional callable returning the keyboard force,
+            e.g. plant.input_from_key. Headless runs leave it out.
+        estimator: Optional SteadyStateKalmanFilter in plant coordinates,
+            e.g. from SteadyStateKalmanFilter.for_inverted_pendulum
+
+    Returns:
+        CompiledDiagram: Loop with blocks "plant", "reference", "difference",
+        "controller", "key_input" and "force"; with an estimator also
+        "measurement", "previous_force" and "estimator"
+    """
+    diagram = BlockDiagram()
+    plant_block = diagram.add(PlantBlock("plant", plant, InvertedPendulumInput))
+    reference = diagram.add(
+        ReferenceBlock("reference", reference_source, output_size=plant.n_states)
+    )
+    difference = diagram.add(SumBlock("difference", "+-", output_size=plant.n_states))
+    if isinstance(controller, StateFeedbackController):
+        state_feedback = diagram.add(StateFeedbackBlock("controller", controller))
+    else:
+        state_feedback = diagram.add(
+            ControllerBlock("controller", controller, output_size=1)
+        )
+    key_input = diagram.add(
+        ReferenceBlock("key_input", key_input_source or (lambda: 0.0))
+    )
+    force = diagram.add(SumBlock("force", "++"))
+
+    diagram.connect(reference, difference, port=0)
+    if estimator is None:
+        diagram.connect(plant_block, difference, port=1)
+    else:
+        measurement = diagram.add(GainBlock("measurement", estimator.C))
+        previous_force = diagram.add(DelayBlock("previous_force"))
+        state_estimate = diagram.add(StateEstimatorBlock("estimator", estimator))
+        diagram.connect(plant_block, measurement)
+        diagram.connect(measurement, state_estimate, port=0)
+        diagram.connect(previous_force, state_estimate, port=1)
+        diagram.connect(force, previous_force)
+        diagram.connect(state_estimate, difference, port=1)
+    diagram.connect(difference, state_feedback)
+    diagram.connect(state_feedback, force, port=0)
+    diagram.connect(key_input, force, port=1)
+    diagram.connect(force, plant_block)
+    return diagram.compile()
+
+
+def simulate_inverted_pendulum(
+    controller: GameControllerBase,
+    reference_position,
+    duration: float,
+    physics_rate: float = 1000.0,
+    control_rate: float = 100.0,
+    model_params=DefaultModelParams,
+    estimator: SteadyStateKalmanFilter | None = None,
+    initial_ball_velocity: float = 0.0,
+    window_size: tuple = (1200, 800),
+    space_config: SpaceConfig = None,
+) -> np.ndarray:
+    """Run the closed pendulum loop headless, with the game's rates.
+
+    Args:
+        controller: Controller acting on the state error, as in the game
+        reference_position: Callable mapping the simulated time to the
+            reference cart position, e.g. a ReferenceSpec's evaluate
+        duration: Simulated time in seconds
+        physics_rate: Physics steps per second
+        control_rate: Control updates per second
+        model_params: Plant parameters
+        estimator: Optional SteadyStateKalmanFilter for output feedback
+        initial_ball_velocity: Horizontal velocity of the ball at the start,
+            to disturb the upright equilibrium
+        window_size: Size of the game window the rail is laid out in
+        space_config: Optional solver settings of the plant
+
+    Returns:
+        np.ndarray: One row per control step with the columns time, cart
+        position, cart velocity, joint angle, joint angular velocity, force
+        and reference position
+    """
+    plant = InvertedPendulumPlant(
+        pymunk.Space(),
+        window_size,
+        sample_time=1 / physics_rate,
+        model_params=model_params,
+        space_config=space_config,
+    )
+    plant.ball.body.velocity = (initial_ball_velocity, 0.0)
+    plant.invalidate_state_cache()
+    if estimator is not None:
+        estimator.reset(plant.get_state())
+    reference_state = np.zeros(plant.n_states)
+    if isinstance(controller, LinearMPCController):
+        controller.reference_source = lambda: reference_state
+    control_loop = build_pendulum_control_loop(
+        plant, controller, lambda: reference_state, estimator=estimator
+    )
+    plant_output = control_loop.block("plant").output
+    force_output = control_loop.block("force").output
+    n_steps = round(duration * control_rate)
+    trajectory = np.zeros((n_steps, 7))
+
+    step_index = 0
+
+    def control_task(time):
+        nonlocal step_index
+        reference_state[0] = reference_position(time)
+        control_loop.evaluate()
+        control_loop.advance_delays()
+        row = trajectory[step_index]
+        row[0] = time
+        row[1:5] = plant_output
+        row[5] = force_output[0]
+        row[6] = reference_state[0]
+        step_index += 1
+
+    scheduler = MultiRateScheduler()
+    scheduler.add_task("control", 1 / control_rate, control_task, priority=0)
+    scheduler.add_task(
+        "physics", 1 / physics_rate, lambda time: plant.step(1 / physics_rate), 1
+    )
+    scheduler.run_for(n_steps / control_rate)
+    return trajectory
@@ -0,0 +1,371 @@
+import time
+
+import numpy as np
+import scipy.linalg
+
+from game_controller import GameControllerBase
+from inverted_pendulum_model import (
+    PLANT_TO_MODEL,
+    InvertedPendlumModel,
+    discretize_zoh,
+)
+
+HORIZON_DEFAULT = 40
+BLOCK_LENGTH_DEFAULT = 1
+MAX_ITERATIONS_DEFAULT = 25
+# The pendulum needs about two seconds to stop the cart and get upright
+# again, so its MPC holds every input for 5 steps to predict 40 * 5 steps
+PENDULUM_BLOCK_LENGTH = 5
+# Distance in pixels the pendulum MPC keeps from the rail ends
+PENDULUM_RAIL_MARGIN = 20.0
+TOLERANCE_DEFAULT = 1e-3
+# ADMM penalty and proximal term of the (normalized) QP
+RHO_DEFAULT = 1.0
+SIGMA = 1e-6
+
+
+class LinearMPCController(GameControllerBase):
+    """Constrained linear model predictive controller.
+
+    Every control step solves the condensed quadratic program
+
+        min  sum_k x_k' Q x_k + u_k' R u_k + x_N' P x_N
+        s.t. x_{k+1} = A_d x_k + B_d u_k,  |u_k| <= input_limit,
+             lower + margin <= r_p + p_k <= upper - margin
+
+    over horizon * block_length steps, where x is the deviation from the
+    reference, r_p the reference position and p_k the predicted position.
+    The inputs are optimized in horizon blocks of block_length equal inputs
+    (move blocking), so a long prediction costs no more decision variables,
+    and the positions are constrained at the end of every block. P is the
+    solution of the discrete algebraic Riccati equation, so without active
+    constraints and blocking the controller equals the discrete LQR. The
+    reference position is clamped into the shrunk limits, so a reference at
+    a rail end holds the cart next to it, with room to balance, instead of
+    against it.
+
+    Prediction matrices, the Hessian and the factorization used by the ADMM
+    solver are built once in the constructor. Each step is warm-started from
+    the previous solution, shifted by one step without blocking, and runs at most max_iterations
+    iterations, which bounds the time per step; when the budget runs out the
+    current iterate is applied, clipped to the input limits.
+
+    Like StateFeedbackController, the controller receives the control error
+    e = reference - state in plant coordinates.
+    """
+
+    def __init__(
+        self,
+        A,
+        B,
+        sample_time: float,
+        state_weights,
+        input_weights,
+        input_limit,
+        horizon: int = HORIZON_DEFAULT,
+        block_length: int = BLOCK_LENGTH_DEFAULT,
+        position_limits: tuple | None = None,
+        position_margin: float = 0.0,
+        position_index: int = 0,
+        reference_source=None,
+        state_transform=None,
+        max_iterations: int = MAX_ITERATIONS_DEFAULT,
+        tolerance: float = TOLERANCE_DEFAULT,
+        rho: float = RHO_DEFAULT,
+    ):
+        """Build the prediction matrices and factorize the QP.
+
+        Args:
+            A: Continuous system matrix (n_states, n_states)
+            B: Continuous input matrix (n_states, n_inputs) or (n_states,)
+            sample_time: Control period used for the discretization
+            state_weights: Diagonal of Q or the full matrix
+            input_weights: Diagonal of R or the full matrix
+            input_limit: Maximum absolute input, scalar or one per input
+            horizon: Number of optimized inputs
+            block_length: Control steps each optimized input is held, so the
+                prediction covers horizon * block_length steps
+            position_limits: (lower, upper) bounds of the absolute position,
+                None leaves the position unconstrained
+            position_margin: Distance from position_limits kept free; the
+                predicted positions and the reference position are confined
+                to the limits shrunk by it
+            position_index: Index of the constrained position in the state
+            reference_source: Callable returning the reference state in
+                plant coordinates; needed to place position_limits. Without
+                it the limits bound the deviation from the reference.
+            state_transform: Matrix mapping plant state deviations to model
+                coordinates, e.g. PLANT_TO_MODEL; defaults to the identity
+            max_iterations: Hard ADMM iteration budget per control step
+            tolerance: Primal and dual residual at which a solve stops early
+            rho: ADMM penalty parameter of the normalized problem
+        """
+        super().__init__()
+        A = np.asarray(A, dtype=float)
+        B = np.asarray(B, dtype=float).reshape(A.shape[0], -1)
+        if horizon < 1:
+            raise ValueError(f"horizon must be at least 1, is {horizon}")
+        if block_length < 1:
+            raise ValueError(f"block_length must be at least 1, is {block_length}")
+        if max_iterations < 1:
+            raise ValueError(f"max_iterations must be at least 1, is {max_iterations}")
+        self.sample_time = sample_time
+        self.horizon = horizon
+        self.block_length = block_length
+        self.n_states, self.n_inputs = B.shape
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        self.rho = rho
+        self.position_index = position_index
+        self.position_limits = None
+        if position_limits is not None:
+            lower, upper = position_limits
+            if upper - lower <= 2 * position_margin:
+                raise ValueError(
+                    f"position_limits {position_limits} leave no room inside "
+                    f"position_margin {position_margin}"
+                )
+            self.position_limits = (lower + position_margin, upper - position_margin)
+        self.reference_source = reference_source
+        self.state_transform = (
+            np.eye(self.n_states)
+            if state_transform is None
+            else np.asarray(state_transform, dtype=float)
+        )
+        self.input_limit = np.broadcast_to(
+            np.asarray(input_limit, dtype=float), (self.n_inputs,)
+        ).copy()
+        if np.any(self.input_limit <= 0):
+            raise ValueError("input_limit must be positive")
+
+        A_d, B_d = discretize_zoh(A, B, sample_time)
+        Q = _weight_matrix(state_weights, self.n_states)
+        R = _weight_matrix(input_weights, self.n_inputs)
+        P = scipy.linalg.solve_discrete_are(A_d, B_d, Q, R)
+        # Optimize over inputs normalized to [-1, 1]
+        B_scaled = B_d * self.input_limit
+        R_scaled = R * np.outer(self.input_limit, self.input_limit)
+        n, m, N = self.n_states, self.n_inputs, horizon
+        steps = horizon * block_length
+        prediction_free, prediction_forced = _prediction_matrices(A_d, B_scaled, steps)
+        # Move blocking: each optimized input is applied for block_length steps
+        blocking = np.kron(np.kron(np.eye(N), np.ones((block_length, 1))), np.eye(m))
+        prediction_forced = prediction_forced @ blocking
+
+        Q_bar = scipy.linalg.block_diag(*([Q] * (steps - 1) + [P]))
+        hessian = (
+            prediction_forced.T @ Q_bar @ prediction_forced
+            + block_length * scipy.linalg.block_diag(*([R_scaled] * N))
+        )
+        gradient_matrix = prediction_forced.T @ Q_bar @ prediction_free
+        # Scaling the cost does not move the optimum but keeps rho meaningful
+        cost_scale = N * m / np.trace(hessian)
+        self._hessian = hessian * cost_scale
+        self._gradient_matrix = gradient_matrix * cost_scale
+
+        # Constraint rows: normalized inputs, then the scaled positions at the
+        # end of every block
+        constraint_rows = [np.eye(N * m)]
+        self._position_scale = 1.0
+        if self.position_limits is not None:
+            lower, upper = self.position_limits
+            self._position_scale = (upper - lower) / 2
+            position_rows = (
+                np.arange(block_length - 1, steps, block_length) * n + position_index
+            )
+            constraint_rows.append(
+                prediction_forced[position_rows] / self._position_scale
+            )
+            self._position_free = prediction_free[position_rows]
+        self._constraints = np.vstack(constraint_rows)
+        self._constraints_t = np.ascontiguousarray(self._constraints.T)
+        self._factor = scipy.linalg.cho_factor(
+            self._hessian
+            + SIGMA * np.eye(N * m)
+            + rho * self._constraints_t @ self._constraints
+        )
+
+        n_constraints = self._constraints.shape[0]
+        self._lower = np.full(n_constraints, -1.0)
+        self._upper = np.full(n_constraints, 1.0)
+        self._solution = np.zeros(N * m)
+        self._slack = np.zeros(n_constraints)
+        self._dual = np.zeros(n_constraints)
+        self._control_signal = np.zeros(m)
+        self.last_iterations = 0
+        self.budget_exhausted = 0
+        self.solves = 0
+        self.last_solve_time = 0.0
+        self.worst_solve_time = 0.0
+
+    @classmethod
+    def for_inverted_pendulum(
+        cls,
+        model_params,
+        sample_time: float,
+        rail_limits: tuple | None,
+        state_weights=(1e-6, 1e-6, 100.0, 1.0),
+        input_weights=(1e-14,),
+        **kwargs,
+    ) -> "LinearMPCController":
+        """MPC on the upright linearization of InvertedPendlumModel.
+
+        Args:
+            model_params: Plant parameters, e.g. DefaultModelParams; the
+                cart force is limited to FORCE_SCALE
+            sample_time: Control period
+            rail_limits: (left, right) cart positions of the groove joint
+            state_weights: Diagonal of Q in model coordinates
+            input_weights: Diagonal of R
+            kwargs: Further arguments of LinearMPCController; block_length
+                and position_margin default to PENDULUM_BLOCK_LENGTH and
+                PENDULUM_RAIL_MARGIN
+        """
+        A, B, _, _ = InvertedPendlumModel.state_space_model_matrices(
+            mass_cart=model_params.CART_MASS,
+            mass_pendulum=model_params.BALL_MASS,
+            length_pendulum=model_params.PENDULUM_LENGTH,
+            gravity=model_params.GRAVITY[1],
+        )
+        kwargs.setdefault("input_limit", model_params.FORCE_SCALE)
+        kwargs.setdefault("state_transform", PLANT_TO_MODEL)
+        kwargs.setdefault("block_length", PENDULUM_BLOCK_LENGTH)
+        kwargs.setdefault("position_margin", PENDULUM_RAIL_MARGIN)
+        return cls(
+            A,
+            B,
+            sample_time,
+            state_weights=state_weights,
+            input_weights=input_weights,
+            position_limits=rail_limits,
+            **kwargs,
+        )
+
+    def get_control_input(self, state_error):
+        """Solve the QP for the current error and return the first input.
+
+        Args:
+            state_error: reference - state in plant coordinates
+
+        Returns:
+            np.ndarray: Input of shape (n_inputs,); the array is reused
+            between calls
+        """
+        start = time.perf_counter()
+        state_error = np.asarray(state_error, dtype=float)
+        if self.position_limits is not None:
+            lower, upper = self.position_limits
+            reference_position = 0.0
+            if self.reference_source is not None:
+                # Regulate to the nearest position inside the limits, a
+                # reference at or beyond them would hold the cart against them
+                requested = self.reference_source()[self.position_index]
+                reference_position = min(max(requested, lower), upper)
+                if reference_position != requested:
+                    state_error = state_error.copy()
+                    state_error[self.position_index] += reference_position - requested
+        deviation = -(self.state_transform @ state_error)
+        gradient = self._gradient_matrix @ deviation
+        if self.position_limits is not None:
+            free_position = self._position_free @ deviation + reference_position
+            rows = slice(self.horizon * self.n_inputs, None)
+            self._lower[rows] = (lower - free_position) / self._position_scale
+            self._upper[rows] = (upper - free_position) / self._position_scale
+        self._warm_start()
+        self.last_iterations = self._solve(gradient)
+        if self.last_iterations == self.max_iterations:
+            self.budget_exhausted += 1
+
+        np.clip(self._solution[: self.n_inputs], -1.0, 1.0, out=self._control_signal)
+        self._control_signal *= self.input_limit
+        self.solves += 1
+        self.last_solve_time = time.perf_counter() - start
+        self.worst_solve_time = max(self.worst_solve_time, self.last_solve_time)
+        return self._control_signal
+
+    def unconstrained_gain(self) -> np.ndarray:
+        """Gain of the control law while no constraint is active.
+
+        Returns:
+            np.ndarray: Gain K (n_inputs, n_states) in plant coordinates with
+            u = -K (reference - state), as used by StateFeedbackController
+        """
+        first_inputs = scipy.linalg.solve(
+            self._hessian, self._gradient_matrix, assume_a="pos"
+        )[: self.n_inputs]
+        return -self.input_limit[:, np.newaxis] * first_inputs @ self.state_transform
+
+    def _warm_start(self):
+        # Shift the previous solution one step, repeating the last input; a
+        # blocked input spans several steps, so its solution is reused as is
+        if self.block_length > 1:
+            return
+        m, N = self.n_inputs, self.horizon
+        for vector in (self._solution, self._slack[: N * m], self._dual[: N * m]):
+            vector[:-m] = vector[m:]
+        if self.position_limits is not None:
+            for vector in (self._slack[N * m :], self._dual[N * m :]):
+                vector[:-1] = vector[1:]
+
+    def _solve(self, gradient) -> int:
+        """ADMM iterations on the normalized QP, returns the iteration count."""
+        G, G_t, rho = self._constraints, self._constraints_t, self.rho
+        solution, slack, dual = self._solution, self._slack, self._dual
+        for iteration in range(1, self.max_iterations + 1):
+            right_hand_side = SIGMA * solution - gradient + G_t @ (rho * slack - dual)
+            solution[:] = scipy.linalg.cho_solve(self._factor, right_hand_side)
+            constrained = G @ solution
+            previous_slack = slack.copy()
+            np.clip(constrained + dual / rho, self._lower, self._upper, out=slack)
+            dual += rho * (constrained - slack)
+            primal_residual = np.max(np.abs(constrained - slack))
+            dual_residual = rho * np.max(np.abs(G_t @ (slack - previous_slack)))
+            if max(primal_residual, dual_residual) < self.tolerance:
+                return iteration
+        return self.max_iterations
+
+    def reset(self) -> None:
+        """Forget the warm start, e.g. after the plant was reset."""
+        self._solution[:] = 0.0
+        self._slack[:] = 0.0
+        self._dual[:] = 0.0
+
+    def snapshot(self) -> np.ndarray:
+        """The warm start: previous solution, slack and dual variables."""
+        return np.concatenate((self._solution, self._slack, self._dual))
+
+    def restore(self, snapshot) -> None:
+        n_solution, n_constraints = self._solution.size, self._slack.size
+        self._solution[:] = snapshot[:n_solution]
+        self._slack[:] = snapshot[n_solution : n_solution + n_constraints]
+        self._dual[:] = snapshot[n_solution + n_constraints :]
+
+
+def _weight_matrix(weights, size: int) -> np.ndarray:
+    weights = np.asarray(weights, dtype=float)
+    if weights.ndim == 1:
+        weights = np.diag(weights)
+    if weights.shape != (size, size):
+        raise ValueError(
+            f"weights must have {size} entries or shape ({size}, {size}), "
+            f"but have shape {weights.shape}"
+        )
+    return weights
+
+
+def _prediction_matrices(A_d, B_d, horizon: int):
+    """Stacked predictions x_1..x_N = free @ x_0 + forced @ (u_0..u_{N-1})."""
+    n, m = B_d.shape
+    free = np.zeros((horizon * n, n))
+    forced = np.zeros((horizon * n, horizon * m))
+    power = np.eye(n)
+    # impulse[k] = A_d^k B_d
+    impulses = []
+    for k in range(horizon):
+        impulses.append(power @ B_d)
+        power = A_d @ power
+        free[k * n : (k + 1) * n] = power
+    for k in range(horizon):
+        for j in range(k + 1):
+            forced[k * n : (k + 1) * n, j * m : (j + 1) * m] = impulses[k - j]
+    return free, forced
@@ -87,12 +87,12 @@ class Submarine(GameObject):
 
 
 class DynamicCart(GameObject):
-    def __init__(self, space, position, width=100, height=20):
+    def __init__(self, space, position, width=100, height=20, mass=10000):
         super().__init__(space)
         self.width = width
         self.height = height
         self.color = (0, 100, 0)  # Green color
-        self.mass = 10000
+        self.mass = mass
         # Create kinematic body
         self.body = pymunk.Body(
             body_type=pymunk.Body.DYNAMIC, mass=self.mass, moment=float("inf")
@@ -1,5 +1,11 @@
 from abc import ABC, abstractmethod
+import numpy as np
 import pygame
+import pymunk
+from space_config import SpaceConfig
+
+# Values per dynamic body in PlantBase.snapshot
+BODY_SNAPSHOT_SIZE = 9
 
 
 class PlantBase(ABC):
@@ -9,20 +15,29 @@ class PlantBase(ABC):
     state management, and control input handling.
     """
 
-    def __init__(self, sample_time: float):
+    def __init__(self, sample_time: float, space_config: SpaceConfig = None):
         """Initialize the plant base.
 
         Args:
             sample_time: Simulation sample time in seconds
+            space_config: Solver and threading settings of the plant's pymunk
+                space, defaults to pymunk's own defaults
         """
         self.sample_time: float = sample_time
+        self.space_config: SpaceConfig = (
+            space_config if space_config is not None else SpaceConfig()
+        )
         self.non_physical_objects: list = []
         self.all_physical_objects: list = []
         self.n_inputs: int = 0
         self.n_outputs: int = 0
+        self.n_states: int = 0
         self.input = None
         self.output = None
         self.state = None
+        self._state_cache: np.ndarray = np.zeros(0)
+        self._state_cache_valid: bool = False
+        self._snapshot_bodies: list | None = None
 
     @abstractmethod
     def step(self, time_delta: float) -> None:
@@ -33,6 +48,208 @@ class PlantBase(ABC):
         """
         pass
 
+    def _step_space(self, time_delta: float) -> None:
+        """Advance self.space, split into the configured number of substeps.
+
+        pymunk clears the body forces after every space step, so the input
+        is applied through _apply_input before each substep.
+
+        Args:
+            time_delta: Time delta of the whole plant step in seconds
+        """
+        substeps = self.space_config.substeps
+        substep_delta = time_delta / substeps
+        for _ in range(substeps):
+            self._apply_input()
+            self.space.step(substep_delta)
+        self._state_cache_valid = False
+
+    def _apply_input(self) -> None:
+        """Hook applying the held input as body forces, called per substep."""
+
+    def _init_state_cache(self, n_states: int) -> None:
+        """Allocate the state buffer filled by _compute_state_into.
+
+        Args:
+            n_states: Number of scalar state entries of the plant
+        """
+        self.n_states = n_states
+        self._state_cache = np.zeros(n_states)
+        self._state_cache_valid = False
+
+    def invalidate_state_cache(self) -> None:
+        """Mark the cached state as stale.
+
+        Call this after moving bodies outside of step, e.g. when resetting a
+        body position from the UI.
+        """
+        self._state_cache_valid = False
+
+    def _cached_state(self) -> np.ndarray:
+        """Return the state buffer, computing it at most once per step."""
+        if not self._state_cache_valid:
+            self._compute_state_into(self._state_cache)
+            self._state_cache_valid = True
+        return self._state_cache
+
+    def _compute_state_into(self, out: np.ndarray) -> None:
+        """Write the current state into a preallocated float64 buffer.
+
+        Args:
+            out: Buffer of length n_states
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not provide an array state"
+        )
+
+    def get_state_into(self, out: np.ndarray) -> np.ndarray:
+        """Copy the current state into a preallocated float64 buffer.
+
+        The state is computed once per step and cached until the next step,
+        so repeated calls only copy n_states floats and allocate nothing.
+
+        Args:
+            out: Buffer of length n_states
+
+        Returns:
+            np.ndarray: The buffer passed as out
+        """
+        out[:] = self._cached_state()
+        return out
+
+    def _dynamic_bodies(self) -> list:
+        """Bodies captured by snapshot(), collected on first use.
+
+        Defaults to all dynamic bodies of self.space in the order they were
+        added; plants adding bodies after their first snapshot must reset
+        self._snapshot_bodies to None.
+        """
+        if self._snapshot_bodies is None:
+            self._snapshot_bodies = [
+                body
+                for body in self.space.bodies
+                if body.body_type == pymunk.Body.DYNAMIC
+            ]
+        return self._snapshot_bodies
+
+    def snapshot_size(self, controllers=()) -> int:
+        """Length of the array returned by snapshot() for these controllers."""
+        size = BODY_SNAPSHOT_SIZE * len(self._dynamic_bodies()) + self._input_size()
+        return size + sum(controller.snapshot().size for controller in controllers)
+
+    def snapshot(self, controllers=(), out: np.ndarray | None = None) -> np.ndarray:
+        """Capture everything that defines the plant's evolution in a flat array.
+
+        Per dynamic body, the array holds position, velocity, angle, angular
+        velocity, accumulated force and torque (BODY_SNAPSHOT_SIZE values),
+        followed by the held input and the snapshots of the given controllers
+        (or other objects with snapshot()/restore(), e.g. estimators). Joints
+        need no entries, their configuration follows from the bodies. Only
+        the solver's warm-starting impulses of the joints are not captured,
+        which pymunk does not expose.
+
+        Args:
+            controllers: Controllers whose memory is captured with the plant
+            out: Optional buffer of length snapshot_size(controllers)
+
+        Returns:
+            np.ndarray: The snapshot, to be passed to restore()
+        """
+        controller_snapshots = [controller.snapshot() for controller in controllers]
+        bodies = self._dynamic_bodies()
+        n_input_values = self._input_size()
+        size = BODY_SNAPSHOT_SIZE * len(bodies) + n_input_values
+        size += sum(part.size for part in controller_snapshots)
+        if out is None:
+            out = np.empty(size)
+        elif out.shape != (size,):
+            raise ValueError(f"out must have shape ({size},), has {out.shape}")
+        index = 0
+        for body in bodies:
+            position, velocity, force = body.position, body.velocity, body.force
+            out[index : index + BODY_SNAPSHOT_SIZE] = (
+                position.x,
+                position.y,
+                velocity.x,
+                velocity.y,
+                body.angle,
+                body.angular_velocity,
+                force.x,
+                force.y,
+                body.torque,
+            )
+            index += BODY_SNAPSHOT_SIZE
+        if n_input_values:
+            out[index : index + n_input_values] = np.concatenate(
+                [np.ravel(field) for field in self.input]
+            )
+        index += n_input_values
+        for part in controller_snapshots:
+            out[index : index + part.size] = part
+            index += part.size
+        return out
+
+    def restore(self, snapshot, controllers=()) -> None:
+        """Reset plant and controllers to a state captured by snapshot().
+
+        Args:
+            snapshot: Array returned by snapshot()
+            controllers: The controllers passed to snapshot(), in the same
+                order
+
+        Raises:
+            ValueError: If the snapshot does not match the bodies, input and
+                controllers; nothing is restored then
+        """
+        snapshot = np.asarray(snapshot, dtype=float)
+        bodies = self._dynamic_bodies()
+        controller_sizes = [controller.snapshot().size for controller in controllers]
+        size = BODY_SNAPSHOT_SIZE * len(bodies) + self._input_size()
+        size += sum(controller_sizes)
+        if snapshot.shape != (size,):
+            raise ValueError(
+                f"snapshot must have shape ({size},) for {len(bodies)} bodies "
+                f"and the given controllers, has {snapshot.shape}"
+            )
+        values = snapshot.tolist()
+        index = 0
+        for body in bodies:
+            (x, y, vx, vy, angle, angular_velocity, fx, fy, torque) = values[
+                index : index + BODY_SNAPSHOT_SIZE
+            ]
+            body.position = (x, y)
+            body.velocity = (vx, vy)
+            body.angle = angle
+            body.angular_velocity = angular_velocity
+            body.force = (fx, fy)
+            body.torque = torque
+            if body.is_sleeping:
+                body.activate()
+            index += BODY_SNAPSHOT_SIZE
+        input_fields = []
+        for field in self.input:
+            if np.ndim(field) == 0:
+                input_fields.append(values[index])
+                index += 1
+            else:
+                size = np.size(field)
+                input_fields.append(
+                    np.reshape(snapshot[index : index + size], np.shape(field)).copy()
+                )
+                index += size
+        self.input = type(self.input)(*input_fields)
+        for controller, size in zip(controllers, controller_sizes):
+            controller.restore(snapshot[index : index + size])
+            index += size
+        self._state_cache_valid = False
+        self._after_restore()
+
+    def _input_size(self) -> int:
+        return sum(np.size(field) for field in self.input)
+
+    def _after_restore(self) -> None:
+        """Hook for plants mirroring body state, called at the end of restore."""
+
     @abstractmethod
     def get_state(self):
         """Get the current state of the plant.
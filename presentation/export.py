@@ -1,80 +1,205 @@
 #!/usr/bin/env python3
 """
 Auto-export script for presentation and handout PDFs
-Uses wrapper files to control handout mode in Typst
+Compiles both variants in-process with the typst package; the variant is
+passed to the document as sys.inputs.handout. Stale simulation figures
+(see figures.py) are rendered first.
 """
 
+import argparse
+import hashlib
 import os
-import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import typst
+from figures import build_figures
 
-def compile_dual_pdfs(input_file):
-    """Compile both presentation and handout PDFs from a Typst file"""
-
-    input_path = Path(input_file)
-    base_name = input_path.stem
-    input_dir = input_path.parent
-
-    # Read the original presentation file
-    with open(input_path, "r", encoding="utf-8") as f:
-        presentation_content = f.read()
+# Output file suffix and value of sys.inputs.handout per variant
+VARIANTS = {
+    "": "false",
+    "_handout": "true",
+}
+HASHED_SUFFIXES = {".typ", ".bib"}
+IMAGE_DIRECTORY = "images"
 
-    print("Compiling presentation PDF...")
-    # Create wrapper for presentation mode (handout = false)
-    wrapper_pres_content = f"""#let handout = false
-{presentation_content}
-"""
-    wrapper_pres_file = input_dir / f"{base_name}_pres_wrapper.typ"
-    wrapper_pres_file.write_text(wrapper_pres_content, encoding="utf-8")
-
-    result_pres = subprocess.run(
-        ["typst", "compile", str(wrapper_pres_file), f"{base_name}.pdf"],
-        cwd=input_dir,
-        capture_output=False,
-        text=True,
-    )
 
-    # Clean up wrapper file
-    wrapper_pres_file.unlink()
+def _hashed_files(input_dir):
+    """Yield the sources whose content determines the PDFs, in stable order."""
+    for path in sorted(input_dir.iterdir()):
+        if path.is_file() and path.suffix in HASHED_SUFFIXES:
+            yield path
+    image_dir = input_dir / IMAGE_DIRECTORY
+    if image_dir.is_dir():
+        for path in sorted(image_dir.rglob("*")):
+            if path.is_file():
+                yield path
 
-    if result_pres.returncode != 0:
-        print("Error compiling presentation!")
-        sys.exit(1)
 
-    print("Compiling handout PDF...")
-    # Create wrapper for handout mode (handout = true)
-    wrapper_handout_content = f"""#let handout = true
-{presentation_content}
-"""
-    wrapper_handout_file = input_dir / f"{base_name}_handout_wrapper.typ"
-    wrapper_handout_file.write_text(wrapper_handout_content, encoding="utf-8")
-
-    result_handout = subprocess.run(
-        ["typst", "compile", str(wrapper_handout_file), f"{base_name}_handout.pdf"],
-        cwd=input_dir,
-        capture_output=False,
-        text=True,
-    )
+def source_hash(input_path):
+    """Hash the Typst sources, bibliographies and images next to input_path.
 
-    # Clean up wrapper file
-    wrapper_handout_file.unlink()
+    The typst version and the input file name are part of the hash, so an
+    update of the compiler or a different entry file triggers a rebuild.
+    """
+    input_dir = input_path.parent
+    digest = hashlib.sha256()
+    digest.update(f"typst {typst.__version__}\0{input_path.name}\0".encode())
+    for path in _hashed_files(input_dir):
+        digest.update(path.relative_to(input_dir).as_posix().encode() + b"\0")
+        digest.update(path.read_bytes())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class DualPdfBuilder:
+    """Builds the presentation and handout PDFs of one Typst file.
+
+    Each variant keeps its own typst.Compiler, so fonts and parsed files are
+    reused when the builder runs repeatedly, e.g. in watch mode. Both
+    variants compile in parallel threads.
+    """
+
+    def __init__(self, input_file):
+        self.input_path = Path(input_file).resolve()
+        self.input_dir = self.input_path.parent
+        base_name = self.input_path.stem
+        self.outputs = {
+            suffix: self.input_dir / f"{base_name}{suffix}.pdf" for suffix in VARIANTS
+        }
+        self.hash_file = self.input_dir / f".{base_name}.build-hash"
+        self.compilers = {
+            suffix: typst.Compiler(
+                str(self.input_path),
+                root=str(self.input_dir),
+                sys_inputs={"handout": handout},
+            )
+            for suffix, handout in VARIANTS.items()
+        }
+        self.executor = ThreadPoolExecutor(max_workers=len(VARIANTS))
+        self._failed_hash = None
+
+    def is_up_to_date(self, content_hash):
+        if not all(path.exists() for path in self.outputs.values()):
+            return False
+        try:
+            return self.hash_file.read_text(encoding="utf-8") == content_hash
+        except FileNotFoundError:
+            return False
+
+    def _compile(self, suffix):
+        self.compilers[suffix].compile(output=str(self.outputs[suffix]))
+        return self.outputs[suffix]
+
+    def build(self, force=False):
+        """Compile both PDFs unless the sources are unchanged.
+
+        Args:
+            force: Rebuild even if the content hash matches the last build
+                or the last failed build
+
+        Raises:
+            typst.TypstError: If compilation fails. The stored hash is left
+                untouched; this builder retries once the sources change.
+
+        Returns:
+            bool: True if the PDFs were compiled, False if skipped
+        """
+        content_hash = source_hash(self.input_path)
+        if not force and (
+            content_hash == self._failed_hash or self.is_up_to_date(content_hash)
+        ):
+            return False
+        # Resolve all futures before raising, so no compile is left running
+        futures = [self.executor.submit(self._compile, suffix) for suffix in VARIANTS]
+        for future in futures:
+            if future.exception() is not None:
+                self._failed_hash = content_hash
+        for future in futures:
+            future.result()
+        self.hash_file.write_text(content_hash, encoding="utf-8")
+        return True
+
+    def close(self):
+        self.executor.shutdown()
+
+
+def _build_figures(force=False):
+    rendered = build_figures(force=force)
+    if rendered:
+        print(f"Rendered figures: {', '.join(rendered)}")
+
+
+def compile_dual_pdfs(input_file, force=False, figures=True):
+    """Compile both presentation and handout PDFs from a Typst file"""
 
-    if result_handout.returncode != 0:
-        print("Error compiling handout!")
+    builder = DualPdfBuilder(input_file)
+    base_name = builder.input_path.stem
+    start = time.perf_counter()
+    try:
+        if figures:
+            _build_figures(force=force)
+        built = builder.build(force=force)
+    except (typst.TypstError, RuntimeError) as error:
+        print(f"Error compiling {builder.input_path.name}:\n{error}")
         sys.exit(1)
+    finally:
+        builder.close()
 
-    print("Done! Generated:")
+    if not built:
+        print("Sources unchanged, PDFs are up to date.")
+        return
+    print(f"Done in {time.perf_counter() - start:.2f} s! Generated:")
     print(f"  - {base_name}.pdf (presentation with animations)")
     print(f"  - {base_name}_handout.pdf (handout without animations)")
 
 
+def watch(input_file, interval=0.5, figures=True):
+    """Rebuild whenever the sources change, reusing the compilers."""
+    builder = DualPdfBuilder(input_file)
+    print(f"Watching {builder.input_dir} (Ctrl+C to stop)")
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                if figures:
+                    _build_figures()
+                if builder.build():
+                    print(f"Rebuilt in {time.perf_counter() - start:.2f} s")
+            except (typst.TypstError, RuntimeError) as error:
+                print(f"Error compiling {builder.input_path.name}:\n{error}")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        builder.close()
+
+
 if __name__ == "__main__":
-    input_file = sys.argv[1] if len(sys.argv) > 1 else "presentation.typ"
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input_file", nargs="?", default="presentation.typ")
+    parser.add_argument(
+        "--force", action="store_true", help="rebuild even if nothing changed"
+    )
+    parser.add_argument(
+        "--watch", action="store_true", help="rebuild whenever a source changes"
+    )
+    parser.add_argument(
+        "--no-figures",
+        action="store_true",
+        help="do not render stale simulation figures first",
+    )
+    args = parser.parse_args()
 
-    if not os.path.exists(input_file):
-        print(f"Error: File '{input_file}' not found!")
+    if not os.path.exists(args.input_file):
+        print(f"Error: File '{args.input_file}' not found!")
         sys.exit(1)
 
-    compile_dual_pdfs(input_file)
+    if args.watch:
+        watch(args.input_file, figures=not args.no_figures)
+    else:
+        compile_dual_pdfs(
+            args.input_file, force=args.force, figures=not args.no_figures
+        )
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Build stage for simulation-derived figures of the presentation
+Figures are declared in FIGURES, cached by a hash of their inputs and
+rendered in parallel worker processes
+"""
+
+import argparse
+import ast
+import hashlib
+import inspect
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from importlib.metadata import version
+from pathlib import Path
+
+PRESENTATION_DIR = Path(__file__).resolve().parent
+REPO_ROOT = PRESENTATION_DIR.parent
+OUTPUT_DIR = PRESENTATION_DIR / "images" / "generated"
+CACHE_FILE = OUTPUT_DIR / ".figure-cache.json"
+FIGURE_DPI = 150
+
+# Workers render without a display
+os.environ.setdefault("MPLBACKEND", "Agg")
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+
+@dataclass(frozen=True)
+class FigureSpec:
+    """Declarative description of one generated figure.
+
+    Attributes:
+        name: Output file name without extension, in images/generated
+        kind: Renderer registered in RENDERERS
+        params: JSON serializable keyword arguments of the renderer
+    """
+
+    name: str
+    kind: str
+    params: dict = field(default_factory=dict)
+
+    @property
+    def output_path(self) -> Path:
+        return OUTPUT_DIR / f"{self.name}.png"
+
+
+# kind -> (render function, helper functions)
+RENDERERS = {}
+
+
+def renderer(kind, *helpers):
+    """Register a render function taking the spec params, returning a Figure.
+
+    The repository modules a figure depends on are found from the imports
+    of the render function and its helpers, see repository_dependencies.
+
+    Args:
+        kind: Name used by FigureSpec.kind
+        helpers: Helper functions of this module called by the renderer
+    """
+
+    def register(function):
+        RENDERERS[kind] = (function, helpers)
+        return function
+
+    return register
+
+
+def repository_dependencies(*functions) -> list:
+    """Repository modules imported by the functions, directly or indirectly.
+
+    Follows the import statements of the functions' source and of every
+    top-level module of the repository reached that way, including imports
+    inside functions and conditional ones, without importing anything.
+
+    Returns:
+        list: Sorted file names relative to the repository root
+    """
+    found = set()
+    pending = [inspect.getsource(function) for function in functions]
+    while pending:
+        for node in ast.walk(ast.parse(pending.pop())):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                file_name = name.partition(".")[0] + ".py"
+                path = REPO_ROOT / file_name
+                if file_name not in found and path.is_file():
+                    found.add(file_name)
+                    pending.append(path.read_text(encoding="utf-8"))
+    return sorted(found)
+
+
+def _pendulum_closed_loop(desired_poles):
+    import control
+    from inverted_pendulum_model import InvertedPendlumModel as IpModel
+    from inverted_pendulum_plant import DefaultModelParams
+
+    A, B, C, D = IpModel.state_space_model_matrices(
+        mass_cart=DefaultModelParams.CART_MASS,
+        mass_pendulum=DefaultModelParams.BALL_MASS,
+        length_pendulum=DefaultModelParams.PENDULUM_LENGTH,
+        gravity=DefaultModelParams.GRAVITY[1],
+    )
+    B = B.reshape(4, 1)
+    gain = control.place(A, B, desired_poles)
+    system = control.ss(A - B @ gain, B, C, D)
+    return system, gain
+
+
+@renderer("poles", _pendulum_closed_loop)
+def render_poles(desired_poles, title):
+    from state_space_control_calculations import plot_lti_poles
+
+    system, gain = _pendulum_closed_loop(desired_poles)
+    return plot_lti_poles(system, title=title, figtext=f"controller gains {gain}")
+
+
+@renderer("step_response", _pendulum_closed_loop)
+def render_step_response(desired_poles, duration):
+    import control
+    import numpy as np
+
+    system, _ = _pendulum_closed_loop(desired_poles)
+    time = np.linspace(0.0, duration, 500)
+    response = control.step_response(system, time)
+    return response.plot().figure
+
+
+@renderer("pendulum_initial_response", _pendulum_closed_loop)
+def render_pendulum_initial_response(desired_poles, initial_angle, duration):
+    import control
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    system, _ = _pendulum_closed_loop(desired_poles)
+    time = np.linspace(0.0, duration, 500)
+    response = control.initial_response(
+        system, time, X0=[0.0, 0.0, initial_angle, 0.0], return_x=True
+    )
+    figure, (position_axis, angle_axis) = plt.subplots(2, 1, sharex=True)
+    position_axis.plot(response.time, response.states[0])
+    position_axis.set_ylabel("Wagenposition [px]")
+    angle_axis.plot(response.time, np.degrees(response.states[2]))
+    angle_axis.set_ylabel("Pendelwinkel [°]")
+    angle_axis.set_xlabel("Zeit [s]")
+    for axis in (position_axis, angle_axis):
+        axis.grid(True)
+    figure.tight_layout()
+    return figure
+
+
+@renderer("submarine_trajectory")
+def render_submarine_trajectory(kp, ki, kd, step_height, duration, title):
+    import matplotlib.pyplot as plt
+    import submarine
+    from game_controller import ControllerPID
+
+    if step_height:
+        mapping = submarine._create_step_reference_mapping(
+            window_height=submarine.WINDOW_HEIGHT,
+            step_height=step_height,
+            step_position=submarine.WINDOW_WIDTH // 2,
+        )
+    else:
+        mapping = submarine._create_constant_reference_mapping(
+            window_height=submarine.WINDOW_HEIGHT
+        )
+    controller = ControllerPID(kp, ki, kd, sample_time=submarine.CONTROL_PERIOD)
+    trajectory = submarine.simulate_submarine(
+        controller, submarine.ReferenceSignal(mapping), duration
+    )
+    figure, axis = plt.subplots(figsize=(8, 4))
+    axis.plot(trajectory[:, 0], trajectory[:, 4], "--", color="darkred", label="Soll")
+    axis.plot(trajectory[:, 0], trajectory[:, 1], label="Ist")
+    # Screen coordinates: larger values are deeper
+    axis.invert_yaxis()
+    axis.set_xlabel("Zeit [s]")
+    axis.set_ylabel("Tiefe [px]")
+    axis.set_title(title)
+    axis.legend()
+    axis.grid(True)
+    figure.tight_layout()
+    return figure
+
+
+PENDULUM_POLES = [-1.6, -1.7, -2.0, -2.1]
+
+FIGURES = [
+    FigureSpec(
+        "pendulum_poles_closed_loop",
+        "poles",
+        {"desired_poles": PENDULUM_POLES, "title": "Pole des geschlossenen Kreises"},
+    ),
+    FigureSpec(
+        "pendulum_step_response",
+        "step_response",
+        {"desired_poles": PENDULUM_POLES, "duration": 8.0},
+    ),
+    FigureSpec(
+        "pendulum_initial_response",
+        "pendulum_initial_response",
+        {"desired_poles": PENDULUM_POLES, "initial_angle": 0.1, "duration": 8.0},
+    ),
+    FigureSpec(
+        "submarine_pid_step",
+        "submarine_trajectory",
+        {
+            "kp": -2800,
+            "ki": -100,
+            "kd": -3800,
+            "step_height": -200,
+            "duration": 12.0,
+            "title": "PID Regler",
+        },
+    ),
+    FigureSpec(
+        "submarine_high_gain",
+        "submarine_trajectory",
+        {
+            "kp": -6000,
+            "ki": 0,
+            "kd": 0,
+            "step_height": 0,
+            "duration": 12.0,
+            "title": "Hoher P Anteil",
+        },
+    ),
+]
+
+
+def figure_hash(spec):
+    """Hash everything a figure depends on.
+
+    Covers the spec, the source of its renderer and helpers, the repository
+    modules they import and the matplotlib version.
+    """
+    function, helpers = RENDERERS[spec.kind]
+    digest = hashlib.sha256()
+    digest.update(json.dumps([spec.kind, spec.params], sort_keys=True).encode())
+    digest.update(f"matplotlib {version('matplotlib')}".encode())
+    for helper in (function, *helpers):
+        digest.update(inspect.getsource(helper).encode())
+    for dependency in repository_dependencies(function, *helpers):
+        digest.update(dependency.encode() + b"\0")
+        digest.update((REPO_ROOT / dependency).read_bytes())
+    return digest.hexdigest()
+
+
+def _render(spec):
+    # Runs in a worker process
+    import matplotlib.pyplot as plt
+
+    function, _ = RENDERERS[spec.kind]
+    figure = function(**spec.params)
+    figure.savefig(spec.output_path, dpi=FIGURE_DPI)
+    plt.close(figure)
+    return spec.name
+
+
+def _load_cache():
+    try:
+        return json.loads(CACHE_FILE.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def build_figures(figures=FIGURES, force=False, max_workers=None):
+    """Render all stale figures in parallel.
+
+    A figure is stale if its PNG is missing or its input hash differs from
+    the one recorded at its last successful render.
+
+    Args:
+        figures: FigureSpecs to build
+        force: Render all figures regardless of the cache
+        max_workers: Worker processes, defaults to the number of CPUs
+
+    Raises:
+        RuntimeError: If any figure failed; the others are still cached
+
+    Returns:
+        list: Names of the rendered figures
+    """
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    cache = _load_cache()
+    hashes = {spec.name: figure_hash(spec) for spec in figures}
+    stale = [
+        spec
+        for spec in figures
+        if force
+        or cache.get(spec.name) != hashes[spec.name]
+        or not spec.output_path.exists()
+    ]
+    if not stale:
+        return []
+
+    rendered, errors = [], []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {spec.name: executor.submit(_render, spec) for spec in stale}
+        for name, future in futures.items():
+            try:
+                future.result()
+            except Exception as error:
+                errors.append(f"{name}: {error!r}")
+                cache.pop(name, None)
+            else:
+                cache[name] = hashes[name]
+                rendered.append(name)
+    CACHE_FILE.write_text(json.dumps(cache, indent=2, sort_keys=True), encoding="utf-8")
+    if errors:
+        raise RuntimeError("figures failed to render:\n" + "\n".join(errors))
+    return rendered
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--force", action="store_true", help="render all figures, ignore the cache"
+    )
+    args = parser.parse_args()
+
+    rendered = build_figures(force=args.force)
+    if rendered:
+        print("Rendered:", ", ".join(rendered))
+    else:
+        print("All figures are up to date.")
@@ -1,8 +1,10 @@
 #import "@preview/touying:0.5.2": *
 #import "@preview/touying-buaa:0.2.0": *
 
-// Define handout with a default value of false if not provided by wrapper
-#let handout = false
+// Handout mode is set by export.py, or by `typst compile --input handout=true`
+// The simulation figures in images/generated/ are not versioned: export.py
+// renders them, before a plain `typst compile` run `python figures.py`
+#let handout = sys.inputs.at("handout", default: "false") == "true"
 
 #let wissen_ist_nacht_datum = datetime(
   year: 2025,
@@ -183,6 +185,13 @@ Gute Gründe:
 == Gefahr: Instabilität!
 #with-tech-logos()[
   *Demo*: _Simulation mit kontraproduktiv eingestelltem Regler (hohe P Anteile)_]
+#pause
+#grid(
+  columns: (1fr, 1fr),
+  gutter: 10pt,
+  image("images/generated/submarine_pid_step.png", width: 100%),
+  image("images/generated/submarine_high_gain.png", width: 100%),
+)
 
 == U-Boot Tiefenregelung: Darstellung im Blockdiagramm
 #[
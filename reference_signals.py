@@ -0,0 +1,252 @@
+"""Declarative reference signals over the horizontal course position.
+
+Specs are frozen dataclasses: they pickle to process pool workers, hash and
+compare by value for caching, and round-trip through plain dicts, e.g. from
+scenario files. Every spec evaluates scalars with evaluate() and arrays of
+positions with the vectorized evaluate_many().
+"""
+
+from dataclasses import asdict, dataclass, fields
+from functools import cached_property
+from itertools import pairwise
+from pathlib import Path
+from typing import ClassVar
+
+import numpy as np
+
+# kind -> spec class, filled by @_register
+SPEC_TYPES: dict = {}
+
+
+def _register(spec_type):
+    SPEC_TYPES[spec_type.kind] = spec_type
+    return spec_type
+
+
+def _as_points(points) -> tuple:
+    """Normalize (x, y) pairs to a hashable tuple, checking that x increases."""
+    points = tuple((float(x), float(y)) for x, y in points)
+    if len(points) < 2:
+        raise ValueError(f"at least two points are needed, got {len(points)}")
+    if any(a[0] >= b[0] for a, b in pairwise(points)):
+        raise ValueError("point x positions must be strictly increasing")
+    return points
+
+
+class ReferenceSpec:
+    """Base class of the reference signal specs."""
+
+    kind: ClassVar[str] = ""
+
+    def evaluate_many(self, x_positions) -> np.ndarray:
+        """Evaluate the reference at an array of positions."""
+        raise NotImplementedError
+
+    def evaluate(self, x_position: float) -> float:
+        return float(self.evaluate_many(np.asarray(x_position, dtype=float)))
+
+    def lookup_table(
+        self, start: float, stop: float, step: float = 1.0
+    ) -> "ReferenceLookupTable":
+        """Precompute the reference over [start, stop] with spacing step."""
+        return ReferenceLookupTable(self, start, stop, step)
+
+    def to_dict(self) -> dict:
+        """Plain dict with the spec kind, e.g. for JSON or TOML files."""
+        return {"kind": self.kind, **asdict(self)}
+
+
+def reference_from_dict(data: dict) -> ReferenceSpec:
+    """Create a spec from the output of ReferenceSpec.to_dict.
+
+    Raises:
+        ValueError: If the kind is unknown or parameters are missing or
+            unexpected
+    """
+    data = dict(data)
+    kind = data.pop("kind", None)
+    spec_type = SPEC_TYPES.get(kind)
+    if spec_type is None:
+        raise ValueError(
+            f"unknown reference kind {kind!r}, use one of {sorted(SPEC_TYPES)}"
+        )
+    names = {field.name for field in fields(spec_type)}
+    if set(data) - names:
+        raise ValueError(
+            f"unexpected parameters {sorted(set(data) - names)} for {kind!r}"
+        )
+    try:
+        return spec_type(**data)
+    except TypeError as error:
+        raise ValueError(f"invalid parameters for {kind!r}: {error}") from error
+
+
+@_register
+@dataclass(frozen=True)
+class ConstantReference(ReferenceSpec):
+    kind: ClassVar[str] = "constant"
+
+    value: float
+
+    def evaluate_many(self, x_positions) -> np.ndarray:
+        return np.full(np.shape(x_positions), float(self.value))
+
+
+@_register
+@dataclass(frozen=True)
+class StepReference(ReferenceSpec):
+    """initial before step_position, final from step_position on."""
+
+    kind: ClassVar[str] = "step"
+
+    initial: float
+    final: float
+    step_position: float
+
+    def evaluate_many(self, x_positions) -> np.ndarray:
+        return np.where(
+            np.asarray(x_positions) < self.step_position,
+            float(self.initial),
+            float(self.final),
+        )
+
+
+@_register
+@dataclass(frozen=True)
+class SineReference(ReferenceSpec):
+    """amplitude * sin(frequency * x + phase) + offset"""
+
+    kind: ClassVar[str] = "sine"
+
+    amplitude: float
+    frequency: float
+    phase: float = 0.0
+    offset: float = 0.0
+
+    def evaluate_many(self, x_positions) -> np.ndarray:
+        return (
+            self.amplitude
+            * np.sin(self.frequency * np.asarray(x_positions, dtype=float) + self.phase)
+            + self.offset
+        )
+
+
+@_register
+@dataclass(frozen=True)
+class PiecewiseLinearReference(ReferenceSpec):
+    """Linear interpolation between (x, y) points, constant beyond the ends."""
+
+    kind: ClassVar[str] = "piecewise_linear"
+
+    points: tuple
+
+    def __post_init__(self):
+        object.__setattr__(self, "points", _as_points(self.points))
+
+    @cached_property
+    def _arrays(self):
+        return np.array(self.points).T.copy()
+
+    def evaluate_many(self, x_positions) -> np.ndarray:
+        xs, ys = self._arrays
+        return np.interp(x_positions, xs, ys)
+
+
+@_register
+@dataclass(frozen=True)
+class SplineReference(ReferenceSpec):
+    """Natural cubic spline through (x, y) points, constant beyond the ends."""
+
+    kind: ClassVar[str] = "spline"
+
+    points: tuple
+
+    def __post_init__(self):
+        object.__setattr__(self, "points", _as_points(self.points))
+
+    @cached_property
+    def _spline(self):
+        from scipy.interpolate import CubicSpline
+
+        xs, ys = np.array(self.points).T
+        return CubicSpline(xs, ys, bc_type="natural")
+
+    def evaluate_many(self, x_positions) -> np.ndarray:
+        spline = self._spline
+        return spline(np.clip(x_positions, spline.x[0], spline.x[-1]))
+
+
+@_register
+@dataclass(frozen=True)
+class TableReference(ReferenceSpec):
+    """(x, y) table read from a file, interpolated linearly or by a spline.
+
+    .npy files hold an (n, 2) array; any other file is read as text with
+    one "x, y" row per line, comma or whitespace separated. Lines starting
+    with # are skipped. The spec hashes by path, so caches keyed by specs
+    do not notice edits of the file.
+    """
+
+    kind: ClassVar[str] = "table"
+
+    path: str
+    interpolation: str = "linear"
+
+    def __post_init__(self):
+        object.__setattr__(self, "path", str(self.path))
+        if self.interpolation not in ("linear", "spline"):
+            raise ValueError(
+                f"interpolation must be 'linear' or 'spline', is {self.interpolation!r}"
+            )
+
+    @cached_property
+    def _interpolated(self) -> ReferenceSpec:
+        path = Path(self.path)
+        if path.suffix == ".npy":
+            table = np.load(path)
+        else:
+            text = path.read_text(encoding="utf-8").replace(",", " ")
+            table = np.loadtxt(text.splitlines(), ndmin=2)
+        if table.ndim != 2 or table.shape[1] != 2:
+            raise ValueError(f"{path} must hold (x, y) pairs, has shape {table.shape}")
+        if self.interpolation == "spline":
+            return SplineReference(table)
+        return PiecewiseLinearReference(table)
+
+    def evaluate_many(self, x_positions) -> np.ndarray:
+        return self._interpolated.evaluate_many(x_positions)
+
+
+class ReferenceLookupTable:
+    """Reference values precomputed on an equidistant grid.
+
+    Evaluation interpolates linearly between grid points with two index
+    operations, independent of the cost of the underlying spec. Positions
+    outside the grid are clamped to its ends.
+    """
+
+    def __init__(self, spec: ReferenceSpec, start: float, stop: float, step: float):
+        if step <= 0 or stop <= start:
+            raise ValueError(
+                f"need start < stop and step > 0, got {start}, {stop}, {step}"
+            )
+        self.spec = spec
+        self.start = float(start)
+        self.step = float(step)
+        n_points = int(np.ceil((stop - start) / step)) + 1
+        self.values = spec.evaluate_many(self.start + self.step * np.arange(n_points))
+        self._last_index = n_points - 1
+
+    def evaluate_many(self, x_positions) -> np.ndarray:
+        position = np.clip(
+            (np.asarray(x_positions, dtype=float) - self.start) / self.step,
+            0.0,
+            self._last_index,
+        )
+        lower = np.minimum(position.astype(np.intp), max(self._last_index - 1, 0))
+        upper = np.minimum(lower + 1, self._last_index)
+        fraction = position - lower
+        return self.values[lower] + fraction * (self.values[upper] - self.values[lower])
+
+    def evaluate(self, x_position: float) -> float:
+        return float(self.evaluate_many(x_position))
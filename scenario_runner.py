@@ -0,0 +1,547 @@
+"""Batch runner for declarative simulation scenarios.
+
+Runs every scenario file (.toml or .json) of a directory headless in a
+local process pool. Finished jobs are checkpointed in a journal next to
+their results, so an interrupted campaign resumes where it stopped, and a
+summary table of all scenarios is written at the end.
+"""
+
+import argparse
+import csv
+import dataclasses
+import hashlib
+import json
+import os
+import sys
+import time
+import tomllib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from control_metrics import METRIC_NAMES, StreamingMetrics
+from reference_signals import ReferenceSpec, reference_from_dict
+
+SCENARIO_SUFFIXES = (".toml", ".json")
+JOURNAL_FILE = "journal.jsonl"
+SUMMARY_FILE = "summary.csv"
+RESULTS_DIRECTORY = "results"
+# Window the plants are laid out in, as in the games
+WINDOW_SIZE = (1200, 800)
+SUMMARY_COLUMNS = (
+    "name",
+    "plant",
+    "controller",
+    "duration",
+    "seed",
+    "status",
+    *METRIC_NAMES,
+    "wall_time",
+    "error",
+)
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """One declarative simulation run.
+
+    Attributes:
+        name: Unique name, defaults to the file name without suffix
+        plant: Plant in PLANTS, e.g. "submarine" or "inverted_pendulum"
+        controller: Controller type and gains, e.g. {"type": "pid", "kp": 1}
+        reference: Reference over horizontal position (submarine) or
+            time (inverted pendulum cart position)
+        duration: Simulated time in seconds
+        seed: Seed of the random initial disturbance
+        plant_params: Overrides of the plant's default model parameters
+        initial_velocity_std: Standard deviation of the initial velocity
+            disturbance in px/s
+        bounds: Allowed [lower, upper] range of trajectory columns, e.g.
+            {"output": [50, 1150]}; a run leaving one is reported as failed
+    """
+
+    name: str
+    plant: str
+    controller: dict
+    reference: ReferenceSpec
+    duration: float
+    seed: int = 0
+    plant_params: dict = field(default_factory=dict)
+    initial_velocity_std: float = 0.0
+    bounds: dict = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        data = dataclasses.asdict(self)
+        data["reference"] = self.reference.to_dict()
+        return data
+
+    @property
+    def content_hash(self) -> str:
+        """Hash of all settings; a changed scenario is run again."""
+        encoded = json.dumps(self.to_dict(), sort_keys=True).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+
+def load_scenario(path) -> Scenario:
+    """Read a scenario from a TOML or JSON file.
+
+    Raises:
+        ValueError: If the file is malformed or misses required keys
+    """
+    path = Path(path)
+    try:
+        if path.suffix == ".toml":
+            data = tomllib.loads(path.read_text(encoding="utf-8"))
+        else:
+            data = json.loads(path.read_text(encoding="utf-8"))
+    except (tomllib.TOMLDecodeError, json.JSONDecodeError) as error:
+        raise ValueError(f"{path}: {error}") from error
+    data.setdefault("name", path.stem)
+    names = {scenario_field.name for scenario_field in dataclasses.fields(Scenario)}
+    unknown = set(data) - names
+    if unknown:
+        raise ValueError(f"{path}: unknown keys {sorted(unknown)}")
+    try:
+        data["reference"] = reference_from_dict(data["reference"])
+        scenario = Scenario(**data)
+    except (KeyError, TypeError, ValueError) as error:
+        raise ValueError(f"{path}: {error}") from error
+    if scenario.plant not in PLANTS:
+        raise ValueError(
+            f"{path}: unknown plant {scenario.plant!r}, use one of {sorted(PLANTS)}"
+        )
+    if "type" not in scenario.controller:
+        raise ValueError(f"{path}: the controller table needs a type")
+    for column, bound in scenario.bounds.items():
+        if not (len(bound) == 2 and bound[0] < bound[1]):
+            raise ValueError(
+                f"{path}: bound of {column!r} must be [lower, upper], is {bound}"
+            )
+    return scenario
+
+
+def load_scenarios(directory) -> list:
+    """Load all scenario files of a directory, sorted by file name.
+
+    Raises:
+        ValueError: If a file is invalid or two scenarios share a name
+    """
+    paths = sorted(
+        path
+        for path in Path(directory).iterdir()
+        if path.is_file() and path.suffix in SCENARIO_SUFFIXES
+    )
+    scenarios = [load_scenario(path) for path in paths]
+    names = [scenario.name for scenario in scenarios]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"duplicate scenario names {duplicates}")
+    return scenarios
+
+
+def _model_params(defaults, overrides: dict):
+    """Copy of a model parameter dataclass with overridden fields."""
+    try:
+        params = defaults()
+        for name, value in overrides.items():
+            default = getattr(params, name)
+            # Vectors such as GRAVITY are given as lists
+            if isinstance(default, tuple):
+                value = type(default)(*value)
+            setattr(params, name, value)
+    except AttributeError as error:
+        raise ValueError(f"unknown plant parameter: {error}") from error
+    return params
+
+
+# plant name -> function(scenario, initial_velocity) returning the
+# trajectory and the column indices of time, output, input, reference and
+# further plant specific columns
+PLANTS = {}
+
+
+def plant_runner(name):
+    """Register a function simulating scenarios of the named plant."""
+
+    def register(function):
+        PLANTS[name] = function
+        return function
+
+    return register
+
+
+@plant_runner("submarine")
+def _run_submarine(scenario: Scenario, initial_velocity: float):
+    import submarine
+    from game_controller import ControllerPID
+
+    settings = dict(scenario.controller)
+    controller_type = settings.pop("type")
+    if controller_type != "pid":
+        raise ValueError(
+            f"submarine supports the 'pid' controller, not {controller_type!r}"
+        )
+    controller = ControllerPID(sample_time=submarine.CONTROL_PERIOD, **settings)
+    trajectory = submarine.simulate_submarine(
+        controller,
+        submarine.ReferenceSignal(scenario.reference),
+        scenario.duration,
+        model_params=_model_params(
+            submarine.DefaultSubmarineModelParams, scenario.plant_params
+        ),
+        initial_vertical_velocity=initial_velocity,
+    )
+    return trajectory, {"time": 0, "output": 1, "input": 3, "reference": 4}
+
+
+@plant_runner("inverted_pendulum")
+def _run_inverted_pendulum(scenario: Scenario, initial_velocity: float):
+    import control
+
+    from game_controller import StateFeedbackController
+    from inverted_pendulum_model import PLANT_TO_MODEL, InvertedPendlumModel
+    from inverted_pendulum_plant import (
+        DefaultModelParams,
+        rail_limits,
+        simulate_inverted_pendulum,
+    )
+    from mpc_controller import LinearMPCController
+    from state_estimator import SteadyStateKalmanFilter
+
+    control_rate = 100.0
+    model_params = _model_params(DefaultModelParams, scenario.plant_params)
+    settings = dict(scenario.controller)
+    controller_type = settings.pop("type")
+    use_estimator = settings.pop("estimator", False)
+    if controller_type == "lqr":
+        A, B, _, _ = InvertedPendlumModel.state_space_model_matrices(
+            mass_cart=model_params.CART_MASS,
+            mass_pendulum=model_params.BALL_MASS,
+            length_pendulum=model_params.PENDULUM_LENGTH,
+            gravity=model_params.GRAVITY[1],
+        )
+        gain, _, _ = control.lqr(
+            A,
+            B.reshape(4, 1),
+            np.diag(settings["state_weights"]),
+            np.array([[settings["input_weight"]]]),
+        )
+        # The controller acts on reference - state in plant coordinates
+        controller = StateFeedbackController(
+            -gain @ PLANT_TO_MODEL, sample_time=1 / control_rate
+        )
+    elif controller_type == "state_feedback":
+        controller = StateFeedbackController(
+            np.array([settings["gain"]], dtype=float), sample_time=1 / control_rate
+        )
+    elif controller_type == "mpc":
+        controller = LinearMPCController.for_inverted_pendulum(
+            model_params,
+            sample_time=1 / control_rate,
+            rail_limits=rail_limits(WINDOW_SIZE[0]),
+            **settings,
+        )
+    else:
+        raise ValueError(
+            "inverted_pendulum supports the 'lqr', 'state_feedback' and 'mpc' "
+            f"controllers, not {controller_type!r}"
+        )
+    estimator = None
+    if use_estimator:
+        estimator = SteadyStateKalmanFilter.for_inverted_pendulum(
+            model_params, sample_time=1 / control_rate
+        )
+    trajectory = simulate_inverted_pendulum(
+        controller,
+        scenario.reference.evaluate,
+        scenario.duration,
+        control_rate=control_rate,
+        model_params=model_params,
+        estimator=estimator,
+        initial_ball_velocity=initial_velocity,
+        window_size=WINDOW_SIZE,
+    )
+    return trajectory, {
+        "time": 0,
+        "output": 1,
+        "angle": 3,
+        "input": 5,
+        "reference": 6,
+    }
+
+
+def trajectory_metrics(trajectory: np.ndarray, columns: dict) -> dict:
+    """Streaming metrics of a trajectory with one row per control step."""
+    time_column = trajectory[:, columns["time"]]
+    sample_time = time_column[1] - time_column[0] if len(time_column) > 1 else 1.0
+    metrics = StreamingMetrics(sample_time)
+    for output, reference, control_input in zip(
+        trajectory[:, columns["output"]].tolist(),
+        trajectory[:, columns["reference"]].tolist(),
+        trajectory[:, columns["input"]].tolist(),
+    ):
+        metrics.update(output, reference, control_input)
+    return metrics.summary()
+
+
+def bound_violations(trajectory: np.ndarray, columns: dict, bounds: dict) -> list:
+    """Describe every column of the trajectory leaving its bound.
+
+    Raises:
+        ValueError: If a bound names a column the plant does not record
+    """
+    violations = []
+    time_column = trajectory[:, columns["time"]]
+    for column, (lower, upper) in bounds.items():
+        if column not in columns:
+            raise ValueError(
+                f"no trajectory column {column!r} to bound, "
+                f"use one of {sorted(columns)}"
+            )
+        values = trajectory[:, columns[column]]
+        outside = np.flatnonzero((values < lower) | (values > upper))
+        if len(outside):
+            first = outside[0]
+            violations.append(
+                f"{column} {values[first]:.4g} outside [{lower}, {upper}] "
+                f"at t={time_column[first]:.2f} s"
+            )
+    return violations
+
+
+def _write_atomic(path: Path, write) -> None:
+    # Write to a temporary file first, so a crash never leaves a torn file
+    temporary = path.with_name(f".{path.name}.tmp")
+    write(temporary)
+    os.replace(temporary, path)
+
+
+def run_scenario(scenario: Scenario, results_dir) -> dict:
+    """Simulate one scenario and store its trajectory and summary row.
+
+    Runs in a worker process. The trajectory is saved as
+    results/<name>.npz, the summary row as results/<name>.json. A run
+    leaving the scenario's bounds is stored too, with status "failed".
+
+    Returns:
+        dict: Summary row with the columns of SUMMARY_COLUMNS
+    """
+    results_dir = Path(results_dir)
+    start = time.perf_counter()
+    rng = np.random.default_rng(scenario.seed)
+    initial_velocity = rng.normal(0.0, scenario.initial_velocity_std)
+    trajectory, columns = PLANTS[scenario.plant](scenario, initial_velocity)
+    violations = bound_violations(trajectory, columns, scenario.bounds)
+    row = {
+        "name": scenario.name,
+        "plant": scenario.plant,
+        "controller": scenario.controller["type"],
+        "duration": scenario.duration,
+        "seed": scenario.seed,
+        "status": "failed" if violations else "done",
+        **trajectory_metrics(trajectory, columns),
+        "wall_time": round(time.perf_counter() - start, 3),
+        "error": "; ".join(violations),
+    }
+
+    def save_trajectory(path):
+        # A file object keeps np.savez from appending .npz to the name
+        with path.open("wb") as file:
+            np.savez(file, trajectory=trajectory)
+
+    _write_atomic(results_dir / f"{scenario.name}.npz", save_trajectory)
+    _write_atomic(
+        results_dir / f"{scenario.name}.json",
+        lambda path: path.write_text(json.dumps(row, indent=2), encoding="utf-8"),
+    )
+    return row
+
+
+class JobJournal:
+    """File-backed job queue of a campaign.
+
+    Every state change of a job is appended as one JSON line, so the file
+    survives interruptions at any point; the last line of a job wins. A job
+    counts as finished when its last entry is "done" for the current
+    content hash of its scenario and its result file exists.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def entries(self) -> dict:
+        """Last journal entry of every job, by scenario name."""
+        entries = {}
+        try:
+            with self.path.open(encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn last line of an interrupted run
+                        continue
+                    entries[entry["name"]] = entry
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def record(self, scenario: Scenario, status: str, **details) -> None:
+        entry = {
+            "name": scenario.name,
+            "hash": scenario.content_hash,
+            "status": status,
+            "time": time.time(),
+            **details,
+        }
+        with self.path.open("a", encoding="utf-8") as file:
+            file.write(json.dumps(entry) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def pending(self, scenarios: list, results_dir: Path) -> list:
+        """Scenarios that are new, changed, failed or never finished."""
+        entries = self.entries()
+        return [
+            scenario
+            for scenario in scenarios
+            if not (
+                (entry := entries.get(scenario.name))
+                and entry["status"] == "done"
+                and entry["hash"] == scenario.content_hash
+                and (results_dir / f"{scenario.name}.json").exists()
+            )
+        ]
+
+
+def write_summary(scenarios: list, output_dir: Path) -> Path:
+    """Consolidate the result rows of all scenarios into summary.csv.
+
+    Scenarios without a result, e.g. failed ones, get a row with their
+    journal status and error.
+    """
+    results_dir = output_dir / RESULTS_DIRECTORY
+    entries = JobJournal(output_dir / JOURNAL_FILE).entries()
+    summary_path = output_dir / SUMMARY_FILE
+
+    def write(path):
+        with path.open("w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, SUMMARY_COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            for scenario in scenarios:
+                entry = entries.get(scenario.name, {"status": "pending"})
+                result_path = results_dir / f"{scenario.name}.json"
+                if entry["status"] == "done" and result_path.exists():
+                    row = json.loads(result_path.read_text(encoding="utf-8"))
+                else:
+                    row = {
+                        "name": scenario.name,
+                        "plant": scenario.plant,
+                        "controller": scenario.controller["type"],
+                        "duration": scenario.duration,
+                        "seed": scenario.seed,
+                        "status": entry["status"],
+                        "error": entry.get("error", ""),
+                    }
+                writer.writerow(row)
+
+    _write_atomic(summary_path, write)
+    return summary_path
+
+
+def run_campaign(scenario_dir, output_dir, max_workers=None, force=False) -> dict:
+    """Run all unfinished scenarios of a directory in a process pool.
+
+    Args:
+        scenario_dir: Directory with .toml and .json scenario files
+        output_dir: Directory for the journal, results and summary
+        max_workers: Worker processes, defaults to the number of CPUs
+        force: Run all scenarios again, ignoring finished jobs
+
+    Returns:
+        dict: Number of scenarios per outcome: "skipped", "done", "failed"
+    """
+    scenarios = load_scenarios(scenario_dir)
+    output_dir = Path(output_dir)
+    results_dir = output_dir / RESULTS_DIRECTORY
+    results_dir.mkdir(parents=True, exist_ok=True)
+    journal = JobJournal(output_dir / JOURNAL_FILE)
+    pending = scenarios if force else journal.pending(scenarios, results_dir)
+    counts = {"skipped": len(scenarios) - len(pending), "done": 0, "failed": 0}
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for scenario in pending:
+                journal.record(scenario, "queued")
+                futures[executor.submit(run_scenario, scenario, results_dir)] = scenario
+            try:
+                for future in as_completed(futures):
+                    scenario = futures[future]
+                    try:
+                        row = future.result()
+                    except Exception as error:
+                        journal.record(scenario, "failed", error=repr(error))
+                        counts["failed"] += 1
+                        print(f"  failed {scenario.name}: {error!r}")
+                    else:
+                        if row["status"] == "failed":
+                            journal.record(scenario, "failed", error=row["error"])
+                            counts["failed"] += 1
+                            print(f"  failed {scenario.name}: {row['error']}")
+                            continue
+                        journal.record(scenario, "done")
+                        counts["done"] += 1
+                        print(f"  done   {scenario.name} ({row['wall_time']:.2f} s)")
+            except KeyboardInterrupt:
+                # Finished jobs stay checkpointed; the rest runs on resume
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                write_summary(scenarios, output_dir)
+    else:
+        write_summary(scenarios, output_dir)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "scenario_dir",
+        nargs="?",
+        default="scenarios",
+        help="directory with .toml or .json scenario files",
+    )
+    parser.add_argument(
+        "--output",
+        default="scenario_results",
+        help="directory for the journal, results and summary.csv",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="worker processes (default: CPUs)"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="run all scenarios, ignore checkpoints"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        counts = run_campaign(
+            args.scenario_dir, args.output, max_workers=args.workers, force=args.force
+        )
+    except ValueError as error:
+        print(f"Error: {error}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("Interrupted; run again to resume.")
+        sys.exit(130)
+    print(
+        f"{counts['done']} done, {counts['failed']} failed, "
+        f"{counts['skipped']} already finished in "
+        f"{time.perf_counter() - start:.2f} s. "
+        f"Summary: {Path(args.output) / SUMMARY_FILE}"
+    )
+    sys.exit(1 if counts["failed"] else 0)
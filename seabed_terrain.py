@@ -0,0 +1,304 @@
+"""Seabed terrain from a heightmap, streamed into a pymunk space in chunks.
+
+The heightmap holds the seabed depth (screen y, growing downwards) at
+equidistant horizontal positions; rocks rising from the seabed are simply
+narrow peaks of it. A SeabedTerrain splits it into chunks of fixed width and
+keeps only the chunks around the vehicle in the space, as static segment
+shapes on one static body per chunk. Chunks are prepared on a background
+thread before the vehicle reaches them and removed once it has left them
+behind, so the number of shapes, the physics cost and the memory stay
+constant however long the course is. Heightmaps stored as .npy files are
+memory mapped, so even the heightmap is only paged in where it is used.
+
+Run this module to write a generated heightmap:
+
+    python seabed_terrain.py seabed.npy --length 100000
+"""
+
+import argparse
+import math
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pygame
+import pymunk
+
+SAMPLE_SPACING_DEFAULT = 10.0
+CHUNK_WIDTH_DEFAULT = 200.0
+LOAD_AHEAD_DEFAULT = 600.0
+KEEP_BEHIND_DEFAULT = 200.0
+# Chunks beyond the loaded range that are prepared in advance
+PREFETCH_CHUNKS = 2
+# Largest vertical deviation in pixels of dropped heightmap samples from the
+# segments
+SIMPLIFY_TOLERANCE = 0.5
+SEGMENT_RADIUS = 2.0
+
+SEABED_COLOR = (110, 90, 60)
+ACTIVE_CHUNK_COLOR = (230, 200, 120)
+
+
+def load_heightmap(path) -> np.ndarray:
+    """Load a one dimensional heightmap.
+
+    Args:
+        path: .npy file, memory mapped, or a text file with one depth per
+            line or comma separated
+
+    Returns:
+        np.ndarray: Seabed depth per sample
+    """
+    path = Path(path)
+    if path.suffix == ".npy":
+        heights = np.load(path, mmap_mode="r")
+    else:
+        heights = np.loadtxt(path, delimiter=",", ndmin=1)
+    if heights.ndim != 1 or len(heights) < 2:
+        raise ValueError(
+            f"heightmap must be one dimensional with at least 2 samples, "
+            f"{path} has shape {heights.shape}"
+        )
+    return heights
+
+
+def generate_heightmap(
+    length: float,
+    window_height: float,
+    sample_spacing: float = SAMPLE_SPACING_DEFAULT,
+    rocks_per_1000: float = 1.5,
+    seed: int = 0,
+) -> np.ndarray:
+    """Generate a rolling seabed with scattered rocks.
+
+    Args:
+        length: Course length in pixels
+        window_height: Height of the window; the seabed lies in its lowest
+            fifth and rocks reach up to a third of it above the seabed
+        sample_spacing: Horizontal distance of two samples in pixels
+        rocks_per_1000: Mean number of rocks per 1000 pixels
+        seed: Seed of the random generator
+
+    Returns:
+        np.ndarray: Seabed depth per sample
+    """
+    rng = np.random.default_rng(seed)
+    x = np.arange(math.ceil(length / sample_spacing) + 1) * sample_spacing
+    base = window_height * 0.9
+    heights = np.full(len(x), base)
+    for wavelength, amplitude in ((2400.0, 0.05), (700.0, 0.02), (170.0, 0.006)):
+        phase = rng.uniform(0, 2 * np.pi)
+        heights += (
+            amplitude * window_height * np.sin(2 * np.pi * x / wavelength + phase)
+        )
+    n_rocks = rng.poisson(rocks_per_1000 * length / 1000)
+    for center in rng.uniform(0, length, n_rocks):
+        height = rng.uniform(0.08, 0.33) * window_height
+        width = rng.uniform(15, 60)
+        heights -= height * np.exp(-0.5 * ((x - center) / width) ** 2)
+    return np.minimum(heights, window_height - 1)
+
+
+def _simplify(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Douglas-Peucker simplification of a polyline with increasing x.
+
+    Keeps the first and last point and splits a segment at its worst point
+    until every dropped point lies within tolerance vertically of the segment
+    spanning it, which also bounds its distance to that segment.
+    """
+    x, y = points[:, 0], points[:, 1]
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    pending = [(0, len(points) - 1)]
+    while pending:
+        first, last = pending.pop()
+        if last - first < 2:
+            continue
+        slope = (y[last] - y[first]) / (x[last] - x[first])
+        line = y[first] + slope * (x[first + 1 : last] - x[first])
+        deviation = np.abs(y[first + 1 : last] - line)
+        worst = int(np.argmax(deviation))
+        if deviation[worst] > tolerance:
+            split = first + 1 + worst
+            keep[split] = True
+            pending += [(first, split), (split, last)]
+    return points[keep]
+
+
+class SeabedTerrain:
+    """Heightmap seabed of which only the chunks near a vehicle are simulated.
+
+    Call update() with the vehicle's horizontal position after every
+    physics step; it returns at once while the vehicle stays within its
+    current chunk. The geometry of a chunk, simplified polyline and pymunk
+    segments on their own static body, is built on a worker thread; adding
+    and removing the shapes happens in update(), on the thread that steps
+    the space.
+    """
+
+    def __init__(
+        self,
+        space: pymunk.Space,
+        heights: np.ndarray,
+        sample_spacing: float = SAMPLE_SPACING_DEFAULT,
+        chunk_width: float = CHUNK_WIDTH_DEFAULT,
+        load_ahead: float = LOAD_AHEAD_DEFAULT,
+        keep_behind: float = KEEP_BEHIND_DEFAULT,
+        origin_x: float = 0.0,
+        elasticity: float = 0.3,
+        friction: float = 0.9,
+    ):
+        """Set up the terrain; no chunk is added before the first update().
+
+        Args:
+            space: Space the chunks are added to
+            heights: Seabed depth per sample, e.g. from load_heightmap
+            sample_spacing: Horizontal distance of two samples in pixels
+            chunk_width: Width of a chunk in pixels, rounded to whole samples
+            load_ahead: Distance ahead of the vehicle that is kept loaded
+            keep_behind: Distance behind the vehicle that is kept loaded
+            origin_x: Horizontal position of the first sample
+            elasticity: Elasticity of the seabed segments
+            friction: Friction of the seabed segments
+        """
+        if sample_spacing <= 0:
+            raise ValueError(f"sample_spacing must be positive, is {sample_spacing}")
+        self.space = space
+        self.heights = heights
+        self.sample_spacing = sample_spacing
+        self.samples_per_chunk = max(1, round(chunk_width / sample_spacing))
+        self.chunk_width = self.samples_per_chunk * sample_spacing
+        self.load_ahead = load_ahead
+        self.keep_behind = keep_behind
+        self.origin_x = origin_x
+        self.elasticity = elasticity
+        self.friction = friction
+        self.n_chunks = math.ceil((len(heights) - 1) / self.samples_per_chunk)
+        # Chunk index -> (points, body, shapes) of the chunks in the space
+        self.active: dict = {}
+        # Chunk index -> Future of the geometry, prepared ahead
+        self._prepared: dict = {}
+        self._range = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="seabed-terrain"
+        )
+        self.chunks_added = 0
+        self.chunks_built_late = 0
+        self._surface = None
+        self._surface_size = None
+
+    @property
+    def length(self) -> float:
+        return (len(self.heights) - 1) * self.sample_spacing
+
+    def _chunk_range(self, x: float) -> tuple:
+        first = math.floor((x - self.keep_behind - self.origin_x) / self.chunk_width)
+        last = math.floor((x + self.load_ahead - self.origin_x) / self.chunk_width)
+        return max(first, 0), min(last, self.n_chunks - 1)
+
+    def update(self, x: float) -> None:
+        """Stream chunks for a vehicle at horizontal position x."""
+        chunk_range = self._chunk_range(x)
+        if chunk_range == self._range:
+            return
+        self._range = chunk_range
+        first, last = chunk_range
+        for index in [index for index in self.active if not first <= index <= last]:
+            _, body, shapes = self.active.pop(index)
+            self.space.remove(body, *shapes)
+        for index in range(first, last + 1):
+            if index not in self.active:
+                self._add_chunk(index)
+        # Prepare the next chunks and forget prepared ones out of reach, e.g.
+        # left behind or ahead after the vehicle turned back
+        prefetch_stop = min(last + PREFETCH_CHUNKS, self.n_chunks - 1) + 1
+        for index in range(last + 1, prefetch_stop):
+            if index not in self._prepared:
+                self._prepared[index] = self._executor.submit(self._build_chunk, index)
+        for index in [
+            index for index in self._prepared if not first <= index < prefetch_stop
+        ]:
+            self._prepared.pop(index).cancel()
+
+    def _add_chunk(self, index: int) -> None:
+        future = self._prepared.pop(index, None)
+        if future is None or not future.done():
+            # Not prepared in time, e.g. at the start or after a jump
+            self.chunks_built_late += 1
+            if future is not None:
+                future.cancel()
+            chunk = self._build_chunk(index)
+        else:
+            chunk = future.result()
+        _, body, shapes = chunk
+        self.space.add(body, *shapes)
+        self.active[index] = chunk
+        self.chunks_added += 1
+
+    def _build_chunk(self, index: int) -> tuple:
+        start = index * self.samples_per_chunk
+        stop = min(start + self.samples_per_chunk, len(self.heights) - 1) + 1
+        points = np.empty((stop - start, 2))
+        points[:, 0] = self.origin_x + np.arange(start, stop) * self.sample_spacing
+        points[:, 1] = self.heights[start:stop]
+        points = _simplify(points, SIMPLIFY_TOLERANCE)
+        body = pymunk.Body(body_type=pymunk.Body.STATIC)
+        shapes = []
+        for a, b in zip(points[:-1].tolist(), points[1:].tolist()):
+            segment = pymunk.Segment(body, a, b, SEGMENT_RADIUS)
+            segment.elasticity = self.elasticity
+            segment.friction = self.friction
+            shapes.append(segment)
+        return points, body, shapes
+
+    @property
+    def n_shapes(self) -> int:
+        """Number of seabed segments currently in the space."""
+        return sum(len(shapes) for _, _, shapes in self.active.values())
+
+    def draw(self, screen: pygame.Surface) -> None:
+        """Draw the seabed over the screen width and mark the active chunks.
+
+        The seabed fill is rendered once per screen size from the heightmap;
+        the segments in the space are drawn on top each frame.
+        """
+        size = screen.get_size()
+        if self._surface_size != size:
+            width, height = size
+            self._surface = pygame.Surface(size, pygame.SRCALPHA)
+            # Only the samples on screen are read from the heightmap
+            n_visible = math.ceil((width - self.origin_x) / self.sample_spacing) + 2
+            visible = np.asarray(self.heights[: max(2, n_visible)])
+            x = np.arange(0, width + 1, 2.0)
+            positions = self.origin_x + np.arange(len(visible)) * self.sample_spacing
+            depths = np.interp(x, positions, visible)
+            outline = np.column_stack((x, depths)).tolist()
+            pygame.draw.polygon(
+                self._surface, SEABED_COLOR, [(0, height), *outline, (width, height)]
+            )
+            self._surface_size = size
+        screen.blit(self._surface, (0, 0))
+        for points, _, _ in self.active.values():
+            pygame.draw.lines(screen, ACTIVE_CHUNK_COLOR, False, points.tolist(), 2)
+
+    def close(self) -> None:
+        """Stop the worker thread, dropping chunks not yet prepared."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a seabed heightmap")
+    parser.add_argument("path", help="output file, .npy or .csv")
+    parser.add_argument("--length", type=float, default=100000.0)
+    parser.add_argument("--window-height", type=float, default=800.0)
+    parser.add_argument("--sample-spacing", type=float, default=SAMPLE_SPACING_DEFAULT)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    heights = generate_heightmap(
+        args.length, args.window_height, args.sample_spacing, seed=args.seed
+    )
+    if args.path.endswith(".npy"):
+        np.save(args.path, heights)
+    else:
+        np.savetxt(args.path, heights, fmt="%.2f", delimiter=",")
+    print(f"Wrote {len(heights)} samples ({args.length:.0f} px) to {args.path}")
@@ -0,0 +1,383 @@
+import argparse
+import sys
+import time
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+from game_controller import GameControllerBase, StateFeedbackController
+
+RING_MAGIC = 0x44534D52  # "DSMR"
+RING_SIZE_DEFAULT = 8
+# Header entries (uint64)
+_MAGIC, _N_STATES, _N_INPUTS, _RING_SIZE, _STATE_SEQUENCE, _INPUT_SEQUENCE = range(6)
+_CLOSED = 6
+_HEADER_LENGTH = 8
+
+
+@dataclass(frozen=True)
+class WaitPolicy:
+    """How a side of the ring waits for the other one.
+
+    The waiter first busy-polls the sequence counter for spin_time, which
+    gives the lowest latency, then polls every sleep_time seconds to leave
+    the core to other processes. A sleep_time of 0 only yields the time
+    slice.
+
+    Attributes:
+        deadline: Maximum time to wait in seconds, None waits forever
+        spin_time: Time spent busy-polling before sleeping, in seconds
+        sleep_time: Sleep between polls after spinning, in seconds
+    """
+
+    deadline: float | None = 0.002
+    spin_time: float = 0.0005
+    sleep_time: float = 0.0
+
+
+# Plant side: give the external process 2 ms per request
+DEFAULT_WAIT_POLICY = WaitPolicy()
+# Controller side: wait for requests indefinitely without burning a core
+SERVER_WAIT_POLICY = WaitPolicy(deadline=None, sleep_time=0.0001)
+
+
+def _wait_for(condition, policy: WaitPolicy) -> bool:
+    """Wait until condition() holds; False if the deadline passes first.
+
+    Sleeps are cut short at the deadline, and a condition first seen to
+    hold after the deadline counts as missed.
+    """
+    start = time.perf_counter()
+    spin_end = start + policy.spin_time
+    end = None if policy.deadline is None else start + policy.deadline
+    while True:
+        if condition():
+            return end is None or time.perf_counter() <= end
+        now = time.perf_counter()
+        if end is not None and now >= end:
+            return False
+        if now >= spin_end:
+            if end is None:
+                time.sleep(policy.sleep_time)
+            else:
+                time.sleep(min(policy.sleep_time, end - now))
+
+
+class SharedControlRing:
+    """Ring of state and input slots in a shared memory block.
+
+    Layout (all 8 byte aligned):
+        header:      uint64[8]  magic, n_states, n_inputs, ring_size,
+                                latest state sequence, latest input
+                                sequence, closed flag, unused
+        state_tags:  uint64[ring_size]  sequence of the state in each slot
+        states:      float64[ring_size, 1 + n_states]  time, state
+        input_tags:  uint64[ring_size]  sequence answered by each input slot
+        inputs:      float64[ring_size, n_inputs]
+
+    Request k (k >= 1) uses slot k % ring_size. A writer clears the slot's
+    tag, writes the values, sets the tag to k and finally advances the
+    header sequence. A reader copies the values and accepts them only if
+    the tag equals k before and after the copy, so a slot overwritten while
+    being read is never used.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        header = np.ndarray((_HEADER_LENGTH,), dtype=np.uint64, buffer=shm.buf)
+        if int(header[_MAGIC]) != RING_MAGIC:
+            raise ValueError(f"shared memory {shm.name!r} is not a control ring")
+        self.header = header
+        self.n_states = int(header[_N_STATES])
+        self.n_inputs = int(header[_N_INPUTS])
+        self.ring_size = int(header[_RING_SIZE])
+        offset = header.nbytes
+        self.state_tags, offset = self._view(offset, (self.ring_size,), np.uint64)
+        self.states, offset = self._view(
+            offset, (self.ring_size, 1 + self.n_states), np.float64
+        )
+        self.input_tags, offset = self._view(offset, (self.ring_size,), np.uint64)
+        self.inputs, offset = self._view(
+            offset, (self.ring_size, self.n_inputs), np.float64
+        )
+
+    def _view(self, offset: int, shape: tuple, dtype):
+        view = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+        return view, offset + view.nbytes
+
+    @staticmethod
+    def required_size(n_states: int, n_inputs: int, ring_size: int) -> int:
+        return 8 * (_HEADER_LENGTH + ring_size * (3 + n_states + n_inputs))
+
+    @classmethod
+    def create(
+        cls,
+        n_states: int,
+        n_inputs: int,
+        ring_size: int = RING_SIZE_DEFAULT,
+        name: str | None = None,
+    ) -> "SharedControlRing":
+        """Allocate a new ring; the creator unlinks it on close()."""
+        if ring_size < 2:
+            raise ValueError(f"ring_size must be at least 2, is {ring_size}")
+        shm = shared_memory.SharedMemory(
+            name=name,
+            create=True,
+            size=cls.required_size(n_states, n_inputs, ring_size),
+        )
+        header = np.ndarray((_HEADER_LENGTH,), dtype=np.uint64, buffer=shm.buf)
+        header[:] = 0
+        header[_N_STATES] = n_states
+        header[_N_INPUTS] = n_inputs
+        header[_RING_SIZE] = ring_size
+        header[_MAGIC] = RING_MAGIC
+        ring = cls(shm, owner=True)
+        ring.state_tags[:] = 0
+        ring.input_tags[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedControlRing":
+        """Open a ring created by another process."""
+        # The creator owns the block, so on Python 3.13+ the attaching side
+        # opts out of the resource tracker, which would otherwise unlink it
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def closed(self) -> bool:
+        return bool(self.header[_CLOSED])
+
+    def write_state(self, sequence: int, time_stamp: float, state) -> None:
+        """Publish the state of request sequence (plant side)."""
+        slot = sequence % self.ring_size
+        self.state_tags[slot] = 0
+        self.states[slot, 0] = time_stamp
+        self.states[slot, 1:] = state
+        self.state_tags[slot] = sequence
+        self.header[_STATE_SEQUENCE] = sequence
+
+    def latest_state_sequence(self) -> int:
+        return int(self.header[_STATE_SEQUENCE])
+
+    def read_state(self, sequence: int, out: np.ndarray) -> bool:
+        """Copy time and state of request sequence into out (controller side).
+
+        Returns:
+            bool: False if the slot was overwritten by a newer request
+        """
+        slot = sequence % self.ring_size
+        if self.state_tags[slot] != sequence:
+            return False
+        out[:] = self.states[slot]
+        return self.state_tags[slot] == sequence
+
+    def write_input(self, sequence: int, control_input) -> None:
+        """Answer request sequence with a control input (controller side)."""
+        slot = sequence % self.ring_size
+        self.input_tags[slot] = 0
+        self.inputs[slot] = control_input
+        self.input_tags[slot] = sequence
+        self.header[_INPUT_SEQUENCE] = sequence
+
+    def input_ready(self, sequence: int) -> bool:
+        return self.input_tags[sequence % self.ring_size] == sequence
+
+    def read_input(self, sequence: int, out: np.ndarray) -> bool:
+        """Copy the answer to request sequence into out (plant side)."""
+        slot = sequence % self.ring_size
+        if self.input_tags[slot] != sequence:
+            return False
+        out[:] = self.inputs[slot]
+        return self.input_tags[slot] == sequence
+
+    def close(self) -> None:
+        """Detach; the creator also marks the ring closed and unlinks it."""
+        if self.owner:
+            self.header[_CLOSED] = 1
+        # Views must be released before the buffer can be closed
+        self.header = self.state_tags = self.states = None
+        self.input_tags = self.inputs = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedMemoryController(GameControllerBase):
+    """Controller whose control law runs in another process.
+
+    Every call publishes the controller input (for the pendulum loop the
+    state error) into a SharedControlRing and waits for the answer of the
+    external process according to a WaitPolicy. If no answer arrives before
+    the deadline, the step counts as a deadline miss and the input of the
+    fallback controller is used instead, or zero without one. An answer
+    arriving after the deadline counts as a miss as well. Inputs are
+    matched to requests by sequence number, so a late answer to an earlier
+    request is never applied.
+    """
+
+    def __init__(
+        self,
+        n_states: int,
+        n_inputs: int,
+        sample_time: float,
+        fallback_controller: GameControllerBase | None = None,
+        wait_policy: WaitPolicy = DEFAULT_WAIT_POLICY,
+        name: str | None = None,
+        ring_size: int = RING_SIZE_DEFAULT,
+    ):
+        """Create the shared memory ring.
+
+        Args:
+            n_states: Length of the published vector
+            n_inputs: Length of the control input
+            sample_time: Sample time in seconds
+            fallback_controller: Controller used on deadline misses, e.g. a
+                local StateFeedbackController; None applies zero input
+            wait_policy: Deadline and spin/sleep behaviour per request
+            name: Name of the shared memory block, random if None. The
+                external process attaches with this name.
+            ring_size: Number of slots in the ring
+        """
+        super().__init__()
+        self.sample_time = sample_time
+        self.fallback_controller = fallback_controller
+        self.wait_policy = wait_policy
+        self.ring = SharedControlRing.create(n_states, n_inputs, ring_size, name)
+        self.sequence = 0
+        self._time = 0.0
+        self._control_signal = np.zeros(n_inputs)
+        self.deadline_misses = 0
+        self.consecutive_misses = 0
+        self.max_consecutive_misses = 0
+        self.worst_round_trip = 0.0
+
+    @property
+    def name(self) -> str:
+        return self.ring.name
+
+    def get_control_input(self, state_vector):
+        """Exchange one state/input pair with the external controller.
+
+        Args:
+            state_vector: Vector of length n_states
+
+        Returns:
+            np.ndarray: Control input of shape (n_inputs,). The internal
+            array is reused between calls.
+        """
+        self.sequence += 1
+        sequence = self.sequence
+        start = time.perf_counter()
+        self.ring.write_state(sequence, self._time, state_vector)
+        self._time += self.sample_time
+
+        def answered():
+            return self.ring.input_ready(sequence)
+
+        _wait_for(answered, self.wait_policy)
+        # Timed from before publishing the state; without an answer the
+        # elapsed time is a lower bound of the round trip
+        received = self.ring.read_input(sequence, self._control_signal)
+        round_trip = time.perf_counter() - start
+        self.worst_round_trip = max(self.worst_round_trip, round_trip)
+        deadline = self.wait_policy.deadline
+        if received and (deadline is None or round_trip <= deadline):
+            self.consecutive_misses = 0
+            return self._control_signal
+
+        self.deadline_misses += 1
+        self.consecutive_misses += 1
+        self.max_consecutive_misses = max(
+            self.max_consecutive_misses, self.consecutive_misses
+        )
+        if self.fallback_controller is None:
+            self._control_signal[:] = 0.0
+        else:
+            self._control_signal[:] = self.fallback_controller.get_control_input(
+                state_vector
+            )
+        return self._control_signal
+
+    def close(self) -> None:
+        """Signal the external process to stop and free the shared memory."""
+        self.ring.close()
+
+
+def serve_controller(
+    name: str,
+    controller: GameControllerBase,
+    wait_policy: WaitPolicy = SERVER_WAIT_POLICY,
+    stop_event=None,
+) -> int:
+    """Answer the requests of a SharedMemoryController (external side).
+
+    Always serves the newest request; requests overtaken while computing are
+    skipped, because their deadline has passed anyway. Returns when the ring
+    is closed or stop_event is set. Usable as multiprocessing.Process target.
+
+    Args:
+        name: Shared memory name of the SharedMemoryController
+        controller: Control law, called with the published vector
+        wait_policy: How to wait for new requests; the deadline bounds each
+            wait so the closed flag and stop_event are polled
+        stop_event: Optional multiprocessing.Event ending the loop
+
+    Returns:
+        int: Number of answered requests
+    """
+    ring = SharedControlRing.attach(name)
+    request = np.zeros(1 + ring.n_states)
+    answered = 0
+    last_sequence = ring.latest_state_sequence()
+    poll_policy = WaitPolicy(
+        deadline=0.1 if wait_policy.deadline is None else wait_policy.deadline,
+        spin_time=wait_policy.spin_time,
+        sleep_time=wait_policy.sleep_time,
+    )
+
+    def new_request():
+        return ring.latest_state_sequence() != last_sequence or ring.closed
+
+    try:
+        while not ring.closed and not (stop_event is not None and stop_event.is_set()):
+            if not _wait_for(new_request, poll_policy) or ring.closed:
+                continue
+            sequence = ring.latest_state_sequence()
+            last_sequence = sequence
+            if not ring.read_state(sequence, request):
+                continue
+            control_input = controller.get_control_input(request[1:])
+            ring.write_input(sequence, np.ravel(control_input))
+            answered += 1
+    finally:
+        ring.close()
+    return answered
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve a state feedback law to a SharedMemoryController"
+    )
+    parser.add_argument("name", help="shared memory name printed by the game")
+    parser.add_argument(
+        "--gain",
+        type=float,
+        nargs="+",
+        required=True,
+        help="row of the gain matrix K, the law is u = -K x",
+    )
+    args = parser.parse_args()
+
+    controller = StateFeedbackController(np.array([args.gain]), sample_time=0.0)
+    print(f"Serving u = -K x with K = {args.gain} on {args.name}")
+    n_answered = serve_controller(args.name, controller)
+    print(f"Ring closed after {n_answered} requests")
@@ -0,0 +1,88 @@
+import sys
+import time
+
+import numpy as np
+import pygame
+import pymunk
+
+from entity_store import EntityStore
+from space_config import SpaceConfig
+
+WINDOW_WIDTH = 1200
+WINDOW_HEIGHT = 800
+N_BALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+N_FRAMES = 600
+SAMPLE_TIME = 1 / 60.0
+
+pygame.init()
+screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+pygame.display.set_caption(f"Entity store test ({N_BALLS} balls)")
+clock = pygame.time.Clock()
+
+# Spatial hash, sleeping piles and a cheaper solver keep the physics of
+# thousands of small balls within the frame budget
+space_config = SpaceConfig(
+    iterations=5,
+    threaded=True,
+    threads=2,
+    spatial_hash_dim=10,
+    spatial_hash_count=20000,
+    sleep_time_threshold=0.5,
+)
+space = space_config.create_space()
+space.gravity = (0, 900)
+walls = [
+    ((0, WINDOW_HEIGHT), (WINDOW_WIDTH, WINDOW_HEIGHT)),
+    ((0, 0), (0, WINDOW_HEIGHT)),
+    ((WINDOW_WIDTH, 0), (WINDOW_WIDTH, WINDOW_HEIGHT)),
+]
+for start, end in walls:
+    wall = pymunk.Segment(space.static_body, start, end, 5)
+    wall.elasticity = 0.8
+    wall.friction = 0.9
+    space.add(wall)
+
+rng = np.random.default_rng(0)
+store = EntityStore(space)
+store.add_balls(
+    positions=rng.uniform(
+        (20, -WINDOW_HEIGHT), (WINDOW_WIDTH - 20, WINDOW_HEIGHT / 2), (N_BALLS, 2)
+    ),
+    masses=1.0,
+    radii=rng.choice([3, 4, 5], N_BALLS),
+    colors=rng.choice([(150, 0, 200), (200, 100, 255), (0, 100, 0)], N_BALLS),
+)
+
+durations = {"step": 0.0, "sync": 0.0, "draw": 0.0}
+running = True
+frame_counter = 0
+while running and frame_counter < N_FRAMES:
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            running = False
+
+    start = time.perf_counter()
+    space.step(SAMPLE_TIME)
+    synced = time.perf_counter()
+    store.sync_from_space()
+    drawn = time.perf_counter()
+    screen.fill((255, 255, 255))
+    store.draw(screen)
+    pygame.display.flip()
+    durations["step"] += synced - start
+    durations["sync"] += drawn - synced
+    durations["draw"] += time.perf_counter() - drawn
+
+    frame_counter += 1
+    if frame_counter % 60 == 0:
+        print(
+            f"frame {frame_counter}: "
+            + ", ".join(
+                f"{name} {total / 60 * 1000:.2f} ms"
+                for name, total in durations.items()
+            )
+            + f", {clock.get_fps():.0f} fps"
+        )
+        durations = dict.fromkeys(durations, 0.0)
+    clock.tick(60)
+pygame.quit()
@@ -0,0 +1,81 @@
+import numpy as np
+import pymunk
+
+from inverted_pendulum_game import SAMPLE_TIME as PENDULUM_SAMPLE_TIME
+from inverted_pendulum_plant import InvertedPendulumInput, InvertedPendulumPlant
+from space_config import HIGH_ACCURACY_SPACE_CONFIG, SpaceConfig
+from submarine import CONTROL_PERIOD, SubmarineInput, SubmarinePlant
+from submarine_fleet import SAMPLE_TIME as FLEET_SAMPLE_TIME
+from submarine_fleet import SubmarineFleetInput, SubmarineFleetPlant
+
+WINDOW_SIZE = (1200, 800)
+SUBSTEP_COUNTS = (1, HIGH_ACCURACY_SPACE_CONFIG.substeps)
+# Allowed relative difference of the input's velocity change between substep
+# counts; the pendulum joint couples the cart to the pendulum
+RELATIVE_TOLERANCE = 1e-2
+
+
+def _input_velocity_change(build, make_input, body_of, substeps):
+    """Velocity change of one plant step caused by the input alone.
+
+    The step without input is subtracted, which removes gravity and joint
+    forces that legitimately depend on the substep count.
+    """
+    changes = []
+    for with_input in (False, True):
+        plant = build(SpaceConfig(substeps=substeps))
+        plant.set_input(make_input(plant, with_input))
+        body = body_of(plant)
+        before = np.array(body.velocity)
+        plant.step(plant.sample_time)
+        changes.append(np.array(body.velocity) - before)
+    return changes[1] - changes[0]
+
+
+PLANTS = {
+    "submarine": (
+        lambda config: SubmarinePlant(
+            pymunk.Space(), WINDOW_SIZE, CONTROL_PERIOD, space_config=config
+        ),
+        lambda plant, on: SubmarineInput(-5e5 if on else 0.0),
+        lambda plant: plant.submarine.body,
+    ),
+    "inverted_pendulum": (
+        lambda config: InvertedPendulumPlant(
+            pymunk.Space(), WINDOW_SIZE, PENDULUM_SAMPLE_TIME, space_config=config
+        ),
+        lambda plant, on: InvertedPendulumInput(5e5 if on else 0.0),
+        lambda plant: plant.cart.body,
+    ),
+    "submarine_fleet": (
+        lambda config: SubmarineFleetPlant(
+            pymunk.Space(),
+            WINDOW_SIZE,
+            FLEET_SAMPLE_TIME,
+            n_submarines=4,
+            space_config=config,
+        ),
+        lambda plant, on: SubmarineFleetInput(np.full(4, -5e5 if on else 0.0)),
+        lambda plant: plant.submarines[0].body,
+    ),
+}
+
+failed = False
+for name, (build, make_input, body_of) in PLANTS.items():
+    changes = [
+        _input_velocity_change(build, make_input, body_of, substeps)
+        for substeps in SUBSTEP_COUNTS
+    ]
+    matches = np.allclose(changes[1], changes[0], rtol=RELATIVE_TOLERANCE)
+    failed |= not matches
+    print(
+        f"{name}: velocity change by the input "
+        + ", ".join(
+            f"{substeps} substeps {change.round(3).tolist()}"
+            for substeps, change in zip(SUBSTEP_COUNTS, changes)
+        )
+        + ("" if matches else "  MISMATCH")
+    )
+
+if failed:
+    raise SystemExit("the input force depends on the number of substeps")
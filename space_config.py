@@ -0,0 +1,209 @@
+import itertools
+import math
+import platform
+import time
+from dataclasses import dataclass, replace
+
+import numpy as np
+import pymunk
+
+# pymunk silently creates unthreaded spaces on Windows
+THREADED_SOLVER_AVAILABLE = platform.system() != "Windows"
+
+
+class ThreadedSpaceError(ValueError):
+    """A threaded solver was requested for a space created without one."""
+
+
+@dataclass(frozen=True)
+class SpaceConfig:
+    """Solver, threading and spatial index settings of a pymunk space.
+
+    The defaults reproduce a plain `pymunk.Space()`, so plants built without
+    a config behave exactly as before.
+
+    Attributes:
+        iterations: Constraint solver iterations per space step
+        substeps: Number of space steps each plant step is split into
+        threaded: Create the space with the threaded solver (not on Windows)
+        threads: Solver threads of a threaded space (pymunk supports up to 2)
+        collision_slop: Allowed shape overlap in pixels
+        spatial_hash_dim: Cell size of the spatial hash. None keeps the
+            default bounding box tree, which is faster for few bodies.
+        spatial_hash_count: Minimum number of cells of the spatial hash
+        sleep_time_threshold: Idle time after which bodies fall asleep,
+            inf disables sleeping
+        idle_speed_threshold: Speed below which a body counts as idle,
+            0 lets pymunk estimate it from gravity
+    """
+
+    iterations: int = 10
+    substeps: int = 1
+    threaded: bool = False
+    threads: int = 1
+    collision_slop: float = 0.1
+    spatial_hash_dim: float | None = None
+    spatial_hash_count: int = 1000
+    sleep_time_threshold: float = math.inf
+    idle_speed_threshold: float = 0.0
+
+    def create_space(self) -> pymunk.Space:
+        """Create a new space with these settings applied.
+
+        Returns:
+            pymunk.Space: Configured space
+        """
+        space = pymunk.Space(threaded=self.threaded)
+        self.apply(space)
+        return space
+
+    def apply(self, space: pymunk.Space) -> None:
+        """Apply these settings to an existing space.
+
+        Args:
+            space: Space to configure
+
+        Raises:
+            ThreadedSpaceError: If a threaded solver is requested for a space
+                that was created without one. Use create_space() in that case.
+            ValueError: If substeps is smaller than 1
+        """
+        if self.threaded and not space.threaded:
+            raise ThreadedSpaceError(
+                "threaded solver requested, but the space was created with "
+                "threaded=False; build it with SpaceConfig.create_space()"
+            )
+        if self.substeps < 1:
+            raise ValueError(f"substeps must be at least 1, but is {self.substeps}")
+        space.iterations = self.iterations
+        if space.threaded:
+            space.threads = self.threads
+        space.collision_slop = self.collision_slop
+        space.sleep_time_threshold = self.sleep_time_threshold
+        space.idle_speed_threshold = self.idle_speed_threshold
+        if self.spatial_hash_dim is not None:
+            space.use_spatial_hash(self.spatial_hash_dim, self.spatial_hash_count)
+
+
+HIGH_ACCURACY_SPACE_CONFIG = SpaceConfig(iterations=100, substeps=8)
+
+
+def default_calibration_candidates(base: SpaceConfig = SpaceConfig()) -> list:
+    """Build the candidate grid searched by calibrate_space_config.
+
+    Args:
+        base: Config whose remaining fields (spatial hash, sleeping, ...) are
+            kept for all candidates
+
+    Returns:
+        list: Candidate SpaceConfigs
+    """
+    candidates = []
+    for iterations, substeps, threads in itertools.product(
+        (1, 2, 4, 6, 10, 20, 40), (1, 2, 4), (1, 2)
+    ):
+        candidates.append(
+            replace(
+                base,
+                iterations=iterations,
+                substeps=substeps,
+                threaded=threads > 1,
+                threads=threads,
+            )
+        )
+    return candidates
+
+
+@dataclass
+class CalibrationResult:
+    """Outcome of calibrate_space_config for a single candidate.
+
+    Attributes:
+        config: Evaluated settings
+        max_error: Largest state deviation from the reference trajectory,
+            nan if skipped
+        seconds_per_step: Measured wall time per plant step, nan if skipped
+        skipped: Why the candidate was not run, empty if it was
+    """
+
+    config: SpaceConfig
+    max_error: float
+    seconds_per_step: float
+    skipped: str = ""
+
+
+def _record_trajectory(plant_factory, space_config, n_steps, drive):
+    plant = plant_factory(space_config)
+    trajectory = np.zeros((n_steps, plant.n_states))
+    start = time.perf_counter()
+    for step_index in range(n_steps):
+        if drive is not None:
+            drive(plant, step_index)
+        plant.step(plant.sample_time)
+        plant.get_state_into(trajectory[step_index])
+    duration = time.perf_counter() - start
+    return trajectory, duration / n_steps
+
+
+def calibrate_space_config(
+    plant_factory,
+    n_steps: int,
+    tolerance: float,
+    candidates=None,
+    reference_config: SpaceConfig = HIGH_ACCURACY_SPACE_CONFIG,
+    drive=None,
+):
+    """Find the cheapest space settings that stay close to a reference run.
+
+    Every candidate runs the same scenario as a high accuracy reference run.
+    Among the candidates whose largest state deviation stays below the
+    tolerance, the one with the smallest measured step time is returned.
+
+    Args:
+        plant_factory: Callable taking a SpaceConfig and returning a freshly
+            built plant that uses it
+        n_steps: Number of plant steps per run
+        tolerance: Allowed maximum absolute state deviation
+        candidates: SpaceConfigs to evaluate, defaults to
+            default_calibration_candidates()
+        reference_config: Settings of the reference run
+        drive: Optional callable (plant, step_index) setting the plant input
+            before each step, so all runs see identical excitation
+
+    Returns:
+        tuple: (best CalibrationResult or None if no candidate meets the
+        tolerance, list of CalibrationResults of all candidates). Threaded
+        candidates are skipped, with the reason in their result, where the
+        platform has no threaded solver or plant_factory builds the space
+        without threaded=True.
+    """
+    if candidates is None:
+        candidates = default_calibration_candidates()
+    reference, _ = _record_trajectory(plant_factory, reference_config, n_steps, drive)
+
+    results = []
+    for config in candidates:
+        if config.threaded and not THREADED_SOLVER_AVAILABLE:
+            results.append(
+                CalibrationResult(
+                    config,
+                    math.nan,
+                    math.nan,
+                    skipped="threaded solver unavailable on this platform",
+                )
+            )
+            continue
+        try:
+            trajectory, seconds_per_step = _record_trajectory(
+                plant_factory, config, n_steps, drive
+            )
+        except ThreadedSpaceError as error:
+            # plant_factory built a plain pymunk.Space for a threaded config
+            results.append(CalibrationResult(config, math.nan, math.nan, str(error)))
+            continue
+        max_error = float(np.max(np.abs(trajectory - reference)))
+        results.append(CalibrationResult(config, max_error, seconds_per_step))
+
+    feasible = [result for result in results if result.max_error <= tolerance]
+    best = min(feasible, key=lambda result: result.seconds_per_step, default=None)
+    return best, results
@@ -0,0 +1,234 @@
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import scipy.linalg
+
+from inverted_pendulum_model import (
+    PLANT_TO_MODEL,
+    InvertedPendlumModel,
+    discretize_zoh,
+)
+
+# Gains computed in this process, keyed by a hash of the model and noise
+_GAIN_CACHE: dict = {}
+
+
+def _gain_key(*matrices) -> str:
+    digest = hashlib.sha256()
+    for matrix in matrices:
+        matrix = np.ascontiguousarray(matrix, dtype=float)
+        digest.update(str(matrix.shape).encode())
+        digest.update(matrix.tobytes())
+    return digest.hexdigest()
+
+
+def steady_state_kalman_gain(
+    A_d, C, process_noise, measurement_noise, cache_path=None
+) -> np.ndarray:
+    """Steady-state gain of the discrete Kalman filter.
+
+    Solves the filter Riccati equation once; results are memoized per
+    process and, with cache_path, stored in an .npz file so later runs skip
+    the solve entirely. A stale cache file is recomputed and overwritten.
+
+    Args:
+        A_d: Discrete system matrix (n_states, n_states)
+        C: Output matrix (n_outputs, n_states)
+        process_noise: Process noise covariance (n_states, n_states)
+        measurement_noise: Measurement noise covariance (n_outputs, n_outputs)
+        cache_path: Optional .npz file for the offline cache
+
+    Returns:
+        np.ndarray: Gain K (n_states, n_outputs) of the correction
+        x = x_pred + K (y - C x_pred)
+    """
+    key = _gain_key(A_d, C, process_noise, measurement_noise)
+    if key in _GAIN_CACHE:
+        return _GAIN_CACHE[key]
+    if cache_path is not None:
+        cache_path = Path(cache_path)
+        try:
+            with np.load(cache_path) as cached:
+                if str(cached["key"]) == key:
+                    _GAIN_CACHE[key] = cached["gain"]
+                    return _GAIN_CACHE[key]
+        except (FileNotFoundError, KeyError, ValueError):
+            pass
+
+    # Prior covariance from the dual (filter) Riccati equation
+    covariance = scipy.linalg.solve_discrete_are(
+        A_d.T, C.T, process_noise, measurement_noise
+    )
+    innovation_covariance = C @ covariance @ C.T + measurement_noise
+    gain = np.linalg.solve(innovation_covariance, C @ covariance).T
+    _GAIN_CACHE[key] = gain
+    if cache_path is not None:
+        np.savez(cache_path, key=key, gain=gain)
+    return gain
+
+
+def _covariance(noise, size: int) -> np.ndarray:
+    noise = np.asarray(noise, dtype=float)
+    if noise.ndim == 1:
+        noise = np.diag(noise)
+    if noise.shape != (size, size):
+        raise ValueError(
+            f"noise covariance must have {size} entries or shape ({size}, {size}), "
+            f"but has shape {noise.shape}"
+        )
+    return noise
+
+
+class SteadyStateKalmanFilter:
+    """Kalman filter with a precomputed, constant gain.
+
+    Each update predicts with the previous input and corrects with the new
+    measurement in one fused step
+
+        x_k = F x_{k-1} + G u_{k-1} + K y_k,
+
+    with F = (I - K C) A_d and G = (I - K C) B_d, so the per-step cost is
+    three fixed-size matrix products and no covariance is propagated.
+
+    Like StateFeedbackControllerBank, a bank of n_filters plants is
+    estimated at once by passing measurements and inputs as blocks with one
+    column per plant; the estimates are then (n_states, n_filters).
+    """
+
+    def __init__(
+        self,
+        A,
+        B,
+        C,
+        sample_time: float,
+        process_noise,
+        measurement_noise,
+        initial_state=None,
+        n_filters: int | None = None,
+        cache_path=None,
+    ):
+        """Discretize the model and compute the steady-state gain.
+
+        Args:
+            A: Continuous system matrix (n_states, n_states)
+            B: Continuous input matrix (n_states, n_inputs) or (n_states,)
+            C: Output matrix (n_outputs, n_states)
+            sample_time: Period between updates
+            process_noise: Covariance of the discrete process noise, its
+                diagonal or the full matrix
+            measurement_noise: Covariance of the measurement noise, its
+                diagonal or the full matrix
+            initial_state: Initial estimate, (n_states,) or one column per
+                filter; zero by default
+            n_filters: Number of plants estimated at once, None for one
+                plant with 1-dimensional signals
+            cache_path: Optional .npz file caching the gain between runs
+        """
+        A = np.asarray(A, dtype=float)
+        B = np.asarray(B, dtype=float).reshape(A.shape[0], -1)
+        C = np.asarray(C, dtype=float)
+        self.sample_time = sample_time
+        self.n_states, self.n_inputs = B.shape
+        self.n_outputs = C.shape[0]
+        self.n_filters = n_filters
+        self.A_d, self.B_d = discretize_zoh(A, B, sample_time)
+        self.C = C
+        self.gain = steady_state_kalman_gain(
+            self.A_d,
+            C,
+            _covariance(process_noise, self.n_states),
+            _covariance(measurement_noise, self.n_outputs),
+            cache_path=cache_path,
+        )
+        correction = np.eye(self.n_states) - self.gain @ C
+        self._state_transition = correction @ self.A_d
+        self._input_transition = correction @ self.B_d
+
+        shape = (self.n_states,) if n_filters is None else (self.n_states, n_filters)
+        self.estimate = np.zeros(shape)
+        self._term = np.zeros(shape)
+        self._next = np.zeros(shape)
+        if initial_state is not None:
+            self.reset(initial_state)
+
+    @classmethod
+    def for_inverted_pendulum(
+        cls,
+        model_params,
+        sample_time: float,
+        process_noise=(1e-2, 1.0, 1e-6, 1e-3),
+        measurement_noise=(0.25, 1e-6),
+        **kwargs,
+    ) -> "SteadyStateKalmanFilter":
+        """Estimator on the upright linearization of InvertedPendlumModel.
+
+        The filter works in plant coordinates: it takes the cart position
+        and joint angle as reported by the plant and estimates the plant
+        state, so it can replace get_state() in the control loop.
+
+        Args:
+            model_params: Plant parameters, e.g. DefaultModelParams
+            sample_time: Control period
+            process_noise: Diagonal of the process noise covariance
+            measurement_noise: Variances of cart position and angle
+            kwargs: Further arguments of SteadyStateKalmanFilter
+        """
+        A, B, C, _ = InvertedPendlumModel.state_space_model_matrices(
+            mass_cart=model_params.CART_MASS,
+            mass_pendulum=model_params.BALL_MASS,
+            length_pendulum=model_params.PENDULUM_LENGTH,
+            gravity=model_params.GRAVITY[1],
+        )
+        # PLANT_TO_MODEL is its own inverse. C selects cart position and
+        # angle, which the plant reports directly.
+        transform = PLANT_TO_MODEL
+        return cls(
+            transform @ A @ transform,
+            transform @ B,
+            C,
+            sample_time,
+            process_noise=process_noise,
+            measurement_noise=measurement_noise,
+            **kwargs,
+        )
+
+    def update(self, measurement, previous_input) -> np.ndarray:
+        """Advance the estimate by one sample.
+
+        Args:
+            measurement: Outputs y_k, (n_outputs,) or (n_outputs, n_filters)
+            previous_input: Inputs u_{k-1} applied since the last update,
+                (n_inputs,) or (n_inputs, n_filters)
+
+        Returns:
+            np.ndarray: The estimate x_k; the array is updated in place by
+            later calls
+        """
+        np.matmul(self._state_transition, self.estimate, out=self._next)
+        np.matmul(self._input_transition, previous_input, out=self._term)
+        self._next += self._term
+        np.matmul(self.gain, measurement, out=self._term)
+        self._next += self._term
+        self.estimate[...] = self._next
+        return self.estimate
+
+    def reset(self, state=None) -> None:
+        """Set the estimate, e.g. to a known initial state; zero by default.
+
+        For a bank, a single (n_states,) state initializes all filters.
+        """
+        if state is None:
+            self.estimate.fill(0.0)
+            return
+        state = np.asarray(state, dtype=float)
+        if self.n_filters is not None and state.ndim == 1:
+            state = state[:, np.newaxis]
+        self.estimate[...] = state
+
+    def snapshot(self) -> np.ndarray:
+        """The current estimate as flat array, see PlantBase.snapshot."""
+        return self.estimate.ravel().copy()
+
+    def restore(self, snapshot) -> None:
+        self.estimate[...] = np.reshape(snapshot, self.estimate.shape)
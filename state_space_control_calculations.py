@@ -57,3 +57,4 @@ def plot_lti_poles(system: control.lti, title="System Pole Locations", figtext=N
     plt.axvline(x=0, color="k", linestyle="--")
     plt.grid(True)
     plt.draw()
+    return fig
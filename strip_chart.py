@@ -0,0 +1,248 @@
+"""Scrolling strip charts drawn with pygame inside the game window.
+
+A StripChart owns a surface showing one channel over the last width
+columns, each column covering a fixed time span. New samples only widen the
+min/max range of the newest column; refreshing scrolls the surface by the
+number of completed columns and draws just those, so the cost does not
+depend on the chart width or the run length. StripChartPanel stacks the
+charts of the inverted pendulum channels and offers the DataPlotter
+interface, so the game logs to it in place of the Matplotlib window.
+"""
+
+import math
+
+import pygame
+
+BACKGROUND_COLOR = (250, 250, 250)
+BORDER_COLOR = (120, 120, 120)
+GRID_COLOR = (215, 215, 215)
+TRACE_COLOR = (20, 70, 200)
+CLIPPED_COLOR = (220, 40, 40)
+TEXT_COLOR = (40, 40, 40)
+
+CHART_WIDTH = 300
+CHART_HEIGHT = 56
+CHART_SPACING = 6
+FONT_SIZE = 16
+
+# (channel, title, value range) of the inverted pendulum telemetry, in the
+# order and with the keywords of DataPlotter.log_data
+PENDULUM_CHANNELS = (
+    ("control_error", "Control Error (px)", (-300.0, 300.0)),
+    ("cart_position_x", "Cart Position X (px)", (0.0, 1200.0)),
+    ("cart_velocity_x", "Cart Velocity X (px/s)", (-800.0, 800.0)),
+    ("joint_angle", "Joint Angle (rad)", (-0.5, 0.5)),
+    ("joint_angular_velocity", "Joint Angular Vel (rad/s)", (-4.0, 4.0)),
+)
+
+
+class StripChart:
+    """One scrolling channel, oldest column left, newest right.
+
+    The value range is fixed, as rescaling would need a full redraw; values
+    outside are drawn at the border in CLIPPED_COLOR. A column joins the
+    range of its samples with the last value of the previous column, so the
+    trace stays connected.
+    """
+
+    def __init__(
+        self,
+        title: str,
+        value_range: tuple,
+        column_period: float,
+        size: tuple = (CHART_WIDTH, CHART_HEIGHT),
+    ):
+        """Create an empty chart.
+
+        Args:
+            title: Label drawn in the top left corner
+            value_range: (lower, upper) values at the bottom and top edge
+            column_period: Time covered by one pixel column in seconds
+            size: (width, height) of the chart in pixels
+        """
+        lower, upper = value_range
+        if not upper > lower:
+            raise ValueError(f"value_range must be increasing, is {value_range}")
+        if column_period <= 0:
+            raise ValueError(f"column_period must be positive, is {column_period}")
+        self.title = title
+        self.value_range = (float(lower), float(upper))
+        self.column_period = column_period
+        self.surface = pygame.Surface(size)
+        self.width, self.height = size
+        self._font = None
+        self._label = None
+        self.clear()
+
+    def clear(self) -> None:
+        """Drop all samples and blank the chart."""
+        self._column = 0
+        self._column_min = math.inf
+        self._column_max = -math.inf
+        self._last_row = None
+        # (min, max, last value) of columns completed since the last refresh
+        self._completed = []
+        self.latest = math.nan
+        self._label = None
+        self.surface.fill(BACKGROUND_COLOR)
+        self._draw_grid(0, self.width)
+
+    def add(self, time: float, value: float) -> None:
+        """Add a sample; times must not decrease."""
+        column = int(time // self.column_period)
+        if column > self._column:
+            self._complete_columns(column)
+        self._column_min = min(self._column_min, value)
+        self._column_max = max(self._column_max, value)
+        self.latest = value
+
+    def _complete_columns(self, column: int) -> None:
+        if self._column_max >= self._column_min:
+            self._completed.append((self._column_min, self._column_max, self.latest))
+        # Columns without samples stay empty
+        gap = min(column - self._column - 1, self.width)
+        self._completed.extend([None] * gap)
+        del self._completed[: -self.width]
+        self._column = column
+        self._column_min = math.inf
+        self._column_max = -math.inf
+
+    def refresh(self) -> int:
+        """Scroll in the columns completed since the last refresh.
+
+        Returns:
+            int: Number of columns drawn
+        """
+        completed = self._completed
+        count = len(completed)
+        if count == 0:
+            return 0
+        self._completed = []
+        x = self.width - count
+        self.surface.scroll(-count, 0)
+        self.surface.fill(BACKGROUND_COLOR, (x, 0, count, self.height))
+        self._draw_grid(x, count)
+        for extent in completed:
+            if extent is None:
+                self._last_row = None
+            else:
+                self._draw_column(x, *extent)
+            x += 1
+        self._label = None
+        return count
+
+    def _row(self, value: float) -> float:
+        lower, upper = self.value_range
+        return (upper - value) / (upper - lower) * (self.height - 1)
+
+    def _draw_column(self, x: int, minimum: float, maximum: float, last: float):
+        top = self._row(maximum)
+        bottom = self._row(minimum)
+        if self._last_row is not None:
+            top = min(top, self._last_row)
+            bottom = max(bottom, self._last_row)
+        self._last_row = self._row(last)
+        clipped = top < 0 or bottom > self.height - 1
+        top = round(min(max(top, 0), self.height - 1))
+        bottom = round(min(max(bottom, 0), self.height - 1))
+        color = CLIPPED_COLOR if clipped else TRACE_COLOR
+        pygame.draw.line(self.surface, color, (x, top), (x, bottom))
+
+    def _draw_grid(self, x: int, count: int) -> None:
+        # Zero line if it lies in the range, else the center line
+        lower, upper = self.value_range
+        row = round(self._row(0.0 if lower <= 0 <= upper else 0.5 * (lower + upper)))
+        self.surface.fill(GRID_COLOR, (x, row, count, 1))
+
+    def draw(self, screen: pygame.Surface, position: tuple) -> None:
+        """Blit the chart with its border, title and latest value onto screen."""
+        x, y = position
+        screen.blit(self.surface, position)
+        pygame.draw.rect(screen, BORDER_COLOR, (x, y, self.width, self.height), 1)
+        if self._label is None:
+            if self._font is None:
+                self._font = pygame.font.Font(None, FONT_SIZE)
+            text = f"{self.title}: {self.latest:.3g}"
+            self._label = self._font.render(text, True, TEXT_COLOR)
+        screen.blit(self._label, (x + 4, y + 3))
+
+
+class StripChartPanel:
+    """Stack of strip charts logging like DataPlotter.
+
+    Drop-in for DataPlotter in the pendulum game: log_data() adds a sample
+    to every chart, update_plot() scrolls in the completed columns and
+    draw() blits the charts onto the game screen every frame.
+    """
+
+    def __init__(
+        self,
+        channels: tuple = PENDULUM_CHANNELS,
+        column_period: float = 0.02,
+        position: tuple = (0, 0),
+        size: tuple = (CHART_WIDTH, CHART_HEIGHT),
+        spacing: int = CHART_SPACING,
+    ):
+        """Create one chart per channel.
+
+        Args:
+            channels: (name, title, value range) of every channel, the names
+                are the keywords of log_data
+            column_period: Time covered by one pixel column in seconds
+            position: Screen position of the top left corner of the panel
+            size: (width, height) of each chart in pixels
+            spacing: Vertical gap between two charts in pixels
+        """
+        self.charts = {
+            name: StripChart(title, value_range, column_period, size)
+            for name, title, value_range in channels
+        }
+        self.position = position
+        self.spacing = spacing
+        self.simulation_time = 0.0
+        self.live_update_active = True
+
+    def log_data(self, time_delta: float, **values) -> None:
+        """Log one sample of every channel.
+
+        Args:
+            time_delta: Time since the previous sample
+            **values: Value of every channel by name
+        """
+        self.simulation_time += time_delta
+        for name, value in values.items():
+            self.charts[name].add(self.simulation_time, value)
+
+    def update_plot(self) -> None:
+        """Scroll in the columns completed since the last update."""
+        if not self.live_update_active:
+            return
+        for chart in self.charts.values():
+            chart.refresh()
+
+    def draw(self, screen: pygame.Surface, position: tuple | None = None) -> None:
+        """Blit all charts onto screen, by default at the panel position."""
+        x, y = self.position if position is None else position
+        for chart in self.charts.values():
+            chart.draw(screen, (x, y))
+            y += chart.height + self.spacing
+
+    def toggle_live_update(self) -> None:
+        """Toggle scrolling on/off, the charts freeze while off."""
+        self.live_update_active = not self.live_update_active
+
+    def save(self, filename: str) -> None:
+        """Save the charts as one image, e.g. 'charts.png'."""
+        charts = list(self.charts.values())
+        width = max(chart.width for chart in charts)
+        height = sum(chart.height + self.spacing for chart in charts) - self.spacing
+        image = pygame.Surface((width, height))
+        image.fill(BACKGROUND_COLOR)
+        self.draw(image, (0, 0))
+        pygame.image.save(image, filename)
+
+    def clear(self) -> None:
+        """Clear all logged data."""
+        for chart in self.charts.values():
+            chart.clear()
+        self.simulation_time = 0.0
@@ -1,3 +1,5 @@
+import argparse
+import math
 import pygame
 import pymunk
 import sys
@@ -9,9 +11,36 @@ from pymunk import Vec2d
 from physical_objects import Submarine
 from game_controller import ControllerPID
 from plant_base import PlantBase
-
-
-SAMPLE_TIME = 1 / 60.0
+from block_diagram import (
+    BlockDiagram,
+    CompiledDiagram,
+    GainBlock,
+    PIDBlock,
+    PlantBlock,
+    ReferenceBlock,
+    SumBlock,
+)
+from space_config import SpaceConfig
+from scheduler import MultiRateScheduler
+from async_runtime import TRACE_KEY, add_runtime_arguments, prepare_runtime, run_game
+from telemetry_stream import TelemetryFrameFormat
+from control_metrics import StreamingMetrics
+from trajectory_preview import PREVIEW_FRAME_STEP, predict_submarine
+from trace_events import TRACER
+from seabed_terrain import SeabedTerrain, load_heightmap
+from reference_signals import (
+    ConstantReference,
+    ReferenceSpec,
+    SineReference,
+    StepReference,
+)
+
+
+FRAME_RATE = 60
+SAMPLE_TIME = 1 / FRAME_RATE
+PHYSICS_RATE = 1000.0
+CONTROL_RATE = 100.0
+CONTROL_PERIOD = 1 / CONTROL_RATE
 WINDOW_WIDTH = 1200
 WINDOW_HEIGHT = 800
 
@@ -80,13 +109,35 @@ class SubmarineState(NamedTuple):
 
 class ReferenceSignal:
     """Reference Signal class that allows to define a reference Signal for the submarine setup,
-    where the can be defined for each horizontal position."""
+    where the can be defined for each horizontal position.
 
-    def __init__(self, mapping):
-        self.mapping = mapping
+    The signal is described by a spec from reference_signals, e.g. a
+    StepReference. With course_width, the spec is precomputed into a lookup
+    table over the course [0, course_width).
+    """
 
-    def evaluate(self, x_position: int) -> float:
-        return self.mapping(x_position)
+    TRAJECTORY_COLOR = (150, 0, 0)
+
+    def __init__(self, spec: ReferenceSpec, course_width: int | None = None):
+        if not isinstance(spec, ReferenceSpec):
+            raise TypeError(
+                f"spec must be a ReferenceSpec, e.g. a StepReference, got {spec!r}"
+            )
+        self.spec = spec
+        self._evaluator = spec
+        if course_width is not None:
+            self._evaluator = spec.lookup_table(0, course_width - 1)
+        # Trajectory rendered once per window size, cropped to its extent
+        self._trajectory_window_size = None
+        self._trajectory_surface = None
+        self._trajectory_position = (0, 0)
+
+    def evaluate(self, x_position: float) -> float:
+        return self._evaluator.evaluate(x_position)
+
+    def evaluate_many(self, x_positions) -> np.ndarray:
+        """Evaluate the reference for an array of horizontal positions."""
+        return self._evaluator.evaluate_many(x_positions)
 
     def draw(
         self, screen: pygame.Surface, window_width: int, window_height: int
@@ -95,56 +146,60 @@ class ReferenceSignal:
 
         For each x coordinate from 0 to window_width, marks the point
         (x, reference_value(x)) with a colored pixel to visualize the reference trajectory.
+        The points are evaluated in one call and drawn onto a cached
+        transparent surface, so later frames only blit it.
 
         Args:
             screen: pygame Surface to draw on
             window_width: Width of the window in pixels
             window_height: Height of the window in pixels
         """
-        for x in range(window_width):
-            y = self.evaluate(x)
-            y_clamped = max(0, min(int(y), window_height - 1))
-            pygame.draw.circle(
-                screen,
-                (150, 0, 0),
-                (x, y_clamped),
-                radius=1,
+        size = (window_width, window_height)
+        if self._trajectory_window_size != size:
+            surface = pygame.Surface(size, pygame.SRCALPHA)
+            x_positions = np.arange(window_width)
+            y_positions = np.clip(
+                self.evaluate_many(x_positions).astype(int), 0, window_height - 1
             )
+            for x, y in zip(x_positions.tolist(), y_positions.tolist()):
+                pygame.draw.circle(surface, self.TRAJECTORY_COLOR, (x, y), radius=1)
+            bounds = surface.get_bounding_rect()
+            self._trajectory_surface = surface.subsurface(bounds).copy()
+            self._trajectory_position = bounds.topleft
+            self._trajectory_window_size = size
+        screen.blit(self._trajectory_surface, self._trajectory_position)
 
 
-def _create_constant_reference_mapping(window_height: int):
-    """Create a constant reference mapping function to configure reference signal.
+def _create_constant_reference_mapping(window_height: int) -> ConstantReference:
+    """Create a constant reference spec to configure reference signal.
 
     Args:
         window_height: Height of the window in pixels
     """
-    return lambda x_position: window_height / 2
+    return ConstantReference(window_height / 2)
 
 
 def _create_step_reference_mapping(
     window_height: int, step_height: float, step_position: float
-):
-    """Create a step reference mapping function configure reference signal.
+) -> StepReference:
+    """Create a step reference spec to configure reference signal.
 
     Args:
         window_height: Height of the window in pixels
         step_height: Height of the step in pixels
         step_position: Horizontal position where the step occurs
     """
-
-    return (
-        lambda x_position: window_height / 2
-        if x_position < step_position
-        else window_height / 2 + step_height
+    return StepReference(
+        initial=window_height / 2,
+        final=window_height / 2 + step_height,
+        step_position=step_position,
     )
 
 
 def _create_sine_reference_mapping(
     amplitude: float, frequency: float, phase: float, offset: float
-):
-    return (
-        lambda x_position: amplitude * np.sin(frequency * x_position + phase) + offset
-    )
+) -> SineReference:
+    return SineReference(amplitude, frequency, phase, offset)
 
 
 class SubmarinePlant(PlantBase):
@@ -154,39 +209,64 @@ class SubmarinePlant(PlantBase):
         window_size: tuple,
         sample_time: float,
         model_params=DefaultSubmarineModelParams,
+        space_config: SpaceConfig = None,
+        terrain: SeabedTerrain | None = None,
     ):
-        super().__init__(sample_time=sample_time)
+        super().__init__(sample_time=sample_time, space_config=space_config)
         self.space: pymunk.Space = space
+        self.space_config.apply(self.space)
         self.model_params = model_params
         self.window_height = window_size[1]
         self.window_width = window_size[0]
+        self.n_inputs = 1
+        self.n_outputs = 1
+        self._init_state_cache(n_states=2)
 
         self._create_objects(window_size)
         self.input = SubmarineInput(0)
         self.output = SubmarineOutput(0)
         self.state = SubmarineState(0, 0)
         self.window_with = window_size[0]
+        # Optional seabed in the same space, streamed around the submarine
+        self.terrain = terrain
+        if terrain is not None:
+            terrain.update(self.submarine.body.position.x)
 
     def step(self, time_delta):
+        self._step_space(time_delta)
+        if self.terrain is not None:
+            self.terrain.update(self.submarine.body.position.x)
+
+    def _apply_input(self) -> None:
         # Apply thrust with saturation
         thrust = self.input.vertical_thrust
         input_bound = self.model_params.KEY_FORCE_SCALE
         lower_bound = -input_bound
         upper_bound = input_bound
-        saturated_thrust = np.clip(lower_bound, upper_bound, thrust)
+        saturated_thrust = min(max(thrust, lower_bound), upper_bound)
         self.submarine.body.apply_force_at_local_point((0, saturated_thrust), (0, 0))
-        self.space.step(time_delta)
+
+    def _after_restore(self) -> None:
+        if self.terrain is not None:
+            self.terrain.update(self.submarine.body.position.x)
 
     def get_output(self):
-        return self.output
+        return SubmarineOutput(depth=float(self._cached_state()[0]))
 
     def get_state(self):
-        return self.state
+        return SubmarineState(*self._cached_state().tolist())
+
+    def _compute_state_into(self, out):
+        body = self.submarine.body
+        out[0] = body.position.y
+        out[1] = body.velocity.y
 
     def set_input(self, input_data) -> None:
         self.input = input_data
 
     def draw(self, screen):
+        if self.terrain is not None:
+            self.terrain.draw(screen)
         self.submarine.draw(screen)
 
     def input_from_key(self):
@@ -210,12 +290,140 @@ class SubmarinePlant(PlantBase):
         )
 
 
+def build_submarine_control_loop(
+    plant: SubmarinePlant,
+    controller: ControllerPID,
+    reference_signal_object: ReferenceSignal,
+    key_input_source=None,
+) -> CompiledDiagram:
+    """Build the closed depth control loop of the submarine.
+
+    The reference is evaluated at the submarine's horizontal position, the
+    control error is depth minus reference, and the PID output plus the
+    optional keyboard input drives the vertical thrust.
+
+    Args:
+        plant: Submarine plant
+        controller: PID controller for the depth error
+        reference_signal_object: Reference depth over horizontal position
+        key_input_source: Optional callable returning the keyboard thrust,
+            e.g. plant.input_from_key. Headless runs leave it out.
+
+    Returns:
+        CompiledDiagram: Loop with blocks "plant", "reference", "depth",
+        "error", "controller", "key_input" and "thrust"
+    """
+    submarine_body = plant.submarine.body
+    diagram = BlockDiagram()
+    plant_block = diagram.add(PlantBlock("plant", plant, SubmarineInput))
+    reference = diagram.add(
+        ReferenceBlock(
+            "reference",
+            lambda: reference_signal_object.evaluate(submarine_body.position.x),
+        )
+    )
+    depth = diagram.add(GainBlock("depth", [[1.0, 0.0]]))
+    error = diagram.add(SumBlock("error", "+-"))
+    pid = diagram.add(PIDBlock("controller", controller))
+    key_input = diagram.add(
+        ReferenceBlock("key_input", key_input_source or (lambda: 0.0))
+    )
+    thrust = diagram.add(SumBlock("thrust", "++"))
+
+    diagram.connect(plant_block, depth)
+    diagram.connect(depth, error, port=0)
+    diagram.connect(reference, error, port=1)
+    diagram.connect(error, pid)
+    diagram.connect(pid, thrust, port=0)
+    diagram.connect(key_input, thrust, port=1)
+    diagram.connect(thrust, plant_block)
+    return diagram.compile()
+
+
+def simulate_submarine(
+    controller: ControllerPID,
+    reference_signal_object: ReferenceSignal,
+    duration: float,
+    physics_rate: float = PHYSICS_RATE,
+    control_rate: float = CONTROL_RATE,
+    space_config: SpaceConfig = None,
+    model_params=DefaultSubmarineModelParams,
+    initial_vertical_velocity: float = 0.0,
+) -> np.ndarray:
+    """Run the closed depth control loop headless, with the game's rates.
+
+    Args:
+        controller: PID controller for the depth error
+        reference_signal_object: Reference depth over horizontal position
+        duration: Simulated time in seconds
+        physics_rate: Physics steps per second
+        control_rate: Control updates per second
+        space_config: Optional solver settings of the plant
+        model_params: Plant parameters
+        initial_vertical_velocity: Vertical velocity of the submarine at the
+            start, to disturb the initial depth
+
+    Returns:
+        np.ndarray: One row per control step with the columns of
+        Game.TELEMETRY_FIELDS (time, depth, vertical velocity, thrust,
+        reference)
+    """
+    plant = SubmarinePlant(
+        pymunk.Space(),
+        window_size=(WINDOW_WIDTH, WINDOW_HEIGHT),
+        sample_time=1 / physics_rate,
+        model_params=model_params,
+        space_config=space_config,
+    )
+    velocity = plant.submarine.body.velocity
+    plant.submarine.body.velocity = (velocity.x, initial_vertical_velocity)
+    plant.invalidate_state_cache()
+    control_loop = build_submarine_control_loop(
+        plant, controller, reference_signal_object
+    )
+    plant_output = control_loop.block("plant").output
+    thrust_output = control_loop.block("thrust").output
+    reference_output = control_loop.block("reference").output
+    n_steps = round(duration * control_rate)
+    trajectory = np.zeros((n_steps, len(Game.TELEMETRY_FIELDS)))
+
+    step_index = 0
+
+    def control_task(time):
+        nonlocal step_index
+        control_loop.evaluate()
+        control_loop.advance_delays()
+        row = trajectory[step_index]
+        row[0] = time
+        row[1:3] = plant_output
+        row[3] = thrust_output[0]
+        row[4] = reference_output[0]
+        step_index += 1
+
+    scheduler = MultiRateScheduler()
+    scheduler.add_task("control", 1 / control_rate, control_task, priority=0)
+    scheduler.add_task(
+        "physics", 1 / physics_rate, lambda time: plant.step(1 / physics_rate), 1
+    )
+    scheduler.run_for(n_steps / control_rate)
+    return trajectory
+
+
+def _format_metric(value: float, number_format: str, unit: str = "") -> str:
+    """Format a metric, showing undefined (NaN) values as a dash."""
+    if math.isnan(value):
+        return "-"
+    return f"{value:{number_format}}{unit}"
+
+
 class Game:
     def __init__(
         self,
         plant: SubmarinePlant,
         controller: ControllerPID,
         reference_signal_object: ReferenceSignal,
+        physics_rate: float = PHYSICS_RATE,
+        control_rate: float = CONTROL_RATE,
     ):
         # Initialize Pygame and Pymunk
         pygame.init()
@@ -243,12 +451,54 @@ class Game:
         )
         self.control_active = False
 
+        self.control_loop = build_submarine_control_loop(
+            plant,
+            controller,
+            reference_signal_object,
+            key_input_source=plant.input_from_key,
+        )
+        self._reference_output = self.control_loop.block("reference").output
+        self._controller_block = self.control_loop.block("controller")
+        self._key_input_block = self.control_loop.block("key_input")
+        self._depth_output = self.control_loop.block("depth").output
+        self._thrust_output = self.control_loop.block("thrust").output
+        self.metrics = StreamingMetrics(sample_time=1 / control_rate)
+
+        # Optional TelemetryPublisher, sent one frame per control step
+        self.telemetry_publisher = None
+        # Optional FrameRecorder fed with every rendered frame
+        self.frame_recorder = None
+        # Optional TrajectoryPreview of the closed loop, drawn every frame
+        self.trajectory_preview = None
+        self._preview_key = None
+        # Frames per second of main_loop, 0 runs at maximum speed
+        self.frame_rate_limit = FRAME_RATE
+        # Quit after this many frames, None runs until closed
+        self.max_frames = None
+        self.frame_count = 0
+
+        # Physics and control run at their own rates; each frame advances
+        # the simulated time by SAMPLE_TIME. Control samples the state before
+        # physics steps at the same instant, and its input is held in between.
+        self.physics_period = 1 / physics_rate
+        self.scheduler = MultiRateScheduler()
+        self.scheduler.add_task(
+            "control", 1 / control_rate, self._control_task, priority=0
+        )
+        self.scheduler.add_task(
+            "physics", self.physics_period, self._physics_task, priority=1
+        )
+
     def update_ui(self):
         # Clear screen
         self.screen.fill((150, 200, 255))
-        self.plant.draw(self.screen)
+        with TRACER.span("plant.draw"):
+            self.plant.draw(self.screen)
         # Draw reference signal
-        self.reference_signal_object.draw(self.screen, self.WIDTH, self.HEIGHT)
+        with TRACER.span("reference.draw"):
+            self.reference_signal_object.draw(self.screen, self.WIDTH, self.HEIGHT)
+        if self.trajectory_preview is not None:
+            self._update_trajectory_preview()
         # Draw control force arrow
         if self.control_active:
             self._draw_control_force_arrow(
@@ -261,9 +511,43 @@ class Game:
         # Display current game state
         self._draw_state_indicator()
         self._draw_pid_gains()
+        self._draw_metrics()
         # Update display
-        pygame.display.flip()
-        self.clock.tick(60)
+        with TRACER.span("display.flip"):
+            pygame.display.flip()
+
+    def _update_trajectory_preview(self):
+        """Request a new prediction if needed and draw the latest one.
+
+        While running, the prediction is refreshed every PREVIEW_FRAME_STEP
+        frames; a change of gains or control mode refreshes it at once.
+        """
+        if self.control_active:
+            gains = (self.controller.kp, self.controller.ki, self.controller.kd)
+        else:
+            gains = (0.0, 0.0, 0.0)
+        key = (gains, self.game_state)
+        running = self.game_state == GameState.RUNNING
+        if key != self._preview_key or (
+            running and self.frame_count % PREVIEW_FRAME_STEP == 0
+        ):
+            self._preview_key = key
+            body = self.plant.submarine.body
+            depth, vertical_velocity = self.plant.get_state()
+            self.trajectory_preview.request(
+                predict_submarine,
+                depth,
+                vertical_velocity,
+                body.position.x,
+                body.velocity.x,
+                gains,
+                self.controller.snapshot(),
+                self.reference_signal_object.evaluate_many,
+                body.mass,
+                self.plant.model_params.KEY_FORCE_SCALE,
+                self.controller.sample_time,
+            )
+        self.trajectory_preview.draw(self.screen)
 
     def _draw_state_indicator(self):
         """Draw the current game state on screen."""
@@ -288,16 +572,40 @@ class Game:
         )
         self.screen.blit(gains_surface, text_rect)
 
-    def _display_least_squares_score(self, score):
+    def _draw_metrics(self):
+        """Draw the running error measures, or all results once finished."""
+        metrics = self.metrics
+        if self.game_state != GameState.FINISHED:
+            font = pygame.font.Font(None, 24)
+            metrics_text = (
+                f"ISE: {metrics.ise:.0f},  IAE: {metrics.iae:.0f},  "
+                f"ITAE: {metrics.itae:.0f}"
+            )
+            metrics_surface = font.render(metrics_text, True, (255, 255, 255))
+            text_rect = metrics_surface.get_rect(
+                right=self.WIDTH - 10, bottom=self.HEIGHT - 10
+            )
+            self.screen.blit(metrics_surface, text_rect)
+            return
+
         font = pygame.font.Font(None, 48)
-        score_text = f"Least Squares Score: {score:.2f}"
-        text_surface = font.render(score_text, True, (255, 255, 255))
-        # Blit score text to center of screen
-        text_rect = text_surface.get_rect(center=(self.WIDTH // 2, self.HEIGHT // 2))
-        self.screen.blit(text_surface, text_rect)
-        pygame.display.flip()
-        # Pause for a few seconds to display the score
-        pygame.time.delay(3000)
+        lines = (
+            f"ISE: {metrics.ise:.0f}",
+            f"IAE: {metrics.iae:.0f}",
+            f"ITAE: {metrics.itae:.0f}",
+            f"Control energy: {metrics.energy:.3g}",
+            f"Overshoot: {_format_metric(100 * metrics.overshoot, '.1f', ' %')}",
+            f"Rise time: {_format_metric(metrics.rise_time, '.2f', ' s')}",
+            f"Settling time: {_format_metric(metrics.settling_time, '.2f', ' s')}",
+        )
+        line_height = font.get_linesize()
+        top = self.HEIGHT // 2 - line_height * len(lines) // 2
+        for index, line in enumerate(lines):
+            text_surface = font.render(line, True, (255, 255, 255))
+            text_rect = text_surface.get_rect(
+                centerx=self.WIDTH // 2, top=top + index * line_height
+            )
+            self.screen.blit(text_surface, text_rect)
 
     def _draw_control_force_arrow(
         self, sub_pos, force, arrow_scale, arrow_max_length=150
@@ -367,76 +675,153 @@ class Game:
                     ],
                 )
 
-    def main_loop(self):
+    def _control_task(self, time):
+        self._controller_block.enabled = self.control_active
+        self._key_input_block.enabled = not self.control_active
+        with TRACER.span("controller"):
+            self.control_loop.evaluate()
+        self.control_loop.advance_delays()
+        self.reference_signal = self._reference_output[0]
+        self.metrics.update(
+            self._depth_output[0], self.reference_signal, self._thrust_output[0]
+        )
+        if self.telemetry_publisher is not None:
+            self.telemetry_publisher.publish(self.telemetry_record())
+
+    def _physics_task(self, time):
+        with TRACER.span("plant.step"):
+            self.plant.step(self.physics_period)
+
+    TELEMETRY_FORMAT = TelemetryFrameFormat(n_states=2, n_inputs=1, n_references=1)
+    TELEMETRY_FIELDS = ("time", "depth", "vertical_velocity", "thrust", "reference")
+
+    def telemetry_record(self) -> tuple:
+        """Return the current time, state, input and reference as a flat tuple.
+
+        The entries are named by TELEMETRY_FIELDS.
+        """
+        depth, vertical_velocity = self.plant.get_state()
+        return (
+            self.scheduler.time,
+            depth,
+            vertical_velocity,
+            float(self.plant.input.vertical_thrust),
+            float(self.reference_signal),
+        )
+
+    def autosave_data(self) -> dict:
+        """Return a JSON serializable summary of the running game."""
+        return {
+            "simulation_time": self.scheduler.time,
+            "game_state": self.game_state.value,
+            "control_active": self.control_active,
+            "state": self.plant.get_state()._asdict(),
+            "gains": {
+                "kp": self.controller.kp,
+                "ki": self.controller.ki,
+                "kd": self.controller.kd,
+            },
+            "metrics": self.metrics.summary(),
+        }
+
+    def handle_events(self) -> bool:
+        """Process window events and key toggles.
+
+        Returns:
+            bool: False once the game should quit
+        """
         running = True
-        least_squares_score = 0.0
-
-        while running:
-            if self.plant.submarine.body.position.x > self.WIDTH:
-                self.game_state = GameState.FINISHED
-                self._display_least_squares_score(least_squares_score)
-            self.frames_since_toggle_counter += 1
-            events = pygame.event.get()
-            for event in events:
-                if event.type == pygame.QUIT:
-                    running = False
-                    continue
-
-            # Handle keyboard input
-            keys = pygame.key.get_pressed()
-            # Toggle between RUNNING and PAUSED with P key (lock for 10 frames)
-            if keys[pygame.K_p] and self.frames_since_toggle_counter > 10:
-                if self.game_state == GameState.RUNNING:
-                    self.game_state = GameState.PAUSED
-                elif self.game_state == GameState.PAUSED:
-                    self.game_state = GameState.RUNNING
-                self.frames_since_toggle_counter = 0
-
-            # Toggle control with C key (lock for 10 frames)
-            if keys[pygame.K_c] and self.frames_since_toggle_counter > 10:
-                self.control_active = not self.control_active
-                self.frames_since_toggle_counter = 0
-
-            if keys[pygame.K_ESCAPE]:
+        self.frame_count += 1
+        if self.max_frames is not None and self.frame_count > self.max_frames:
+            return False
+        self.frames_since_toggle_counter += 1
+        events = pygame.event.get()
+        for event in events:
+            if event.type == pygame.QUIT:
                 running = False
+                continue
+            if event.type == pygame.KEYDOWN and event.key == TRACE_KEY:
+                TRACER.toggle()
 
-            # Only perform simulation steps when in RUNNING state
+        # Handle keyboard input
+        keys = pygame.key.get_pressed()
+        # Toggle between RUNNING and PAUSED with P key (lock for 10 frames)
+        if keys[pygame.K_p] and self.frames_since_toggle_counter > 10:
             if self.game_state == GameState.RUNNING:
-                input_from_key = (
-                    self.plant.input_from_key() if not self.control_active else 0.0
-                )
-                self.reference_signal = self.reference_signal_object.evaluate(
-                    self.plant.submarine.body.position.x
-                )
-                control_error = (
-                    self.plant.submarine.body.position.y - self.reference_signal
-                )
-                input_from_controller = (
-                    self.controller.get_control_input(control_error)
-                    if self.control_active
-                    else 0.0
-                )
-                self.plant.set_input(
-                    SubmarineInput(
-                        vertical_thrust=input_from_key + input_from_controller
-                    )
-                )
-                least_squares_score += control_error**2
-                self.plant.step(SAMPLE_TIME)
-            self.update_ui()
+                self.game_state = GameState.PAUSED
+            elif self.game_state == GameState.PAUSED:
+                self.game_state = GameState.RUNNING
+            self.frames_since_toggle_counter = 0
+
+        # Toggle control with C key (lock for 10 frames)
+        if keys[pygame.K_c] and self.frames_since_toggle_counter > 10:
+            self.control_active = not self.control_active
+            self.frames_since_toggle_counter = 0
+
+        if keys[pygame.K_ESCAPE]:
+            running = False
+        return running
+
+    def start(self):
+        """Run the simulation with control enabled, e.g. for unattended runs."""
+        self.game_state = GameState.RUNNING
+        self.control_active = True
+
+    def simulate_frame(self):
+        """Advance the simulation by one frame (SAMPLE_TIME) if running."""
+        if self.plant.submarine.body.position.x > self.WIDTH:
+            self.game_state = GameState.FINISHED
+
+        # Only perform simulation steps when in RUNNING state
+        if self.game_state == GameState.RUNNING:
+            self.scheduler.run_for(SAMPLE_TIME)
+
+    def render_frame(self):
+        self.update_ui()
+        if self.frame_recorder is not None:
+            self.frame_recorder.capture(self.screen)
+
+    def main_loop(self):
+        while True:
+            with TRACER.span("handle_events"):
+                running = self.handle_events()
+            if not running:
+                break
+            with TRACER.span("simulate_frame"):
+                self.simulate_frame()
+            with TRACER.span("render_frame"):
+                self.render_frame()
+            with TRACER.span("clock.tick"):
+                self.clock.tick(self.frame_rate_limit)
 
         pygame.quit()
         sys.exit()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Submarine depth control game")
+    add_runtime_arguments(parser)
+    parser.add_argument(
+        "--seabed",
+        metavar="HEIGHTMAP",
+        help="add a seabed from a heightmap file (.npy or .csv, one depth per "
+        "10 px), streamed in chunks; write one with seabed_terrain.py",
+    )
+    args = parser.parse_args()
+    prepare_runtime(args)
+
+    space = pymunk.Space()
+    terrain = None
+    if args.seabed:
+        terrain = SeabedTerrain(space, load_heightmap(args.seabed))
     plant = SubmarinePlant(
-        pymunk.Space(),
+        space,
         window_size=(WINDOW_WIDTH, WINDOW_HEIGHT),
-        sample_time=SAMPLE_TIME,
+        sample_time=1 / PHYSICS_RATE,
+        terrain=terrain,
     )
     controller = ControllerPID(
-        kp=KP_DEFAULT, ki=KI_DEFAULT, kd=KD_DEFAULT, sample_time=SAMPLE_TIME
+        kp=KP_DEFAULT, ki=KI_DEFAULT, kd=KD_DEFAULT, sample_time=CONTROL_PERIOD
     )
     game = Game(
         plant,
@@ -449,4 +834,8 @@ if __name__ == "__main__":
             )
         ),
     )
-    game.main_loop()
+    try:
+        run_game(game, args)
+    finally:
+        if terrain is not None:
+            terrain.close()
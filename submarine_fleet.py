@@ -0,0 +1,399 @@
+import math
+import sys
+import time
+from typing import NamedTuple
+
+import numpy as np
+import pygame
+import pymunk
+from pymunk import Vec2d
+
+from control_metrics import StreamingMetrics
+from game_controller import ControllerPIDBank
+from physical_objects import Submarine
+from plant_base import PlantBase
+from space_config import SpaceConfig
+from submarine import (
+    DefaultSubmarineModelParams,
+    ReferenceSignal,
+    _create_step_reference_mapping,
+)
+
+SAMPLE_TIME = 1 / 60.0
+WINDOW_WIDTH = 1200
+WINDOW_HEIGHT = 800
+
+N_SUBMARINES_DEFAULT = 200
+FLEET_SUBMARINE_WIDTH = 12
+FLEET_SUBMARINE_HEIGHT = 5
+NEIGHBOR_RADIUS = 25.0
+SEPARATION_GAIN = 4e4
+
+KP_DEFAULT = -2800
+KI_DEFAULT = -100
+KD_DEFAULT = -3800
+
+
+class SubmarineFleetState(NamedTuple):
+    """State of all submarines of a fleet, one array entry per submarine."""
+
+    depth: np.ndarray
+    vertical_velocity: np.ndarray
+
+
+class SubmarineFleetInput(NamedTuple):
+    vertical_thrust: np.ndarray
+
+
+class SpatialHashIndex:
+    """Uniform grid spatial hash for radius neighbor queries on 2d points.
+
+    The index is rebuilt from a position array (one sort, O(N log N)) and
+    answers neighbor queries by visiting only the 3x3 block of cells around
+    each point instead of comparing all pairs.
+    """
+
+    _CELL_OFFSET = 2**31
+
+    def __init__(self, cell_size: float):
+        """Initialize an empty index.
+
+        Args:
+            cell_size: Edge length of a grid cell. Queries with a radius up to
+                cell_size only need to inspect neighboring cells.
+        """
+        self.cell_size = float(cell_size)
+        self._positions = np.zeros((0, 2))
+        self._cells = np.zeros((0, 2), dtype=np.int64)
+        self._order = np.zeros(0, dtype=np.int64)
+        self._sorted_keys = np.zeros(0, dtype=np.int64)
+
+    def _keys(self, cells: np.ndarray) -> np.ndarray:
+        return ((cells[..., 0] + self._CELL_OFFSET) << 32) | (
+            cells[..., 1] + self._CELL_OFFSET
+        )
+
+    def rebuild(self, positions: np.ndarray) -> None:
+        """Re-index all points.
+
+        Args:
+            positions: Array of shape (N, 2) with point coordinates
+        """
+        self._positions = positions
+        self._cells = np.floor(positions / self.cell_size).astype(np.int64)
+        keys = self._keys(self._cells)
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._order]
+
+    def _candidates(self, cells: np.ndarray):
+        """Gather indexed points in the 3x3 cell block around each query cell.
+
+        Returns:
+            tuple: (query index, candidate point index) arrays of equal length
+        """
+        query_ids = []
+        candidate_ids = []
+        n_queries = cells.shape[0]
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                keys = self._keys(cells + np.array([dx, dy]))
+                start = np.searchsorted(self._sorted_keys, keys, side="left")
+                end = np.searchsorted(self._sorted_keys, keys, side="right")
+                counts = end - start
+                total = int(counts.sum())
+                if total == 0:
+                    continue
+                # Expand the [start, end) ranges into one flat index array
+                run_offsets = np.repeat(np.cumsum(counts) - counts, counts)
+                sorted_ids = np.repeat(start, counts) + (np.arange(total) - run_offsets)
+                query_ids.append(np.repeat(np.arange(n_queries), counts))
+                candidate_ids.append(self._order[sorted_ids])
+        if not query_ids:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        return np.concatenate(query_ids), np.concatenate(candidate_ids)
+
+    def query_radius(self, point, radius: float) -> np.ndarray:
+        """Return the indices of all points within radius of a point.
+
+        Args:
+            point: (x, y) query coordinates
+            radius: Search radius, must not exceed the cell size
+
+        Returns:
+            np.ndarray: Indices into the array passed to rebuild
+        """
+        if radius > self.cell_size:
+            raise ValueError(
+                f"radius ({radius}) must not exceed the cell size ({self.cell_size})"
+            )
+        point = np.asarray(point, dtype=float).reshape(1, 2)
+        cells = np.floor(point / self.cell_size).astype(np.int64)
+        _, candidates = self._candidates(cells)
+        distances = np.linalg.norm(self._positions[candidates] - point, axis=1)
+        return candidates[distances <= radius]
+
+    def neighbor_pairs(self, radius: float):
+        """Return all unordered pairs of indexed points closer than radius.
+
+        Args:
+            radius: Search radius, must not exceed the cell size
+
+        Returns:
+            tuple: Arrays (i, j) with i < j for every neighboring pair
+        """
+        if radius > self.cell_size:
+            raise ValueError(
+                f"radius ({radius}) must not exceed the cell size ({self.cell_size})"
+            )
+        i, j = self._candidates(self._cells)
+        keep = i < j
+        i, j = i[keep], j[keep]
+        distances = np.linalg.norm(self._positions[i] - self._positions[j], axis=1)
+        close = distances <= radius
+        return i[close], j[close]
+
+
+class SubmarineFleetPlant(PlantBase):
+    """N submarines sharing one pymunk space.
+
+    All per-submarine quantities (state, input, positions) are arrays with one
+    entry per submarine, so controllers and coordination rules can be
+    evaluated for the whole fleet at once.
+    """
+
+    def __init__(
+        self,
+        space: pymunk.Space,
+        window_size: tuple,
+        sample_time: float,
+        n_submarines: int = N_SUBMARINES_DEFAULT,
+        model_params=DefaultSubmarineModelParams,
+        submarine_size: tuple = (FLEET_SUBMARINE_WIDTH, FLEET_SUBMARINE_HEIGHT),
+        neighbor_radius: float = NEIGHBOR_RADIUS,
+        space_config: SpaceConfig = None,
+    ):
+        super().__init__(sample_time=sample_time, space_config=space_config)
+        self.space: pymunk.Space = space
+        self.space_config.apply(self.space)
+        self.model_params = model_params
+        self.window_width = window_size[0]
+        self.window_height = window_size[1]
+        self.n_submarines = n_submarines
+        self.n_inputs = n_submarines
+        self.n_outputs = n_submarines
+        self._init_state_cache(n_states=2 * n_submarines)
+        self.submarine_size = submarine_size
+        self.neighbor_radius = neighbor_radius
+        self.spatial_index = SpatialHashIndex(cell_size=neighbor_radius)
+
+        self.positions = np.zeros((n_submarines, 2))
+        self.velocities = np.zeros((n_submarines, 2))
+        self._create_objects(window_size)
+        self._sync_from_space()
+        self.input = SubmarineFleetInput(np.zeros(n_submarines))
+
+    def step(self, time_delta):
+        self._step_space(time_delta)
+        self._sync_from_space()
+
+    def _apply_input(self) -> None:
+        input_bound = self.model_params.KEY_FORCE_SCALE
+        saturated_thrust = np.clip(
+            self.input.vertical_thrust, -input_bound, input_bound
+        )
+        for submarine, thrust in zip(self.submarines, saturated_thrust.tolist()):
+            submarine.body.apply_force_at_local_point((0, thrust), (0, 0))
+
+    def _after_restore(self) -> None:
+        self._sync_from_space()
+
+    def get_state(self) -> SubmarineFleetState:
+        state = self._cached_state()
+        return SubmarineFleetState(
+            depth=state[: self.n_submarines].copy(),
+            vertical_velocity=state[self.n_submarines :].copy(),
+        )
+
+    def _compute_state_into(self, out):
+        out[: self.n_submarines] = self.positions[:, 1]
+        out[self.n_submarines :] = self.velocities[:, 1]
+
+    def get_output(self) -> np.ndarray:
+        return self.positions[:, 1].copy()
+
+    def set_input(self, input_data) -> None:
+        self.input = input_data
+
+    def neighbor_pairs(self, radius: float = None):
+        """Return all pairs of submarines closer than radius.
+
+        Args:
+            radius: Search radius, defaults to the plant's neighbor_radius
+
+        Returns:
+            tuple: Index arrays (i, j) with i < j
+        """
+        if radius is None:
+            radius = self.neighbor_radius
+        return self.spatial_index.neighbor_pairs(radius)
+
+    def neighbors_of(self, index: int, radius: float = None) -> np.ndarray:
+        """Return the indices of all submarines near submarine `index`."""
+        if radius is None:
+            radius = self.neighbor_radius
+        neighbors = self.spatial_index.query_radius(self.positions[index], radius)
+        return neighbors[neighbors != index]
+
+    def separation_thrust(
+        self, gain: float = SEPARATION_GAIN, pairs: tuple | None = None
+    ) -> np.ndarray:
+        """Vertical thrust pushing neighboring submarines apart.
+
+        Each neighboring pair repels with a force growing linearly as the
+        distance shrinks below neighbor_radius.
+
+        Args:
+            gain: Thrust per pixel of radius violation
+            pairs: (i, j) from neighbor_pairs() if the caller already has
+                them, None to query them
+
+        Returns:
+            np.ndarray: Vertical thrust per submarine, shape (n_submarines,)
+        """
+        i, j = self.neighbor_pairs() if pairs is None else pairs
+        thrust = np.zeros(self.n_submarines)
+        if i.size == 0:
+            return thrust
+        delta = self.positions[i] - self.positions[j]
+        distance = np.linalg.norm(delta, axis=1)
+        direction_y = np.where(
+            distance > 0, delta[:, 1] / np.maximum(distance, 1e-9), 1.0
+        )
+        magnitude = gain * (self.neighbor_radius - distance) * direction_y
+        np.add.at(thrust, i, magnitude)
+        np.add.at(thrust, j, -magnitude)
+        return thrust
+
+    def draw(self, screen):
+        width, height = self.submarine_size
+        color = (200, 200, 0)
+        for x, y in self.positions.tolist():
+            pygame.draw.rect(
+                screen, color, (x - width / 2, y - height / 2, width, height)
+            )
+
+    def input_from_key(self):
+        keys = pygame.key.get_pressed()
+        vertical_thrust = 0.0
+        if keys[pygame.K_UP]:
+            vertical_thrust -= self.model_params.KEY_FORCE_SCALE
+        if keys[pygame.K_DOWN]:
+            vertical_thrust += self.model_params.KEY_FORCE_SCALE
+        return np.full(self.n_submarines, vertical_thrust)
+
+    def _create_objects(self, window_size):
+        window_height = window_size[1]
+        width, height = self.submarine_size
+        spacing_x = 2.0 * width
+        spacing_y = 2.5 * height
+        n_rows = max(1, int(0.5 * window_height // spacing_y))
+        n_columns = math.ceil(self.n_submarines / n_rows)
+        block_center_y = window_height * 0.75
+
+        # Place the fleet in a block trailing the single submarine start point
+        self.submarines = []
+        for index in range(self.n_submarines):
+            column, row = divmod(index, n_rows)
+            position = (
+                10 - (n_columns - 1 - column) * spacing_x,
+                block_center_y + (row - (n_rows - 1) / 2) * spacing_y,
+            )
+            submarine = Submarine(self.space, position, width=width, height=height)
+            submarine.body.velocity = Vec2d(
+                self.model_params.SUBMARINE_HORIZONTAL_SPEED, 0
+            )
+            self.submarines.append(submarine)
+        self.all_physical_objects = list(self.submarines)
+        self.formation_offsets = np.array(
+            [
+                (index % n_rows - (n_rows - 1) / 2) * spacing_y
+                for index in range(self.n_submarines)
+            ]
+        )
+
+    def _sync_from_space(self):
+        for index, submarine in enumerate(self.submarines):
+            body = submarine.body
+            self.positions[index] = body.position
+            self.velocities[index] = body.velocity
+        self.spatial_index.rebuild(self.positions)
+
+
+if __name__ == "__main__":
+    n_submarines = int(sys.argv[1]) if len(sys.argv) > 1 else N_SUBMARINES_DEFAULT
+    pygame.init()
+    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+    pygame.display.set_caption(f"Submarine Fleet ({n_submarines})")
+    clock = pygame.time.Clock()
+
+    plant = SubmarineFleetPlant(
+        pymunk.Space(),
+        window_size=(WINDOW_WIDTH, WINDOW_HEIGHT),
+        sample_time=SAMPLE_TIME,
+        n_submarines=n_submarines,
+    )
+    controller = ControllerPIDBank(
+        kp=KP_DEFAULT,
+        ki=KI_DEFAULT,
+        kd=KD_DEFAULT,
+        sample_time=SAMPLE_TIME,
+        n_loops=n_submarines,
+    )
+    reference_signal = ReferenceSignal(
+        _create_step_reference_mapping(
+            window_height=WINDOW_HEIGHT,
+            step_height=-WINDOW_HEIGHT // 4,
+            step_position=WINDOW_WIDTH // 2,
+        ),
+        course_width=WINDOW_WIDTH,
+    )
+
+    metrics = StreamingMetrics(sample_time=SAMPLE_TIME, n_loops=n_submarines)
+    font = pygame.font.Font(None, 24)
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+
+        step_start = time.perf_counter()
+        references = reference_signal.evaluate_many(plant.positions[:, 0])
+        control_error = plant.positions[:, 1] - (references + plant.formation_offsets)
+        pairs = plant.neighbor_pairs()
+        thrust = controller.get_control_input(control_error) + plant.separation_thrust(
+            pairs=pairs
+        )
+        plant.set_input(SubmarineFleetInput(vertical_thrust=thrust))
+        plant.step(SAMPLE_TIME)
+        step_duration = time.perf_counter() - step_start
+        metrics.update(
+            plant.positions[:, 1], references + plant.formation_offsets, thrust
+        )
+
+        screen.fill((150, 200, 255))
+        reference_signal.draw(screen, WINDOW_WIDTH, WINDOW_HEIGHT)
+        plant.draw(screen)
+        text = f"Step: {1e3 * step_duration:.2f} ms, neighbor pairs: {pairs[0].size}"
+        screen.blit(font.render(text, True, (255, 255, 255)), (10, 10))
+        iae = metrics.iae
+        text = f"IAE mean: {iae.mean():.0f}, worst: {iae.max():.0f}"
+        screen.blit(font.render(text, True, (255, 255, 255)), (10, 34))
+        pygame.display.flip()
+        clock.tick(60)
+
+        if plant.positions[:, 0].min() > WINDOW_WIDTH:
+            running = False
+
+    pygame.quit()
@@ -1,13 +1,16 @@
 from submarine import (
+    CONTROL_PERIOD,
+    PHYSICS_RATE,
     SubmarinePlant,
     Game,
     ReferenceSignal,
     _create_constant_reference_mapping as create_mapping,
 )
 from game_controller import ControllerPID
+from async_runtime import add_runtime_arguments, prepare_runtime, run_game
+import argparse
 import pymunk
 
-SAMPLE_TIME = 1 / 60.0
 WINDOW_WIDTH = 1200
 WINDOW_HEIGHT = 800
 
@@ -16,17 +19,22 @@ KI_DEFAULT = -0
 KD_DEFAULT = -0
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Unstable submarine depth control")
+    add_runtime_arguments(parser)
+    args = parser.parse_args()
+    prepare_runtime(args)
+
     plant = SubmarinePlant(
         pymunk.Space(),
         window_size=(WINDOW_WIDTH, WINDOW_HEIGHT),
-        sample_time=SAMPLE_TIME,
+        sample_time=1 / PHYSICS_RATE,
     )
     controller = ControllerPID(
-        kp=KP_DEFAULT, ki=KI_DEFAULT, kd=KD_DEFAULT, sample_time=SAMPLE_TIME
+        kp=KP_DEFAULT, ki=KI_DEFAULT, kd=KD_DEFAULT, sample_time=CONTROL_PERIOD
     )
     game = Game(
         plant,
         controller,
         ReferenceSignal(create_mapping(window_height=WINDOW_HEIGHT)),
     )
-    game.main_loop()
+    run_game(game, args)
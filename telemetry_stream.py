@@ -0,0 +1,292 @@
+import argparse
+import os
+import socket
+import struct
+from dataclasses import dataclass
+from typing import NamedTuple
+
+FRAME_MAGIC = b"DSTF"
+FRAME_VERSION = 1
+# magic, version, n_states, n_inputs, n_references, sequence, time
+FRAME_HEADER = struct.Struct("<4sBBBBQd")
+DEFAULT_ADDRESS = "udp://127.0.0.1:9870"
+
+# Errors of a non-blocking send meaning "nobody is listening" or "receiver
+# is too slow"; the frame is dropped in both cases
+DROPPED_FRAME_ERRORS = (
+    BlockingIOError,
+    ConnectionRefusedError,
+    ConnectionResetError,
+    FileNotFoundError,
+)
+
+
+class TelemetryFrame(NamedTuple):
+    sequence: int
+    time: float
+    state: tuple
+    input: tuple
+    reference: tuple
+
+
+@dataclass(frozen=True)
+class TelemetryFrameFormat:
+    """Fixed binary layout of the frames of one stream.
+
+    A frame is the little endian header (magic, version, the three signal
+    lengths, sequence number, time) followed by the state, input and
+    reference values as float64. All frames of a stream have the same size,
+    so receivers can check frames by their length alone.
+
+    Attributes:
+        n_states: Number of state values per frame
+        n_inputs: Number of input values per frame
+        n_references: Number of reference values per frame
+    """
+
+    n_states: int
+    n_inputs: int
+    n_references: int
+
+    def __post_init__(self):
+        for name in ("n_states", "n_inputs", "n_references"):
+            if not 0 <= getattr(self, name) <= 255:
+                raise ValueError(
+                    f"{name} must be in [0, 255], is {getattr(self, name)}"
+                )
+
+    @property
+    def n_values(self) -> int:
+        return self.n_states + self.n_inputs + self.n_references
+
+    @property
+    def struct(self) -> struct.Struct:
+        return struct.Struct(FRAME_HEADER.format + f"{self.n_values}d")
+
+    @classmethod
+    def unpack(cls, data: bytes) -> TelemetryFrame:
+        """Decode a frame, reading the layout from its header.
+
+        Raises:
+            ValueError: If data is not a valid frame
+
+        Returns:
+            TelemetryFrame: Decoded frame
+        """
+        if len(data) < FRAME_HEADER.size:
+            raise ValueError(f"frame of {len(data)} bytes is shorter than the header")
+        magic, version, n_states, n_inputs, n_references, sequence, time = (
+            FRAME_HEADER.unpack_from(data)
+        )
+        if magic != FRAME_MAGIC or version != FRAME_VERSION:
+            raise ValueError(f"unknown frame magic {magic!r} or version {version}")
+        frame_format = cls(n_states, n_inputs, n_references)
+        if len(data) != frame_format.struct.size:
+            raise ValueError(
+                f"frame has {len(data)} bytes, its header announces "
+                f"{frame_format.struct.size}"
+            )
+        values = struct.unpack_from(
+            f"<{frame_format.n_values}d", data, FRAME_HEADER.size
+        )
+        input_start = n_states
+        reference_start = n_states + n_inputs
+        return TelemetryFrame(
+            sequence,
+            time,
+            values[:input_start],
+            values[input_start:reference_start],
+            values[reference_start:],
+        )
+
+
+def parse_address(address: str):
+    """Split a stream address into socket family and socket address.
+
+    Args:
+        address: "udp://host:port" or "unix:///path/to/socket"
+
+    Returns:
+        tuple: (socket family, address as expected by sendto/bind)
+    """
+    if address.startswith("udp://"):
+        host, separator, port = address[len("udp://") :].rpartition(":")
+        if not separator or not port.isdigit():
+            raise ValueError(f"UDP address must be udp://host:port, is {address!r}")
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    if address.startswith("unix://"):
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError("Unix domain sockets are not available on this platform")
+        return socket.AF_UNIX, address[len("unix://") :]
+    raise ValueError(f"address must start with udp:// or unix://, is {address!r}")
+
+
+class TelemetryPublisher:
+    """Publishes telemetry frames on a local datagram socket without blocking.
+
+    Every publish packs the values into a preallocated buffer and hands it
+    to the kernel with a single non-blocking send. If no subscriber is bound
+    or its receive buffer is full, the frame is dropped and counted, so the
+    simulation never waits for a dashboard.
+    """
+
+    def __init__(
+        self,
+        frame_format: TelemetryFrameFormat,
+        address: str = DEFAULT_ADDRESS,
+        sock: socket.socket | None = None,
+    ):
+        """Initialize the publisher.
+
+        Args:
+            frame_format: Layout of the published frames
+            address: Subscriber address, see parse_address. Ignored if sock
+                is given.
+            sock: Already connected datagram socket, e.g. one end of
+                socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        """
+        self.frame_format = frame_format
+        self._struct = frame_format.struct
+        self._buffer = bytearray(self._struct.size)
+        self._header = (
+            FRAME_MAGIC,
+            FRAME_VERSION,
+            frame_format.n_states,
+            frame_format.n_inputs,
+            frame_format.n_references,
+        )
+        if sock is None:
+            family, self.destination = parse_address(address)
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+        else:
+            self.destination = None
+        sock.setblocking(False)
+        self.socket = sock
+        self.sequence = 0
+        self.sent_frames = 0
+        self.dropped_frames = 0
+
+    def publish(self, values) -> bool:
+        """Send one frame.
+
+        Args:
+            values: Flat sequence (time, *state, *input, *reference), e.g. a
+                game's telemetry_record()
+
+        Returns:
+            bool: False if the frame was dropped
+        """
+        self._struct.pack_into(self._buffer, 0, *self._header, self.sequence, *values)
+        self.sequence += 1
+        try:
+            if self.destination is None:
+                self.socket.send(self._buffer)
+            else:
+                self.socket.sendto(self._buffer, self.destination)
+        except DROPPED_FRAME_ERRORS:
+            self.dropped_frames += 1
+            return False
+        self.sent_frames += 1
+        return True
+
+    def diagram_callback(self, time_delta: float, state, input, reference):
+        """Build an on_step callback for CompiledDiagram.run.
+
+        Args:
+            time_delta: Step size of the run
+            state: Block whose output is the state, e.g. the plant block
+            input: Block whose output is the plant input
+            reference: Block whose output is the reference
+
+        Returns:
+            callable: Callback publishing one frame per step
+        """
+        state_output = state.output
+        input_output = input.output
+        reference_output = reference.output
+
+        def on_step(step_index):
+            self.publish(
+                (
+                    step_index * time_delta,
+                    *state_output.tolist(),
+                    *input_output.tolist(),
+                    *reference_output.tolist(),
+                )
+            )
+
+        return on_step
+
+    def close(self) -> None:
+        self.socket.close()
+
+
+class TelemetrySubscriber:
+    """Receives telemetry frames, e.g. for a dashboard or logger."""
+
+    def __init__(
+        self, address: str = DEFAULT_ADDRESS, sock: socket.socket | None = None
+    ):
+        """Bind to the address the publisher sends to.
+
+        Args:
+            address: Address to bind, see parse_address. Ignored if sock is
+                given.
+            sock: Already connected datagram socket
+        """
+        if sock is None:
+            family, bind_address = parse_address(address)
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            sock.bind(bind_address)
+        self.socket = sock
+        self.invalid_frames = 0
+
+    def receive(self, timeout: float | None = None):
+        """Wait for the next valid frame.
+
+        Args:
+            timeout: Seconds to wait, None waits forever and 0 polls
+
+        Returns:
+            TelemetryFrame or None: The frame, None on timeout
+        """
+        self.socket.settimeout(timeout)
+        while True:
+            try:
+                data = self.socket.recv(65536)
+            except (TimeoutError, BlockingIOError):
+                return None
+            try:
+                return TelemetryFrameFormat.unpack(data)
+            except ValueError:
+                self.invalid_frames += 1
+
+    def close(self) -> None:
+        """Close the socket and remove a Unix socket file."""
+        family, address = self.socket.family, self.socket.getsockname()
+        self.socket.close()
+        if family == getattr(socket, "AF_UNIX", None) and address:
+            try:
+                os.unlink(address)
+            except FileNotFoundError:
+                pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print a telemetry stream")
+    parser.add_argument("address", nargs="?", default=DEFAULT_ADDRESS)
+    args = parser.parse_args()
+
+    subscriber = TelemetrySubscriber(args.address)
+    print(f"Listening on {args.address}")
+    try:
+        while True:
+            frame = subscriber.receive()
+            print(
+                f"#{frame.sequence} t={frame.time:.3f} state={frame.state} "
+                f"input={frame.input} reference={frame.reference}"
+            )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        subscriber.close()
@@ -0,0 +1,216 @@
+"""Opt-in frame-level tracing with Chrome trace-event export.
+
+Aggregate profilers average away the single slow frame that makes a game
+hitch. The TraceRecorder instead keeps every begin and end event with its
+perf_counter_ns timestamp in a preallocated ring buffer, so the last
+capacity events are always available at a fixed memory cost. The
+buffer is saved in the Chrome trace-event JSON format and can be inspected
+as a timeline in chrome://tracing or https://ui.perfetto.dev.
+
+The games record into the module-wide TRACER, which is disabled by default;
+a disabled recorder returns from begin() and end() after one attribute test.
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+CAPACITY_DEFAULT = 1 << 18
+DEFAULT_TRACE_PATH = "trace.json"
+
+# An event is stored as its timestamp and the code 2 * name id + phase
+_BEGIN = 0
+_END = 1
+_PHASES = ("B", "E")
+
+
+class _Span:
+    """Reusable context manager recording the begin and end of one name."""
+
+    __slots__ = ("_code", "_recorder")
+
+    def __init__(self, recorder, code: int):
+        self._recorder = recorder
+        self._code = code
+
+    def __enter__(self):
+        if self._recorder.enabled:
+            self._recorder._record(self._code + _BEGIN)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._recorder.enabled:
+            self._recorder._record(self._code + _END)
+        return False
+
+
+class TraceRecorder:
+    """Ring buffer of begin/end events of one thread.
+
+    Events are recorded with begin(name)/end(name) or, more conveniently,
+    with the context manager span(name). When the buffer is full the oldest
+    events are overwritten, and the export drops end events whose begin
+    was overwritten. The recorder is not thread safe: record from the game
+    thread only.
+    """
+
+    def __init__(self, capacity: int = CAPACITY_DEFAULT):
+        """Preallocate the buffer.
+
+        Args:
+            capacity: Number of events kept, the oldest are overwritten
+        """
+        if capacity < 1:
+            raise ValueError(f"capacity must be positive, is {capacity}")
+        self.capacity = capacity
+        # Plain lists, as item assignment is cheaper than on numpy arrays
+        self._timestamps = [0] * capacity
+        self._codes = [0] * capacity
+        self._names: list = []
+        self._spans: dict = {}
+        self.enabled = False
+        self.count = 0
+        # File written when tracing stops, see toggle()
+        self.path = DEFAULT_TRACE_PATH
+
+    def span(self, name: str) -> _Span:
+        """Context manager recording a begin and end event of name.
+
+        The span objects are cached per name, so using them in a hot loop
+        does not allocate.
+        """
+        span = self._spans.get(name)
+        if span is None:
+            span = _Span(self, 2 * len(self._names))
+            self._names.append(name)
+            self._spans[name] = span
+        return span
+
+    def _record(self, code: int) -> None:
+        index = self.count % self.capacity
+        self._timestamps[index] = time.perf_counter_ns()
+        self._codes[index] = code
+        self.count += 1
+
+    def begin(self, name: str) -> None:
+        """Record the begin of name."""
+        if self.enabled:
+            self._record(self.span(name)._code + _BEGIN)
+
+    def end(self, name: str) -> None:
+        """Record the end of name."""
+        if self.enabled:
+            self._record(self.span(name)._code + _END)
+
+    def start(self) -> None:
+        """Drop recorded events and start recording."""
+        self.count = 0
+        self.enabled = True
+
+    def stop(self) -> None:
+        """Stop recording; the events stay available for save()."""
+        self.enabled = False
+
+    @property
+    def dropped(self) -> int:
+        """Number of events overwritten since start()."""
+        return max(0, self.count - self.capacity)
+
+    def _snapshot(self) -> tuple:
+        if self.count <= self.capacity:
+            timestamps = self._timestamps[: self.count]
+            codes = self._codes[: self.count]
+        else:
+            index = self.count % self.capacity
+            timestamps = self._timestamps[index:] + self._timestamps[:index]
+            codes = self._codes[index:] + self._codes[:index]
+        return (
+            np.array(timestamps, dtype=np.int64),
+            np.array(codes, dtype=np.int64),
+            list(self._names),
+            self.dropped,
+        )
+
+    def trace_events(self) -> list:
+        """Recorded events in the Chrome trace-event format, oldest first.
+
+        Returns:
+            list: Event dicts with name, phase ph, timestamp ts in
+                microseconds, pid and tid
+        """
+        return _chrome_events(*self._snapshot()[:3])
+
+    def save(self, path, background: bool = False) -> threading.Thread | None:
+        """Write the recorded events as Chrome trace-event JSON.
+
+        Args:
+            path: JSON file to write
+            background: Copy the buffer now, but convert and write it on a
+                new thread, e.g. to not stall a running game
+
+        Returns:
+            threading.Thread | None: The writing thread if background
+        """
+        snapshot = self._snapshot()
+        if not background:
+            _write_trace(path, *snapshot)
+            return None
+        thread = threading.Thread(
+            target=_write_trace, args=(path, *snapshot), name="trace-export"
+        )
+        thread.start()
+        return thread
+
+    def toggle(self) -> None:
+        """Start recording, or stop and save to path in the background."""
+        if not self.enabled:
+            self.start()
+            print(f"Tracing started, toggle again to save to {self.path}")
+            return
+        self.stop()
+        self.save(self.path, background=True)
+        print(f"Saving {self.count - self.dropped} trace events to {self.path}")
+
+
+def _chrome_events(timestamps, codes, names) -> list:
+    origin = int(timestamps[0]) if len(timestamps) else 0
+    microseconds = ((timestamps - origin) / 1000).tolist()
+    pid = os.getpid()
+    events = []
+    # Open spans per name; an end whose begin was overwritten is dropped
+    depth = [0] * len(names)
+    for code, ts in zip(codes.tolist(), microseconds):
+        name_id, phase = divmod(code, 2)
+        if phase == _END:
+            if depth[name_id] == 0:
+                continue
+            depth[name_id] -= 1
+        else:
+            depth[name_id] += 1
+        events.append(
+            {
+                "name": names[name_id],
+                "ph": _PHASES[phase],
+                "ts": ts,
+                "pid": pid,
+                "tid": 0,
+            }
+        )
+    return events
+
+
+def _write_trace(path, timestamps, codes, names, dropped) -> None:
+    data = {
+        "traceEvents": _chrome_events(timestamps, codes, names),
+        "displayTimeUnit": "ms",
+        "otherData": {"dropped_events": dropped},
+    }
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(data, file)
+
+
+# Recorder shared by all instrumented code
+TRACER = TraceRecorder()
@@ -0,0 +1,266 @@
+"""Live preview of the closed-loop response, predicted in the background.
+
+The games ask a TrajectoryPreview for a new prediction whenever the state,
+gains or reference changed; a worker thread runs the prediction with a fast
+model and publishes the predicted path in chunks, so the first part shows
+up quickly and the rest extends it. The game loop never waits: request()
+only replaces the pending job and points is whatever was published last.
+"""
+
+import threading
+
+import numpy as np
+import pygame
+
+from inverted_pendulum_model import PLANT_TO_MODEL
+
+PREVIEW_HORIZON = 3.0
+# Control steps predicted between two published updates
+CHUNK_STEPS = 25
+# Frames between two predictions while a game runs
+PREVIEW_FRAME_STEP = 6
+PREVIEW_COLOR = (255, 255, 255, 110)
+
+
+class TrajectoryPreview:
+    """Runs trajectory predictions on a worker thread, latest request wins.
+
+    A prediction is a generator function yielding (n, 2) arrays of screen
+    points, e.g. predict_submarine or predict_pendulum. When a new request
+    arrives while a prediction runs, the running one is abandoned after its
+    current chunk; requests queued in between are dropped.
+    """
+
+    def __init__(self, color: tuple = PREVIEW_COLOR, line_width: int = 3):
+        """Start the worker thread.
+
+        Args:
+            color: RGBA color of the drawn path, the alpha makes it translucent
+            line_width: Width of the drawn path in pixels
+        """
+        self.color = color
+        self.line_width = line_width
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = None
+        self._closed = False
+        self._error = None
+        # Generation of the latest request; a running prediction stops as
+        # soon as it is outdated
+        self._generation = 0
+        # (generation, points), replaced as a whole by the worker
+        self._published = (0, None)
+        self._overlay = None
+        self._overlay_key = None
+        self.predictions_started = 0
+        self.predictions_abandoned = 0
+        self._thread = threading.Thread(
+            target=self._work, name="trajectory-preview", daemon=True
+        )
+        self._thread.start()
+
+    def request(self, predict, *args) -> None:
+        """Replace the pending prediction with predict(*args), never blocking.
+
+        The arguments must not be modified by the caller afterwards; pass
+        copies of state arrays.
+        """
+        if self._error is not None:
+            raise RuntimeError("trajectory preview failed") from self._error
+        with self._lock:
+            self._generation += 1
+            self._pending = (self._generation, predict, args)
+        self._wake.set()
+
+    @property
+    def points(self) -> np.ndarray | None:
+        """Predicted path published last, (n, 2) screen points, or None."""
+        return self._published[1]
+
+    def _work(self):
+        while True:
+            self._wake.wait()
+            with self._lock:
+                self._wake.clear()
+                job, self._pending = self._pending, None
+            if self._closed:
+                return
+            if job is None:
+                continue
+            generation, predict, args = job
+            self.predictions_started += 1
+            chunks = []
+            try:
+                for chunk in predict(*args):
+                    if self._generation != generation or self._closed:
+                        self.predictions_abandoned += 1
+                        break
+                    chunks.append(chunk)
+                    self._published = (generation, np.concatenate(chunks))
+            except Exception as error:
+                # Reported to the game thread by the next request()
+                self._error = error
+                return
+
+    def draw(self, screen: pygame.Surface, color: tuple | None = None) -> None:
+        """Draw the latest predicted path translucently onto screen.
+
+        The path is drawn onto a cached transparent overlay, which is only
+        redrawn when the worker published new points.
+
+        Args:
+            screen: pygame Surface to draw on
+            color: RGBA color overriding the preview's color
+        """
+        generation, points = self._published
+        if points is None or len(points) < 2:
+            return
+        color = self.color if color is None else color
+        key = (generation, len(points), screen.get_size(), color)
+        if self._overlay_key != key:
+            if self._overlay is None or self._overlay.get_size() != screen.get_size():
+                self._overlay = pygame.Surface(screen.get_size(), pygame.SRCALPHA)
+            self._overlay.fill((0, 0, 0, 0))
+            pygame.draw.lines(
+                self._overlay, color, False, points.tolist(), self.line_width
+            )
+            self._overlay_key = key
+        screen.blit(self._overlay, (0, 0))
+
+    def close(self) -> None:
+        """Stop the worker; a running prediction ends after its chunk."""
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+
+
+def predict_submarine(
+    depth: float,
+    vertical_velocity: float,
+    position_x: float,
+    horizontal_speed: float,
+    gains: tuple,
+    controller_memory,
+    reference,
+    mass: float,
+    thrust_limit: float,
+    control_period: float,
+    horizon: float = PREVIEW_HORIZON,
+    chunk_steps: int = CHUNK_STEPS,
+):
+    """Predict the depth under PID control, yielding (x, depth) chunks.
+
+    The submarine moves horizontally at constant speed and vertically as a
+    point mass driven by the saturated thrust, held over each control
+    period, which is what the pymunk plant does without collisions.
+
+    Args:
+        depth: Current depth
+        vertical_velocity: Current vertical velocity
+        position_x: Current horizontal position
+        horizontal_speed: Horizontal speed in pixels per second
+        gains: (kp, ki, kd), zeros for an inactive controller
+        controller_memory: (integral, previous_error) of ControllerPID,
+            as returned by its snapshot()
+        reference: Callable evaluating the reference depth for an array of
+            horizontal positions, e.g. ReferenceSignal.evaluate_many
+        mass: Submarine mass
+        thrust_limit: Maximum absolute thrust
+        control_period: Control sample time
+        horizon: Predicted time in seconds
+        chunk_steps: Control steps per yielded chunk
+
+    Yields:
+        np.ndarray: (chunk_steps, 2) array of predicted (x, depth) points
+    """
+    kp, ki, kd = gains
+    integral, previous_error = (float(value) for value in controller_memory)
+    n_steps = round(horizon / control_period)
+    steps = np.arange(n_steps + 1)
+    x_positions = position_x + horizontal_speed * control_period * steps
+    references = np.asarray(reference(x_positions), dtype=float).tolist()
+    chunk = np.empty((chunk_steps, 2))
+    row = 0
+    for step in range(n_steps):
+        error = depth - references[step]
+        integral += error * control_period
+        derivative = (error - previous_error) / control_period
+        previous_error = error
+        thrust = kp * error + ki * integral + kd * derivative
+        thrust = min(max(thrust, -thrust_limit), thrust_limit)
+        acceleration = thrust / mass
+        depth += control_period * (
+            vertical_velocity + 0.5 * acceleration * control_period
+        )
+        vertical_velocity += acceleration * control_period
+        chunk[row] = (x_positions[step + 1], depth)
+        row += 1
+        if row == chunk_steps:
+            yield chunk.copy()
+            row = 0
+    if row:
+        yield chunk[:row].copy()
+
+
+def predict_pendulum(
+    model,
+    state,
+    reference_state,
+    gain_matrix,
+    input_limit: float | None,
+    pivot_y: float,
+    control_period: float,
+    horizon: float = PREVIEW_HORIZON,
+    chunk_steps: int = CHUNK_STEPS,
+):
+    """Predict the pendulum under state feedback, yielding ball positions.
+
+    The nonlinear CartPoleModel is integrated with one fourth order
+    Runge-Kutta step per control period while the force is held.
+
+    Args:
+        model: CartPoleModel of the plant
+        state: Current plant state (position, velocity, angle, angular
+            velocity) in plant coordinates
+        reference_state: Reference state in plant coordinates
+        gain_matrix: (1, 4) gain K of u = -K (reference - state) in plant
+            coordinates, as used by StateFeedbackController
+        input_limit: Maximum absolute force, None for no saturation
+        pivot_y: Screen y coordinate of the cart center, the pivot of
+            the drawn pendulum
+        control_period: Control sample time
+        horizon: Predicted time in seconds
+        chunk_steps: Control steps per yielded chunk
+
+    Yields:
+        np.ndarray: (chunk_steps, 2) array of predicted ball screen positions
+    """
+    model_state = PLANT_TO_MODEL @ np.asarray(state, dtype=float)
+    model_reference = PLANT_TO_MODEL @ np.asarray(reference_state, dtype=float)
+    # Feedback in model coordinates: -K (r - x)_plant = -K S (r - x)_model
+    model_gain = np.asarray(gain_matrix, dtype=float).reshape(-1) @ PLANT_TO_MODEL
+    length = model.length_pendulum
+    half_period = 0.5 * control_period
+    n_steps = round(horizon / control_period)
+    chunk = np.empty((chunk_steps, 2))
+    row = 0
+    for _ in range(n_steps):
+        force = -float(model_gain @ (model_reference - model_state))
+        if input_limit is not None:
+            force = min(max(force, -input_limit), input_limit)
+        k1 = model.dynamics(model_state, force)
+        k2 = model.dynamics(model_state + half_period * k1, force)
+        k3 = model.dynamics(model_state + half_period * k2, force)
+        k4 = model.dynamics(model_state + control_period * k3, force)
+        model_state = model_state + control_period / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+        angle = model_state[2]
+        chunk[row] = (
+            model_state[0] + length * np.sin(angle),
+            pivot_y - length * np.cos(angle),
+        )
+        row += 1
+        if row == chunk_steps:
+            yield chunk.copy()
+            row = 0
+    if row:
+        yield chunk[:row].copy()